@@ -0,0 +1,201 @@
+# agent_app/agent_db.py
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+from urllib.parse import quote, quote_plus
+
+from django.conf import settings
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+# --- 1. Configuration ---
+
+# Connection pool of the agent's SQL tool (one connection per concurrently running query)
+POOL_SIZE = getattr(settings, 'AGENT_DB_POOL_SIZE', 5)
+MAX_OVERFLOW = getattr(settings, 'AGENT_DB_MAX_OVERFLOW', 10)
+POOL_TIMEOUT = getattr(settings, 'AGENT_DB_POOL_TIMEOUT', 30)
+POOL_RECYCLE = getattr(settings, 'AGENT_DB_POOL_RECYCLE', 1800)
+
+# The agent only ever reads; its generated SQL must not be able to write
+READ_ONLY = getattr(settings, 'AGENT_DB_READ_ONLY', True)
+
+# Credentials of a read-only role for server databases (defaults to Django's own user)
+READ_ONLY_USER = getattr(settings, 'AGENT_DB_USER', None)
+READ_ONLY_PASSWORD = getattr(settings, 'AGENT_DB_PASSWORD', None)
+
+# Time budget of one agent query (SQLite: progress-handler interrupt, Postgres: statement_timeout,
+# MySQL: max_execution_time)
+QUERY_TIMEOUT_SECONDS = getattr(settings, 'AGENT_SQL_TIMEOUT_SECONDS', 5.0)
+
+# SQLite: how long a connection waits on a lock before failing, and the tuned read pragmas
+SQLITE_BUSY_TIMEOUT_MS = getattr(settings, 'AGENT_SQLITE_BUSY_TIMEOUT_MS', 5000)
+SQLITE_READ_PRAGMAS = [
+    "PRAGMA cache_size = -16000",     # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",   # memory-map up to 256 MB of the file
+    "PRAGMA temp_store = MEMORY",     # sorts and temp b-trees stay in RAM
+]
+
+# SQLite VM instructions between two deadline checks
+_PROGRESS_STEPS = 10_000
+
+# --- 2. Query time budget ---
+
+_deadline = threading.local()
+
+
+@contextmanager
+def query_deadline(seconds: float = QUERY_TIMEOUT_SECONDS) -> Iterator[None]:
+    """Interrupts SQLite statements run by this thread on agent connections after `seconds`."""
+    _deadline.at = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _deadline.at = None
+
+
+def _deadline_passed() -> int:
+    """SQLite progress handler: a non-zero return aborts the running statement ('interrupted')."""
+    at = getattr(_deadline, 'at', None)
+    return int(at is not None and time.monotonic() > at)
+
+
+def is_timeout_error(result: Any) -> bool:
+    """True if an "Error: ..." query result comes from the query time budget."""
+    text = str(result).lower()
+    return text.startswith('error') and (
+        'interrupted' in text or 'statement timeout' in text or 'maximum statement execution time' in text
+    )
+
+# --- 3. Agent engine ---
+
+def agent_database_url() -> str:
+    """SQLAlchemy URL for the agent's connections, derived from Django's default database."""
+    db_config = settings.DATABASES['default']
+    engine_str = db_config.get('ENGINE', '')
+    name = db_config['NAME']
+    user = READ_ONLY_USER or db_config.get('USER', '')
+    password = quote_plus(READ_ONLY_PASSWORD or db_config.get('PASSWORD', ''))
+    host = db_config.get('HOST', '')
+    port = db_config.get('PORT', '')
+
+    if 'sqlite' in engine_str:
+        if READ_ONLY:
+            # URI filename so SQLite itself opens the file read-only
+            return f"sqlite:///file:{quote(str(name))}?mode=ro&uri=true"
+        return f"sqlite:///{name}"
+    if 'postgresql' in engine_str:
+        return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}"
+    if 'mysql' in engine_str:
+        return f"mysql+pymysql://{user}:{password}@{host}:{port}/{name}"
+    if 'oracle' in engine_str:
+        return f"oracle+cx_oracle://{user}:{password}@{host}:{port}/{name}"
+    raise ValueError(f"Unsupported database engine: {engine_str}")
+
+
+def _on_connect(dialect: str):
+    """Per-connection setup: read-only session, query time budget and (SQLite) tuned pragmas."""
+    def setup(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if dialect == 'sqlite':
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            for pragma in SQLITE_READ_PRAGMAS:
+                cursor.execute(pragma)
+            if READ_ONLY:
+                cursor.execute("PRAGMA query_only = 1")
+            dbapi_connection.set_progress_handler(_deadline_passed, _PROGRESS_STEPS)
+        elif dialect == 'mysql':
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(QUERY_TIMEOUT_SECONDS * 1000)}")
+            if READ_ONLY:
+                cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.close()
+    return setup
+
+
+def create_agent_engine() -> Engine:
+    """Pooled (and by default read-only) engine for the agent's SQL tool."""
+    url = agent_database_url()
+    dialect = url.split(':', 1)[0].split('+', 1)[0]
+
+    connect_args: Dict[str, Any] = {}
+    if dialect == 'sqlite':
+        # Pooled connections are handed between the request thread and the SQL tool's executor
+        connect_args['check_same_thread'] = False
+    elif dialect == 'postgresql':
+        options = [f"-c statement_timeout={int(QUERY_TIMEOUT_SECONDS * 1000)}"]
+        if READ_ONLY:
+            options.append("-c default_transaction_read_only=on")
+        connect_args['options'] = ' '.join(options)
+
+    engine = create_engine(
+        url,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=dialect != 'sqlite',
+        connect_args=connect_args,
+    )
+    event.listen(engine, 'connect', _on_connect(dialect))
+    pool_counters.attach(engine)
+    return engine
+
+# --- 4. Pool statistics ---
+
+class PoolCounters:
+    """Cumulative pool events (connections opened, checkouts, peak concurrency) for an engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engine = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+
+    def attach(self, engine: Engine) -> None:
+        self.engine = engine
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+
+    def _on_connect(self, *args):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, *args):
+        with self._lock:
+            self.checked_out -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current pool occupancy plus the cumulative counters (empty until the engine is built)."""
+        if self.engine is None:
+            return {}
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                'pool_size': pool.size(),
+                'max_overflow': MAX_OVERFLOW,
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'peak_checked_out': self.peak_checked_out,
+                'read_only': READ_ONLY,
+            }
+
+
+pool_counters = PoolCounters()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Statistics of the agent's connection pool."""
+    return pool_counters.stats()
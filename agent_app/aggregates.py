@@ -0,0 +1,174 @@
+# agent_app/aggregates.py
+
+import itertools
+import time
+from typing import Dict, Literal, Optional, Tuple
+
+import pandas as pd
+from django.db import transaction
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from .formatting import format_table
+from .metrics import tool_span
+from .models import MarketAggregate, Unit
+from .property_index import get_property_index
+
+# Grouping dimensions: Unit (or project) field -> MarketAggregate field, and the stored value meaning "all"
+DIMENSIONS = ['city', 'no_of_bedrooms', 'property_type', 'completion_status']
+ALL = {'city': '', 'no_of_bedrooms': None, 'property_type': '', 'completion_status': ''}
+
+STAT_COLUMNS = ['units', 'min_price', 'median_price', 'p90_price', 'max_price', 'avg_price', 'median_price_per_sqm']
+
+GroupBy = Literal['city', 'bedrooms', 'property_type', 'completion_status']
+
+# --- 1. Vectorized computation ---
+
+def _clean_label(values: pd.Series) -> pd.Series:
+    """Lower-cased categorical values without the CSV's 'x_' prefix or separators ('x_off-plan' -> 'offplan'); blanks -> NA."""
+    text = values.fillna('').astype(str).str.strip().str.lower().str.removeprefix('x_')
+    text = text.str.replace(r'[\s_-]+', '', regex=True)
+    return text.mask(text.isin(['', 'nan', 'none', 'null']))
+
+
+def catalogue_frame() -> pd.DataFrame:
+    """The unit columns the aggregates need, cleaned (missing dimensions as NA, non-positive prices as NaN)."""
+    df = pd.DataFrame.from_records(
+        Unit.objects.values_list('project__city', 'no_of_bedrooms', 'property_type', 'completion_status', 'price_usd', 'area_sq_mtrs'),
+        columns=['city', 'no_of_bedrooms', 'property_type', 'completion_status', 'price', 'area'],
+    )
+    city = df['city'].fillna('').astype(str).str.strip()
+    df['city'] = city.mask(city.str.lower().isin(['', 'nan']))
+    df['no_of_bedrooms'] = pd.to_numeric(df['no_of_bedrooms'], errors='coerce').astype('Int64')
+    df['property_type'] = _clean_label(df['property_type'])
+    df['completion_status'] = _clean_label(df['completion_status'])
+    df['price'] = pd.to_numeric(df['price'], errors='coerce').astype(float)
+    df['price'] = df['price'].where(df['price'] > 0)
+    area = pd.to_numeric(df['area'], errors='coerce').astype(float)
+    df['price_per_sqm'] = df['price'] / area.where(area > 0)
+    return df
+
+
+def _stats(grouped) -> pd.DataFrame:
+    price = grouped['price']
+    return pd.DataFrame({
+        'units': grouped.size(),
+        'min_price': price.min(),
+        'median_price': price.median(),
+        'p90_price': price.quantile(0.9),
+        'max_price': price.max(),
+        'avg_price': price.mean(),
+        'median_price_per_sqm': grouped['price_per_sqm'].median(),
+    })
+
+
+def compute_aggregates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Statistics for every grouping set of the four dimensions (2^4 groupbys, including the grand total),
+    with ALL in the dimensions a set does not group by. Units missing a dimension only count in the
+    sets that do not group by it.
+    """
+    frames = []
+    for size in range(len(DIMENSIONS) + 1):
+        for dims in itertools.combinations(DIMENSIONS, size):
+            if dims:
+                stats = _stats(df.groupby(list(dims), observed=True, dropna=True)).reset_index()
+            else:
+                stats = _stats(df.assign(_all=0).groupby('_all')).reset_index(drop=True)
+            for dim in DIMENSIONS:
+                if dim not in dims:
+                    stats[dim] = ALL[dim]
+            frames.append(stats)
+    result = pd.concat(frames, ignore_index=True)
+    return result[result['units'] > 0]
+
+
+def refresh_market_aggregates(generation: int = 0) -> Tuple[int, float]:
+    """Recomputes the MarketAggregate table from the catalogue in one transaction. Returns (rows, seconds)."""
+    started = time.perf_counter()
+    aggregates = compute_aggregates(catalogue_frame())
+    aggregates = aggregates.astype(object).where(aggregates.notna(), None)
+    rows = [
+        MarketAggregate(generation=generation, **{k: record[k] for k in DIMENSIONS + STAT_COLUMNS})
+        for record in aggregates.to_dict('records')
+    ]
+    with transaction.atomic():
+        MarketAggregate.objects.all().delete()
+        MarketAggregate.objects.bulk_create(rows, batch_size=500)
+    return len(rows), time.perf_counter() - started
+
+# --- 2. Lookups ---
+
+def _city(value: str) -> str:
+    """The catalogue's spelling of a city name (case-insensitive), so the lookup is an exact indexed match."""
+    value = value.strip()
+    return next((c for c in get_property_index().cities if c.lower() == value.lower()), value)
+
+
+def _label(value: str) -> Optional[str]:
+    """A property type / completion status as stored in the table ('Villas' -> 'villa'; None if it cannot occur)."""
+    label = _clean_label(pd.Series([value])).iloc[0]
+    return None if pd.isna(label) else label.removesuffix('s')
+
+
+def market_stats(
+    city: Optional[str] = None,
+    bedrooms: Optional[int] = None,
+    property_type: Optional[str] = None,
+    completion_status: Optional[str] = None,
+    group_by: Optional[GroupBy] = None,
+) -> str:
+    """Price statistics for a market segment (a single-row lookup), or one row per value of one dimension."""
+    field = 'no_of_bedrooms' if group_by == 'bedrooms' else group_by
+
+    # 1. The segment: given values, ALL for the others (a grouped dimension takes every value but ALL)
+    segment: Dict[str, object] = {
+        'city': _city(city) if city else '',
+        'no_of_bedrooms': bedrooms,
+        'property_type': _label(property_type) if property_type else '',
+        'completion_status': _label(completion_status) if completion_status else '',
+    }
+    if None in (segment['property_type'], segment['completion_status']):
+        return "No units match this segment."
+    lookup = {dim: value for dim, value in segment.items() if dim != field}
+
+    with tool_span('market_stats') as record:
+        queryset = MarketAggregate.objects.filter(**lookup)
+        if field:
+            queryset = queryset.exclude(**{field: ALL[field]}).order_by('median_price')
+        rows = list(queryset.values(*DIMENSIONS, *STAT_COLUMNS)[:100])
+        record['rows'] = len(rows)
+
+    if not rows:
+        return "No units match this segment."
+
+    # 2. Render: the segment in the title, the grouped dimension as the first column
+    described = ", ".join(f"{k}={v}" for k, v in segment.items() if k != field and v not in ('', None)) or "all units"
+    title = f"Market stats (USD) for {described}" + (f", by {group_by}" if group_by else "") + ":"
+    columns = ([group_by] if group_by else []) + STAT_COLUMNS
+    table = [([row[field]] if field else []) + [row[c] for c in STAT_COLUMNS] for row in rows]
+    return format_table(columns, table, title=title)
+
+# --- 3. Agent tool ---
+
+class MarketStats(BaseModel):
+    """Precomputed price statistics per city, bedrooms, property type and completion status."""
+    city: Optional[str] = Field(default=None, description="City name, e.g. 'Chicago'. Omit for all cities.")
+    bedrooms: Optional[int] = Field(default=None, description="Exact number of bedrooms (0 for studios). Omit for all sizes.")
+    property_type: Optional[str] = Field(default=None, description="'apartment', 'villa' or 'house'. Omit for all types.")
+    completion_status: Optional[str] = Field(default=None, description="'available', 'offplan' or 'sold'. Omit for any status.")
+    group_by: Optional[GroupBy] = Field(
+        default=None, description="Return one row per value of this dimension instead of a single row, e.g. 'city' for 'cheapest villas by city'."
+    )
+
+
+market_stats_tool = StructuredTool.from_function(
+    func=market_stats,
+    name="market_stats",
+    description=(
+        "Unit count and min/median/p90/max/average price and median price per square metre for a market segment "
+        "(any combination of city, bedrooms, property type, completion status), or broken down by one of them. "
+        "Use it for averages, price ranges and comparisons instead of SQL aggregates."
+    ),
+    args_schema=MarketStats,
+)
@@ -0,0 +1,205 @@
+# agent_app/amenity_search.py
+
+import functools
+import re
+from typing import Dict, List, Optional
+
+from django.db import connection
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Q, Value, When
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from .formatting import format_table, format_value
+from .metrics import tool_span
+from .models import Unit
+
+FTS_TABLE = 'agent_app_unit_fts'
+
+MAX_TOP_K = 20
+
+# Words that carry no meaning for an amenity search
+_STOPWORDS = {
+    'a', 'an', 'and', 'any', 'are', 'at', 'for', 'has', 'have', 'in', 'is', 'near', 'of', 'on',
+    'or', 'the', 'to', 'with', 'want', 'looking', 'need', 'project', 'projects', 'property',
+    'properties', 'something', 'that', 'which', 'one',
+}
+
+# Term/phrase splitter: keeps hyphenated words ("co-working") together as one phrase
+_TERM_RE = re.compile(r"[\w]+(?:-[\w]+)*", re.UNICODE)
+
+# Column weights for bm25(): name, description, features, facilities
+_BM25_WEIGHTS = (2.0, 1.0, 3.0, 3.0)
+
+def search_terms(keywords: str) -> List[str]:
+    """Splits a free-text amenity request into search terms, dropping stopwords."""
+    terms = []
+    for term in _TERM_RE.findall(keywords.lower()):
+        if term not in _STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+@functools.lru_cache(maxsize=None)
+def fts_available() -> bool:
+    """
+    True when the database has the FTS5 index created by migration 0011. Checked once per process;
+    the answer is forgotten after migrate (post_migrate, see apps.py) and on each rebuild_fts_index().
+    """
+    return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+
+def rebuild_fts_index() -> None:
+    """Re-fills the FTS index from the units and their projects (triggers keep it in sync between loads)."""
+    fts_available.cache_clear()
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def _structured_filters(unit: str, project: str, filters: Dict[str, object]) -> tuple:
+    """SQL conditions and params for the structured filters of a search (unit and project table aliases)."""
+    conditions, params = [], []
+    if filters.get('city'):
+        conditions.append(f"{project}.city = %s COLLATE NOCASE")
+        params.append(filters['city'])
+    if filters.get('bedrooms') is not None:
+        conditions.append(f"{unit}.no_of_bedrooms = %s")
+        params.append(filters['bedrooms'])
+    if filters.get('min_price') is not None:
+        conditions.append(f"{unit}.price_usd >= %s")
+        params.append(filters['min_price'])
+    if filters.get('max_price') is not None:
+        conditions.append(f"{unit}.price_usd <= %s")
+        params.append(filters['max_price'])
+    if filters.get('property_type'):
+        conditions.append(f"{unit}.property_type = %s COLLATE NOCASE")
+        params.append(filters['property_type'])
+    return conditions, params
+
+
+def _fts_search(terms: List[str], match_all: bool, top_k: int, filters: Dict[str, object]) -> List[Dict[str, object]]:
+    """Ranked FTS5 lookup (bm25) joined with the structured filters, one row per project."""
+    # Each term is quoted, so a hyphenated term becomes a phrase ("co-working" -> "co working")
+    match = f" {'AND' if match_all else 'OR'} ".join('"' + t.replace('-', ' ') + '"' for t in terms)
+    conditions, params = _structured_filters('u', 'p', filters)
+    where = "".join(f" AND {c}" for c in conditions)
+    weights = ", ".join(str(w) for w in _BM25_WEIGHTS)
+
+    # bm25() and snippet() only work in a plain FTS query, so the matching units are materialized
+    # first and then grouped by project: the bare excerpt column comes from the best-ranked unit
+    sql = f"""
+        WITH hits AS MATERIALIZED (
+            SELECT u.project_id, u.no_of_bedrooms, u.price_usd,
+                   bm25({FTS_TABLE}, {weights}) AS score,
+                   snippet({FTS_TABLE}, 1, '[', ']', '...', 12) AS excerpt
+            FROM {FTS_TABLE} AS f
+            JOIN agent_app_unit AS u ON u.id = f.rowid
+            JOIN agent_app_project AS p ON p.id = u.project_id
+            WHERE {FTS_TABLE} MATCH %s{where}
+        )
+        SELECT p.project_name AS name, p.city, COUNT(*) AS units,
+               MIN(h.no_of_bedrooms) AS min_bedrooms, MAX(h.no_of_bedrooms) AS max_bedrooms,
+               MIN(h.price_usd) AS min_price_usd, MAX(h.price_usd) AS max_price_usd,
+               MIN(h.score) AS score, h.excerpt
+        FROM hits AS h
+        JOIN agent_app_project AS p ON p.id = h.project_id
+        GROUP BY h.project_id
+        ORDER BY score, min_price_usd
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *params, top_k])
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _orm_search(terms: List[str], match_all: bool, top_k: int, filters: Dict[str, object]) -> List[Dict[str, object]]:
+    """Fallback for databases without FTS5: rank projects by the most terms found on one unit (icontains)."""
+    term_matches = [
+        Q(project__project_description__icontains=t) | Q(features__icontains=t) | Q(project__facilities__icontains=t)
+        | Q(project__project_name__icontains=t)
+        for t in terms
+    ]
+    queryset = Unit.objects.all()
+    if filters.get('city'):
+        queryset = queryset.filter(project__city__iexact=filters['city'])
+    if filters.get('bedrooms') is not None:
+        queryset = queryset.filter(no_of_bedrooms=filters['bedrooms'])
+    if filters.get('min_price') is not None:
+        queryset = queryset.filter(price_usd__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        queryset = queryset.filter(price_usd__lte=filters['max_price'])
+    if filters.get('property_type'):
+        queryset = queryset.filter(property_type__iexact=filters['property_type'])
+
+    score = sum(
+        (Case(When(q, then=Value(1)), default=Value(0), output_field=IntegerField()) for q in term_matches),
+        Value(0),
+    )
+    queryset = queryset.alias(score=score).filter(score__gte=len(terms) if match_all else 1)
+    rows = queryset.values('project_id').annotate(
+        name=F('project__project_name'), city=F('project__city'), units=Count('id'),
+        min_bedrooms=Min('no_of_bedrooms'), max_bedrooms=Max('no_of_bedrooms'),
+        min_price_usd=Min('price_usd'), max_price_usd=Max('price_usd'), best_score=Max('score'),
+    ).order_by('-best_score', 'min_price_usd')[:top_k]
+    return [{**row, 'excerpt': ''} for row in rows]
+
+
+def _value_range(low, high) -> str:
+    """'2' when both ends are the same, '1-3' otherwise."""
+    low, high = format_value(low), format_value(high)
+    return low if low == high else f"{low}-{high}"
+
+
+# --- Agent tool ---
+
+class AmenitySearch(BaseModel):
+    """Keyword search over project descriptions, features and facilities, with optional filters."""
+    keywords: str = Field(description="Amenities or features to look for, e.g. 'rooftop pool co-working'.")
+    match_all: bool = Field(default=False, description="Require every keyword (default: rank by how many match).")
+    city: Optional[str] = Field(default=None, description="City name, e.g. 'Chicago'.")
+    bedrooms: Optional[int] = Field(default=None, description="Exact number of bedrooms.")
+    min_price: Optional[float] = Field(default=None, description="Minimum price in USD.")
+    max_price: Optional[float] = Field(default=None, description="Maximum price in USD.")
+    property_type: Optional[str] = Field(default=None, description="'apartment', 'villa' or 'house'.")
+    top_k: int = Field(default=5, description=f"Number of projects to return (max {MAX_TOP_K}).")
+
+
+def search_amenities(keywords: str, match_all: bool = False, top_k: int = 5, **filters) -> str:
+    """Finds projects whose description, features or facilities mention the requested amenities."""
+    terms = search_terms(keywords)
+    if not terms:
+        return "Please provide at least one amenity or feature keyword."
+
+    top_k = max(1, min(top_k, MAX_TOP_K))
+    search = _fts_search if fts_available() else _orm_search
+    with tool_span('search_amenities') as record:
+        rows = search(terms, match_all, top_k, filters)
+        record['rows'] = len(rows)
+    if not rows:
+        return f"No projects mention {', '.join(terms)} with these criteria."
+
+    for row in rows:
+        row['bedrooms'] = _value_range(row['min_bedrooms'], row['max_bedrooms'])
+    columns = ['name', 'city', 'units', 'bedrooms', 'min_price_usd', 'max_price_usd', 'excerpt']
+    return format_table(
+        columns, [[row[c] for c in columns] for row in rows],
+        title=(
+            f"Top {len(rows)} projects for: {', '.join(terms)} "
+            "(units, bedrooms and prices cover the matching units; [matched terms] in excerpt)"
+        ),
+    )
+
+
+search_amenities_tool = StructuredTool.from_function(
+    func=search_amenities,
+    name="search_amenities",
+    description=(
+        "Ranked keyword search over project descriptions, features and facilities (e.g. 'rooftop pool', "
+        "'co-working space', 'private beach'), optionally combined with city, bedrooms, price and type filters. "
+        "Returns one row per project with the bedroom and price range of its matching units."
+    ),
+    args_schema=AmenitySearch,
+)
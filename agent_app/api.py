@@ -2,15 +2,24 @@
 
 import json
 import uuid
-from typing import Any, Dict, List, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
-from django.http import HttpRequest
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from ninja import Router, Schema
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, ToolMessage
 
 # Ensure these imports exist from your project structure
 from .models import Conversation, Lead, Message
-from .graph import agent_graph, ConversationState 
+from .archive import archived_messages, restore_conversation
+from .graph import get_agent_graph, thread_config, ConversationState 
+from .llm_scheduler import LLMUnavailable, llm_scheduler, request_priority
+from .pagination import DEFAULT_PAGE_SIZE, encode_cursor, keyset_page, keyset_slice
+from .metrics import CONTENT_TYPE, activate, finish_trace, mark, render_prometheus, span, start_trace, trace_request
+from .response_cache import response_cache
+from .transcript import history_messages, save_turn, turn_messages
+from .turns import Turn, abegin_turn, begin_turn, end_turn
 
 # --- SCHEMAS ---
 
@@ -43,9 +52,34 @@ class ConversationSchema(Schema):
     messages: List[MessageSchema]
     state_payload: ConversationState # Note: ConversationState is a TypedDict from graph.py
 
+class MessageItemSchema(Schema):
+    id: int
+    sender: str
+    text: str
+    timestamp: datetime
+
+class MessagePageSchema(Schema):
+    conversation_id: int
+    messages: List[MessageItemSchema] # Oldest first
+    has_more: bool # More messages before the page (history) or after it (delta)
+    before_cursor: Optional[str] = None # Pass as `before` to load older messages
+    after_cursor: Optional[str] = None # Pass as `after` to poll for newer messages
+
+class ConversationItemSchema(Schema):
+    id: int
+    start_time: datetime
+    end_time: Optional[datetime] = None
+
+class ConversationPageSchema(Schema):
+    conversations: List[ConversationItemSchema] # Newest first
+    has_more: bool
+    next_cursor: Optional[str] = None # Pass as `before` for the next page
+
 class ChatRequestSchema(Schema):
     message: str
     conversation_id: int
+    # Retries with the same key get the first request's reply instead of a second agent run
+    idempotency_key: Optional[str] = None
 
 class ChatResponseSchema(Schema):
     conversation_id: int
@@ -56,6 +90,10 @@ router = Router()
 
 # --- ENDPOINTS ---
 
+INITIAL_GREETING = "Hello! I'm the Silver Land Properties AI assistant. How can I help you find your dream property today?"
+
+FALLBACK_REPLY = "Sorry, I am still processing the previous request or encountered an internal error."
+
 @router.post("/conversations", response={201: ConversationSchema})
 def start_conversation(request: HttpRequest):
     """Initializes a new chat session."""
@@ -69,7 +107,7 @@ def start_conversation(request: HttpRequest):
     conversation = Conversation.objects.create(lead=lead)
     
     # 3. Define the initial state for LangGraph
-    initial_ai_message = AIMessage(content="Hello! I'm the Silver Land Properties AI assistant. How can I help you find your dream property today?")
+    initial_ai_message = AIMessage(content=INITIAL_GREETING)
     
     starting_state = ConversationState(
         conversation_id=str(conversation.id),
@@ -77,80 +115,604 @@ def start_conversation(request: HttpRequest):
         lead_data={}
     )
     
-    # 4. Save the initial message to the database
-    Message.objects.create(
+    # 4. Save the initial message to the database and seed the graph's checkpoint thread
+    greeting = Message.objects.create(
         conversation=conversation,
         sender='AI',
         text=initial_ai_message.content
     )
+    get_agent_graph().update_state(thread_config(conversation.id), starting_state, as_node="agent")
 
     # 5. Return the initial state
     return 201, {
         "id": conversation.id,
         "lead": LeadSchema.from_orm(lead),
         "start_time": conversation.start_time.isoformat(),
-        "messages": [MessageSchema.from_orm(m) for m in conversation.messages.all()],
+        "messages": [MessageSchema.from_orm(greeting)],
         "state_payload": starting_state
     }
 
 
+# --- HELPERS ---
+
+def _reply_text(ai_response: Any) -> str:
+    """Extracts the reply text from the graph's last message."""
+    if isinstance(ai_response, AIMessage):
+        return ai_response.content
+    # If the graph outputs a ToolMessage or other type, the agent failed to synthesize
+    return FALLBACK_REPLY
+
+
+def _transcript_state(conversation: Conversation, messages: List[Any]) -> ConversationState:
+    """Builds the state used to seed a thread that has no checkpoint yet."""
+    return ConversationState(
+        conversation_id=str(conversation.id),
+        messages=messages,
+        lead_data={} # Keep track of lead data via tools or database updates
+    )
+
+
+def _build_input_state(conversation: Conversation, message_text: str) -> Dict[str, Any]:
+    """
+    Returns the graph input for a new turn: just the new human message.
+    The history lives in the conversation's checkpoint thread; conversations started before
+    the checkpointer existed, and archived ones (restored first), are seeded once from their
+    Message transcript.
+    """
+    
+    config = thread_config(conversation.id)
+    
+    with span('history'):
+        if conversation.end_time is not None:
+            restore_conversation(conversation)
+        if not get_agent_graph().get_state(config).values:
+            history = history_messages(conversation)
+            get_agent_graph().update_state(config, _transcript_state(conversation, history), as_node="agent")
+    
+    return {
+        "conversation_id": str(conversation.id),
+        "messages": [HumanMessage(content=message_text)],
+    }
+
+
+def _save_turn(conversation: Conversation, message_text: str, turn: List[BaseMessage]) -> str:
+    """
+    Appends the turn (the human message, the agent's reply if it produced one, and its tool
+    calls) to the transcript in one transaction, written behind the checkpoint. Returns the reply text.
+    """
+    
+    ai_response = turn[-1] if turn else None
+    reply_text = _reply_text(ai_response)
+    
+    with span('persist'):
+        save_turn(conversation, message_text, turn, reply_text if isinstance(ai_response, AIMessage) else None)
+    
+    return reply_text
+
+
+def _is_cacheable_opening(conversation: Conversation) -> bool:
+    """True if the response cache is on and the user has not spoken yet in this conversation."""
+    return response_cache.enabled and not conversation.messages.filter(sender='Human').exists()
+
+
+def _cached_turn(conversation: Conversation, message_text: str) -> Optional[str]:
+    """
+    Answers an opening message from the response cache. On a hit the turn is appended to
+    the checkpoint and the transcript exactly as if the agent had produced the reply.
+    """
+    with span('response_cache'):
+        reply_text = response_cache.lookup(message_text)
+    if reply_text is None:
+        return None
+    
+    mark('cached')
+    ai_message = AIMessage(content=reply_text)
+    get_agent_graph().update_state(
+        thread_config(conversation.id),
+        {"messages": [HumanMessage(content=message_text), ai_message]},
+        as_node="agent"
+    )
+    return _save_turn(conversation, message_text, [ai_message])
+
+
+def _remember_reply(message_text: str, ai_response: Any) -> None:
+    """Stores the agent's answer to an opening message in the response cache."""
+    if isinstance(ai_response, AIMessage) and ai_response.content:
+        response_cache.store(message_text, _reply_text(ai_response))
+
+
+def _sse(event: str, payload: Dict[str, Any]) -> str:
+    """Formats a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _relay_stream_item(item: Tuple[Any, str, Any], announced_tool_calls: set, new_messages: List[Any]) -> Iterator[str]:
+    """
+    Translates one (namespace, mode, chunk) item from agent_graph.stream into SSE frames.
+    Messages appended to the top-level state are collected into new_messages.
+    """
+    namespace, mode, chunk = item
+    
+    if mode == "messages":
+        message, _metadata = chunk
+        
+        if isinstance(message, AIMessageChunk):
+            for tool_chunk in message.tool_call_chunks:
+                if tool_chunk.get("name") and tool_chunk.get("id") not in announced_tool_calls:
+                    announced_tool_calls.add(tool_chunk.get("id"))
+                    yield _sse("tool_start", {"name": tool_chunk["name"]})
+            if isinstance(message.content, str) and message.content:
+                yield _sse("token", {"text": message.content})
+        
+        elif isinstance(message, ToolMessage):
+            yield _sse("tool_end", {"name": message.name, "status": message.status})
+    
+    elif mode == "updates" and not namespace:
+        # A reply from the router comes whole (no model tokens), so it is sent as a single token
+        if router_update := chunk.get("router"):
+            for message in router_update.get("messages", []):
+                yield _sse("token", {"text": message.content})
+            new_messages.extend(router_update.get("messages", []))
+        # Top-level updates of the agent node carry the messages it appended to the state
+        if agent_update := chunk.get("agent"):
+            new_messages.extend(agent_update.get("messages", []))
+
+
+def _unavailable_response(error: LLMUnavailable) -> JsonResponse:
+    """429/503 with a Retry-After header, for requests the LLM scheduler turned away."""
+    mark('rejected')
+    response = JsonResponse({"detail": error.message}, status=error.status_code)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def _admission_response() -> Optional[JsonResponse]:
+    """_unavailable_response() if the LLM scheduler would reject a new model call right now."""
+    try:
+        llm_scheduler.check_admission()
+    except LLMUnavailable as error:
+        return _unavailable_response(error)
+    return None
+
+
+def _error_payload(error: Exception) -> Dict[str, Any]:
+    """The 'error' frame of a failed stream (with retry_after when the LLM scheduler gave up)."""
+    if isinstance(error, LLMUnavailable):
+        mark('rejected')
+        return {"detail": error.message, "status": error.status_code, "retry_after": error.retry_after}
+    mark('error')
+    return {"detail": str(error)}
+
+
+def _event_stream_response(events) -> StreamingHttpResponse:
+    """Wraps a (sync or async) SSE frame iterator in a streaming response."""
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    # Disable caching and proxy buffering so each frame reaches the browser immediately
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _traced_events(events: Iterator[str], trace) -> Iterator[str]:
+    """Runs a stream inside its request's trace, which is finished once the last frame is sent."""
+    try:
+        with activate(trace):
+            yield from events
+    finally:
+        finish_trace(trace)
+
+
+async def _atraced_events(events: AsyncIterator[str], trace) -> AsyncIterator[str]:
+    """Async version of _traced_events."""
+    try:
+        with activate(trace):
+            async for frame in events:
+                yield frame
+    finally:
+        finish_trace(trace)
+
+
+def _turn_events(events: Iterator[str], turn: Turn) -> Iterator[str]:
+    """Releases the conversation (and stores the reply for duplicates) once the stream ends."""
+    try:
+        yield from events
+    finally:
+        end_turn(turn)
+
+
+async def _aturn_events(events: AsyncIterator[str], turn: Turn) -> AsyncIterator[str]:
+    """Async version of _turn_events."""
+    try:
+        async for frame in events:
+            yield frame
+    finally:
+        await sync_to_async(end_turn)(turn)
+
+
+# Stream options shared by the sync and async streaming endpoints.
+# subgraphs=True is required to see the tokens produced inside the nested ReAct agent.
+STREAM_KWARGS = {"stream_mode": ["messages", "updates"], "subgraphs": True}
+
+
+def _cached_events(conversation: Conversation, reply_text: str) -> Iterator[str]:
+    """SSE frames for a reply that is already known (response cache hit or duplicate request), as one token."""
+    yield _sse("start", {"conversation_id": conversation.id})
+    yield _sse("token", {"text": reply_text})
+    yield _sse("done", {"conversation_id": conversation.id, "reply": reply_text})
+
+
+def _stream_agent_events(
+    conversation: Conversation, message_text: str, input_state: Dict[str, Any], opening: bool = False,
+    turn: Optional[Turn] = None, priority: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Runs the graph in streaming mode and relays model tokens and tool progress as SSE frames.
+    The final AIMessage is persisted once the run completes (and cached if it answers an opening message).
+    """
+    
+    # Flush an event straight away so the client gets its first byte before the LLM answers
+    yield _sse("start", {"conversation_id": conversation.id})
+    
+    new_messages: List[Any] = []
+    announced_tool_calls: set = set()
+    
+    try:
+        with span('graph'):
+            for item in get_agent_graph().stream(input_state, thread_config(conversation.id, priority), **STREAM_KWARGS):
+                yield from _relay_stream_item(item, announced_tool_calls, new_messages)
+    except Exception as e:
+        yield _sse("error", _error_payload(e))
+        return
+    
+    reply_text = _save_turn(conversation, message_text, new_messages)
+    if turn is not None:
+        turn.reply = reply_text
+    if opening and new_messages:
+        _remember_reply(message_text, new_messages[-1])
+    
+    yield _sse("done", {"conversation_id": conversation.id, "reply": reply_text})
+
+
+# --- CHAT ENDPOINTS ---
+
 @router.post("/agents/chat", response=ChatResponseSchema)
 def chat(request: HttpRequest, data: ChatRequestSchema):
     """Sends a message to the agent and gets a response."""
     
-    # 1. Fetch Conversation
-    conversation = get_object_or_404(Conversation, id=data.conversation_id)
+    with trace_request('chat', conversation_id=data.conversation_id):
+        # 1. Fetch Conversation
+        conversation = get_object_or_404(Conversation, id=data.conversation_id)
+        
+        # 2. Take the conversation (a duplicate of a running or answered request gets its reply)
+        with span('lock'):
+            turn = begin_turn(conversation.id, data.message, data.idempotency_key)
+        if turn.coalesced:
+            mark('coalesced')
+            return {
+                "conversation_id": conversation.id,
+                "reply": turn.reply,
+                "updated_state": get_agent_graph().get_state(thread_config(conversation.id)).values
+            }
+        
+        try:
+            # 3. Build the input (only the new message; history comes from the checkpoint)
+            input_state = _build_input_state(conversation, data.message)
+            
+            # 4. Serve repeated opening questions from the response cache
+            opening = _is_cacheable_opening(conversation)
+            if opening and (reply_text := _cached_turn(conversation, data.message)) is not None:
+                turn.reply = reply_text
+                return {
+                    "conversation_id": conversation.id,
+                    "reply": reply_text,
+                    "updated_state": get_agent_graph().get_state(thread_config(conversation.id)).values
+                }
+
+            # 5. Run the graph on the conversation's thread (its model calls queue in the LLM scheduler)
+            priority = request_priority(conversation)
+            with span('graph'):
+                output_state = get_agent_graph().invoke(input_state, thread_config(conversation.id, priority))
+            
+            # 6. Extract the AI's final response and record the turn in the transcript
+            turn.reply = reply_text = _save_turn(conversation, data.message, turn_messages(output_state["messages"]))
+            if opening:
+                _remember_reply(data.message, output_state["messages"][-1])
+
+            # 7. Return the response
+            return {
+                "conversation_id": conversation.id,
+                "reply": reply_text,
+                "updated_state": output_state
+            }
+        except LLMUnavailable as error:
+            return _unavailable_response(error)
+        finally:
+            end_turn(turn)
+
+
+@router.post("/agents/chat/stream")
+def chat_stream(request: HttpRequest, data: ChatRequestSchema):
+    """
+    Streams the agent's response as Server-Sent Events.
+    Emits 'start', 'token', 'tool_start', 'tool_end' and finally 'done' (or 'error') events.
+    """
     
-    # 2. Reconstruct the previous state by loading messages from the DB
-    current_messages: List[Any] = []
+    # The trace stays open until the stream's last frame (see _traced_events)
+    trace = start_trace('chat_stream', conversation_id=data.conversation_id)
+    turn = None
+    try:
+        with activate(trace):
+            conversation = get_object_or_404(Conversation, id=data.conversation_id)
+            # Once a stream starts its status is 200, so an overloaded scheduler is reported up front
+            if (rejected := _admission_response()) is not None:
+                finish_trace(trace)
+                return rejected
+            with span('lock'):
+                turn = begin_turn(conversation.id, data.message, data.idempotency_key)
+            if turn.coalesced:
+                mark('coalesced')
+                return _event_stream_response(_traced_events(_cached_events(conversation, turn.reply), trace))
+            
+            input_state = _build_input_state(conversation, data.message)
+            
+            opening = _is_cacheable_opening(conversation)
+            if opening and (reply_text := _cached_turn(conversation, data.message)) is not None:
+                turn.reply = reply_text
+                events = _cached_events(conversation, reply_text)
+            else:
+                priority = request_priority(conversation)
+                events = _stream_agent_events(conversation, data.message, input_state, opening, turn, priority)
+    except BaseException:
+        if turn is not None:
+            end_turn(turn)
+        finish_trace(trace)
+        raise
     
-    for msg in conversation.messages.order_by('timestamp'):
-        if msg.sender == 'Human':
-            current_messages.append(HumanMessage(content=msg.text))
-        elif msg.sender == 'AI':
-            current_messages.append(AIMessage(content=msg.text))
+    # The conversation is released once the stream ends (see _turn_events)
+    return _event_stream_response(_traced_events(_turn_events(events, turn), trace))
+
 
-    # Add the new human message
-    new_human_message = HumanMessage(content=data.message)
-    current_messages.append(new_human_message)
+# --- HISTORY ENDPOINTS ---
+# Keyset (cursor) pagination on (timestamp, id): every page is one index range read of at
+# most `limit` rows, so response size and query count do not grow with the history.
+
+@router.get("/conversations/{conversation_id}/messages", response=MessagePageSchema)
+def list_messages(
+    request: HttpRequest,
+    conversation_id: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    A page of a conversation's transcript: the latest messages (or those before `before`), or with
+    `after` only the messages since that cursor (delta mode, for polling). An archived
+    conversation is read from its archive and stays archived; only a chat turn restores it.
+    """
+    conversation = get_object_or_404(Conversation.objects.only('id', 'end_time'), id=conversation_id)
+    archived = archived_messages(conversation) if conversation.end_time is not None else None
     
-    # Save the new human message to the DB
-    Message.objects.create(
-        conversation=conversation,
-        sender='Human',
-        text=data.message
-    )
+    if archived is not None:
+        rows, has_more = keyset_slice(archived, 'timestamp', before=before, after=after, limit=limit)
+    else:
+        queryset = Message.objects.filter(conversation_id=conversation_id).values('id', 'sender', 'text', 'timestamp')
+        rows, has_more = keyset_page(queryset, 'timestamp', before=before, after=after, limit=limit)
+    if not after:
+        rows.reverse()
+    
+    return {
+        "conversation_id": conversation_id,
+        "messages": rows,
+        "has_more": has_more,
+        "before_cursor": encode_cursor(rows[0]['timestamp'], rows[0]['id']) if rows else before,
+        "after_cursor": encode_cursor(rows[-1]['timestamp'], rows[-1]['id']) if rows else after,
+    }
+
+
+@router.get("/leads/{session_id}/conversations", response=ConversationPageSchema)
+def list_conversations(request: HttpRequest, session_id: str, before: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """A lead's conversations, newest first."""
+    lead = get_object_or_404(Lead.objects.only('id'), session_id=session_id)
+    
+    queryset = Conversation.objects.filter(lead=lead).values('id', 'start_time', 'end_time')
+    rows, has_more = keyset_page(queryset, 'start_time', before=before, limit=limit)
+    
+    return {
+        "conversations": rows,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1]['start_time'], rows[-1]['id']) if rows and has_more else None,
+    }
+
+
+# --- ASYNC ENDPOINTS ---
+# Async variants of the endpoints above for ASGI deployments. They await the LLM via
+# agent_graph.ainvoke / astream and use Django's async ORM, so a single worker process
+# can keep many conversations in flight while they wait on the model.
+
+async def _aget_conversation(conversation_id: int) -> Conversation:
+    """Async equivalent of get_object_or_404 for conversations."""
+    try:
+        return await Conversation.objects.aget(id=conversation_id)
+    except Conversation.DoesNotExist:
+        raise Http404("No Conversation matches the given query.")
+
+
+async def _abuild_input_state(conversation: Conversation, message_text: str) -> Dict[str, Any]:
+    """Async version of _build_input_state."""
+    
+    config = thread_config(conversation.id)
+    
+    with span('history'):
+        if conversation.end_time is not None:
+            await sync_to_async(restore_conversation)(conversation)
+        if not (await get_agent_graph().aget_state(config)).values:
+            history = await sync_to_async(history_messages)(conversation)
+            await get_agent_graph().aupdate_state(config, _transcript_state(conversation, history), as_node="agent")
+    
+    return {
+        "conversation_id": str(conversation.id),
+        "messages": [HumanMessage(content=message_text)],
+    }
+
+
+async def _asave_turn(conversation: Conversation, message_text: str, turn: List[BaseMessage]) -> str:
+    """Async version of _save_turn (the transaction runs in a worker thread)."""
+    return await sync_to_async(_save_turn)(conversation, message_text, turn)
 
-    # 3. Define the input state
-    input_state = ConversationState(
+
+async def _acached_events(conversation: Conversation, reply_text: str) -> AsyncIterator[str]:
+    """Async counterpart of _cached_events (ASGI expects an async iterator from async views)."""
+    for frame in _cached_events(conversation, reply_text):
+        yield frame
+
+
+async def _astream_agent_events(
+    conversation: Conversation, message_text: str, input_state: Dict[str, Any], opening: bool = False,
+    turn: Optional[Turn] = None, priority: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """Async version of _stream_agent_events, driven by agent_graph.astream."""
+    
+    yield _sse("start", {"conversation_id": conversation.id})
+    
+    new_messages: List[Any] = []
+    announced_tool_calls: set = set()
+    
+    try:
+        with span('graph'):
+            async for item in get_agent_graph().astream(input_state, thread_config(conversation.id, priority), **STREAM_KWARGS):
+                for frame in _relay_stream_item(item, announced_tool_calls, new_messages):
+                    yield frame
+    except Exception as e:
+        yield _sse("error", _error_payload(e))
+        return
+    
+    reply_text = await _asave_turn(conversation, message_text, new_messages)
+    if turn is not None:
+        turn.reply = reply_text
+    if opening and new_messages:
+        await sync_to_async(_remember_reply)(message_text, new_messages[-1])
+    
+    yield _sse("done", {"conversation_id": conversation.id, "reply": reply_text})
+
+
+@router.post("/async/conversations", response={201: ConversationSchema})
+async def astart_conversation(request: HttpRequest):
+    """Async variant of start_conversation."""
+    
+    lead = await Lead.objects.acreate(session_id=str(uuid.uuid4()))
+    conversation = await Conversation.objects.acreate(lead=lead)
+    
+    initial_ai_message = AIMessage(content=INITIAL_GREETING)
+    
+    starting_state = ConversationState(
         conversation_id=str(conversation.id),
-        messages=current_messages,
-        lead_data={} # Keep track of lead data via tools or database updates
+        messages=[initial_ai_message],
+        lead_data={}
+    )
+    
+    greeting = await Message.objects.acreate(
+        conversation=conversation,
+        sender='AI',
+        text=initial_ai_message.content
     )
+    await get_agent_graph().aupdate_state(thread_config(conversation.id), starting_state, as_node="agent")
+    
+    return 201, {
+        "id": conversation.id,
+        "lead": LeadSchema.from_orm(lead),
+        "start_time": conversation.start_time.isoformat(),
+        "messages": [MessageSchema.from_orm(greeting)],
+        "state_payload": starting_state
+    }
 
-    # 4. Run the graph
-    output_state = agent_graph.invoke(input_state)
+
+@router.post("/async/agents/chat", response=ChatResponseSchema)
+async def achat(request: HttpRequest, data: ChatRequestSchema):
+    """Async variant of chat."""
     
-    # 5. Extract the AI's final response
-    ai_response = output_state["messages"][-1]
+    with trace_request('achat', conversation_id=data.conversation_id):
+        conversation = await _aget_conversation(data.conversation_id)
+        with span('lock'):
+            turn = await abegin_turn(conversation.id, data.message, data.idempotency_key)
+        if turn.coalesced:
+            mark('coalesced')
+            return {
+                "conversation_id": conversation.id,
+                "reply": turn.reply,
+                "updated_state": (await get_agent_graph().aget_state(thread_config(conversation.id))).values
+            }
+        
+        try:
+            input_state = await _abuild_input_state(conversation, data.message)
+            
+            # The response cache does a handful of short ORM calls, so its sync helpers run in a thread
+            opening = await sync_to_async(_is_cacheable_opening)(conversation)
+            if opening and (reply_text := await sync_to_async(_cached_turn)(conversation, data.message)) is not None:
+                turn.reply = reply_text
+                return {
+                    "conversation_id": conversation.id,
+                    "reply": reply_text,
+                    "updated_state": (await get_agent_graph().aget_state(thread_config(conversation.id))).values
+                }
+            
+            priority = await sync_to_async(request_priority)(conversation)
+            with span('graph'):
+                output_state = await get_agent_graph().ainvoke(input_state, thread_config(conversation.id, priority))
+            
+            turn.reply = reply_text = await _asave_turn(conversation, data.message, turn_messages(output_state["messages"]))
+            if opening:
+                await sync_to_async(_remember_reply)(data.message, output_state["messages"][-1])
+            
+            return {
+                "conversation_id": conversation.id,
+                "reply": reply_text,
+                "updated_state": output_state
+            }
+        except LLMUnavailable as error:
+            return _unavailable_response(error)
+        finally:
+            await sync_to_async(end_turn)(turn)
+
+
+@router.post("/async/agents/chat/stream")
+async def achat_stream(request: HttpRequest, data: ChatRequestSchema):
+    """Async variant of chat_stream (requires an ASGI server to stream without blocking)."""
     
-    if isinstance(ai_response, AIMessage):
-        reply_text = ai_response.content
-    else:
-        # If the graph outputs a ToolMessage or other type, the agent failed to synthesize
-        reply_text = "Sorry, I am still processing the previous request or encountered an internal error."
+    trace = start_trace('achat_stream', conversation_id=data.conversation_id)
+    turn = None
+    try:
+        with activate(trace):
+            conversation = await _aget_conversation(data.conversation_id)
+            if (rejected := _admission_response()) is not None:
+                finish_trace(trace)
+                return rejected
+            with span('lock'):
+                turn = await abegin_turn(conversation.id, data.message, data.idempotency_key)
+            if turn.coalesced:
+                mark('coalesced')
+                return _event_stream_response(_atraced_events(_acached_events(conversation, turn.reply), trace))
+            
+            input_state = await _abuild_input_state(conversation, data.message)
+            
+            opening = await sync_to_async(_is_cacheable_opening)(conversation)
+            if opening and (reply_text := await sync_to_async(_cached_turn)(conversation, data.message)) is not None:
+                turn.reply = reply_text
+                events = _acached_events(conversation, reply_text)
+            else:
+                priority = await sync_to_async(request_priority)(conversation)
+                events = _astream_agent_events(conversation, data.message, input_state, opening, turn, priority)
+    except BaseException:
+        if turn is not None:
+            await sync_to_async(end_turn)(turn)
+        finish_trace(trace)
+        raise
     
-    # 6. Save the AI's response to the database
-    if isinstance(ai_response, AIMessage):
-        Message.objects.create(
-            conversation=conversation,
-            sender='AI',
-            text=reply_text
-        )
+    return _event_stream_response(_atraced_events(_aturn_events(events, turn), trace))
 
-    # 7. Return the response
-    return {
-        "conversation_id": conversation.id,
-        "reply": reply_text,
-        "updated_state": output_state
-    }
\ No newline at end of file
+
+# --- METRICS ---
+
+@router.get("/metrics")
+def metrics(request: HttpRequest):
+    """Chat pipeline metrics (request, stage, LLM and tool latencies; tokens; pool and cache stats) in Prometheus text format."""
+    return HttpResponse(render_prometheus(), content_type=CONTENT_TYPE)
@@ -0,0 +1,38 @@
+# agent_app/apps.py
+
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+# Whether Django's SQLite connections switch the database to WAL mode
+SQLITE_WAL = getattr(settings, 'AGENT_SQLITE_WAL', True)
+SQLITE_BUSY_TIMEOUT_MS = getattr(settings, 'AGENT_SQLITE_BUSY_TIMEOUT_MS', 5000)
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Puts SQLite in WAL mode, so the agent's read-only connections (agent_app/agent_db.py) and
+    the app's lead/message writes no longer block each other, with a busy timeout for writers.
+    """
+    if connection.vendor != 'sqlite' or not SQLITE_WAL:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")  # safe with WAL, avoids an fsync per commit
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+
+
+def reset_fts_available(sender, **kwargs):
+    """A migration may have created or dropped the FTS5 table, so the cached check is redone."""
+    from .amenity_search import fts_available
+    fts_available.cache_clear()
+
+
+class AgentAppConfig(AppConfig):
+    name = 'agent_app'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='agent_app_sqlite_wal')
+        post_migrate.connect(reset_fts_available, sender=self, dispatch_uid='agent_app_fts_available')
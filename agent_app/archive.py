@@ -0,0 +1,184 @@
+# agent_app/archive.py
+
+import gzip
+import json
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .checkpoint import DjangoCheckpointSaver
+from .models import Conversation, ConversationArchive, Message, ToolCall
+from .transcript import create_messages
+
+# Conversations with no message for this many days are ended and archived
+IDLE_DAYS = getattr(settings, 'AGENT_ARCHIVE_IDLE_DAYS', 30)
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class ArchiveStats:
+    conversations: int = 0
+    messages: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        ratio = self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0
+        return (
+            f"{self.conversations} conversations ({self.messages} messages) in {self.seconds:.2f}s: "
+            f"{self.raw_bytes:,} bytes of JSON stored as {self.stored_bytes:,} ({ratio:.1f}x)"
+        )
+
+# --- 1. Serialization ---
+
+def _dump(conversation: Conversation) -> Dict[str, Any]:
+    """The conversation's messages, oldest first, each with the tool calls of its turn."""
+    messages = conversation.messages.order_by('timestamp', 'id').prefetch_related('tool_calls')
+    return {
+        'version': FORMAT_VERSION,
+        'messages': [
+            {
+                'sender': m.sender,
+                'text': m.text,
+                'timestamp': m.timestamp.isoformat(),
+                'tool_calls': [
+                    {
+                        'tool_call_id': c.tool_call_id, 'tool_name': c.tool_name, 'arguments': c.arguments,
+                        'result': c.result, 'status': c.status, 'timestamp': c.timestamp.isoformat(),
+                    }
+                    for c in m.tool_calls.all()
+                ],
+            }
+            for m in messages
+        ],
+    }
+
+
+def _compress(payload: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """(raw JSON, gzip-compressed JSON)."""
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return raw, gzip.compress(raw, compresslevel=6)
+
+
+def load_archive(archive: ConversationArchive) -> Dict[str, Any]:
+    return json.loads(gzip.decompress(bytes(archive.data)))
+
+
+def archived_messages(conversation: Conversation) -> Optional[List[Dict[str, Any]]]:
+    """
+    The archived transcript as message rows, oldest first, read without restoring it, or None
+    if the conversation has no archive. An entry's id is its position in the transcript.
+    """
+    archive = ConversationArchive.objects.filter(conversation=conversation).first()
+    if archive is None:
+        return None
+    return [
+        {'id': position, 'sender': e['sender'], 'text': e['text'], 'timestamp': parse_datetime(e['timestamp'])}
+        for position, e in enumerate(load_archive(archive)['messages'], start=1)
+    ]
+
+# --- 2. Archive and restore ---
+
+def idle_conversations(idle_days: int = IDLE_DAYS):
+    """Open conversations whose last message (or start, if they have none) is older than idle_days."""
+    cutoff = timezone.now() - timedelta(days=idle_days)
+    return (
+        Conversation.objects.filter(end_time__isnull=True)
+        .annotate(last_activity=Coalesce(Max('messages__timestamp'), 'start_time'))
+        .filter(last_activity__lt=cutoff)
+        .order_by('last_activity')
+    )
+
+
+def archive_conversation(conversation: Conversation, idle_days: int = IDLE_DAYS) -> Optional[ConversationArchive]:
+    """
+    Ends the conversation and moves its transcript into one compressed ConversationArchive row,
+    deleting its Message, ToolCall and checkpoint rows. Returns None if it became active again.
+    """
+    with transaction.atomic():
+        # Re-checked inside the transaction, so a turn saved since the scan keeps it live
+        last = idle_conversations(idle_days).filter(id=conversation.id).values_list('last_activity', flat=True).first()
+        if last is None:
+            return None
+
+        payload = _dump(conversation)
+        raw, data = _compress(payload)
+        archive, _ = ConversationArchive.objects.update_or_create(
+            conversation=conversation,
+            defaults={'data': data, 'message_count': len(payload['messages']), 'raw_bytes': len(raw)},
+        )
+        conversation.messages.all().delete()  # cascades to the tool calls
+        conversation.chat_requests.all().delete()
+        DjangoCheckpointSaver().delete_thread(str(conversation.id))
+        conversation.end_time = last
+        conversation.save(update_fields=['end_time'])
+    return archive
+
+
+def archive_idle(idle_days: int = IDLE_DAYS, limit: int = 1000) -> ArchiveStats:
+    """Archives up to `limit` idle conversations, one short transaction each."""
+    stats = ArchiveStats()
+    started = time.perf_counter()
+    for conversation in idle_conversations(idle_days)[:limit]:
+        archive = archive_conversation(conversation, idle_days)
+        if archive is not None:
+            stats.conversations += 1
+            stats.messages += archive.message_count
+            stats.raw_bytes += archive.raw_bytes
+            stats.stored_bytes += len(archive.data)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def restore_conversation(conversation: Conversation) -> int:
+    """
+    Moves an archived conversation back into the live tables (original timestamps kept) and reopens it.
+    Its checkpoint is rebuilt from the restored transcript on the next turn. Returns the messages restored
+    (0 if a concurrent request already reopened it).
+    """
+    with transaction.atomic():
+        # Claim it with one conditional UPDATE, which takes the row (SQLite: write) lock first:
+        # a concurrent GET or chat turn waits here, then finds it reopened and restores nothing
+        reopened = Conversation.objects.filter(id=conversation.id, end_time__isnull=False).update(end_time=None)
+        conversation.end_time = None
+        if not reopened:
+            return 0
+
+        archive = ConversationArchive.objects.filter(conversation=conversation).first()
+        payload = load_archive(archive) if archive else {'messages': []}
+        entries: List[Dict[str, Any]] = payload['messages']
+
+        # auto_now_add overrides timestamps on insert, so they are put back with one bulk update
+        messages = create_messages(
+            [Message(conversation=conversation, sender=e['sender'], text=e['text']) for e in entries]
+        )
+        calls = []
+        for message, entry in zip(messages, entries):
+            message.timestamp = parse_datetime(entry['timestamp'])
+            for c in entry['tool_calls']:
+                calls.append((ToolCall(
+                    conversation=conversation, message=message, tool_call_id=c['tool_call_id'], tool_name=c['tool_name'],
+                    arguments=c['arguments'], result=c['result'], status=c['status'],
+                ), c['timestamp']))
+        Message.objects.bulk_update(messages, ['timestamp'], batch_size=500)
+        created = ToolCall.objects.bulk_create([call for call, _ in calls])
+        if created and created[0].pk is None:
+            # Backends that return no keys from a bulk insert: the restored calls, in insertion order
+            created = list(ToolCall.objects.filter(message__in=messages).order_by('id'))
+        for call, (_, timestamp) in zip(created, calls):
+            call.timestamp = parse_datetime(timestamp)
+        ToolCall.objects.bulk_update(created, ['timestamp'], batch_size=500)
+
+        if archive:
+            archive.delete()
+    return len(messages)
@@ -0,0 +1,115 @@
+# agent_app/cache.py
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+
+from .dataset import current_generation
+
+# Single-quoted SQL string literals ('' is an escaped quote inside a literal)
+_SQL_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical cache key for a SQL statement: whitespace collapsed, trailing semicolons removed
+    and everything outside string literals lower-cased, so trivially different spellings of
+    the same query share one entry while 'Dubai' and 'dubai' literals stay distinct.
+    """
+    parts = _SQL_LITERAL_RE.split(sql.strip().rstrip(';').strip())
+    return "".join(
+        part if i % 2 else re.sub(r'\s+', ' ', part).lower()
+        for i, part in enumerate(parts)
+    )
+
+
+class QueryResultCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL, tied to the catalogue generation.
+
+    Entries are dropped all at once when setup_db.py bumps the generation, so results
+    never outlive the data they were computed from.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 600.0,
+        generation: Callable[[], int] = current_generation,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._generation_source = generation
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_generation(self) -> None:
+        """Clears the cache if the data was reloaded since the entries were stored (lock held)."""
+        generation = self._generation_source()
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (True, value) on a hit and (False, None) on a miss or expired entry."""
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if self._clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._check_generation()
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'generation': self._generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Process-wide cache for the agent's SQL tool
+sql_result_cache = QueryResultCache(
+    maxsize=getattr(settings, 'AGENT_SQL_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'AGENT_SQL_CACHE_TTL', 600.0),
+)
@@ -0,0 +1,267 @@
+# agent_app/checkpoint.py
+
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+from .models import GraphCheckpoint, GraphCheckpointWrite
+
+
+class DjangoCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    LangGraph checkpointer that stores graph state in the Django database.
+    
+    Each conversation is a thread (thread_id = Conversation id), so a chat turn only has to
+    send the new message: the previous state, including ToolMessages, is loaded from the
+    latest checkpoint. Only the most recent `keep_last` checkpoints per thread are kept
+    (pruned at the start of each turn), since the app never time-travels to older ones.
+    """
+
+    def __init__(self, *, keep_last: Optional[int] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.keep_last = keep_last or getattr(settings, 'AGENT_CHECKPOINTS_KEPT', 3)
+
+    # --- Helpers ---
+
+    @staticmethod
+    def _thread_config(thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[RunnableConfig]:
+        if not checkpoint_id:
+            return None
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    def _pending_writes(self, row: GraphCheckpoint) -> list:
+        writes = GraphCheckpointWrite.objects.filter(
+            thread_id=row.thread_id,
+            checkpoint_ns=row.checkpoint_ns,
+            checkpoint_id=row.checkpoint_id,
+        )
+        ordered = sorted(writes, key=lambda w: writes_sort_key(w.task_path, w.task_id, w.idx))
+        return [
+            (w.task_id, w.channel, self.serde.loads_typed((w.value_type, bytes(w.value))))
+            for w in ordered
+        ]
+
+    def _to_tuple(self, row: GraphCheckpoint) -> CheckpointTuple:
+        return CheckpointTuple(
+            config=self._thread_config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self.serde.loads_typed((row.checkpoint_type, bytes(row.checkpoint))),
+            metadata=self.serde.loads_typed((row.metadata_type, bytes(row.metadata))),
+            parent_config=self._thread_config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id),
+            pending_writes=self._pending_writes(row),
+        )
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Deletes all but the newest keep_last checkpoints (and their writes) of a thread."""
+        # Checkpoint ids are time-ordered, so everything older than the keep_last-th newest goes
+        cutoff = (
+            GraphCheckpoint.objects
+            .filter(thread_id=thread_id, checkpoint_ns=checkpoint_ns)
+            .order_by('-checkpoint_id')
+            .values_list('checkpoint_id', flat=True)[self.keep_last - 1:self.keep_last]
+            .first()
+        )
+        if cutoff:
+            GraphCheckpointWrite.objects.filter(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id__lt=cutoff
+            ).delete()
+            GraphCheckpoint.objects.filter(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id__lt=cutoff
+            ).delete()
+
+    # --- Sync API ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Returns the requested checkpoint, or the latest one of the thread if no id is given."""
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        rows = GraphCheckpoint.objects.filter(thread_id=thread_id, checkpoint_ns=checkpoint_ns)
+        
+        if checkpoint_id := get_checkpoint_id(config):
+            row = rows.filter(checkpoint_id=checkpoint_id).first()
+        else:
+            row = rows.order_by('-checkpoint_id').first()
+        
+        return self._to_tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Lists checkpoints newest first, optionally filtered by thread, metadata and position."""
+        rows = GraphCheckpoint.objects.order_by('-checkpoint_id')
+        
+        if config:
+            rows = rows.filter(thread_id=str(config["configurable"]["thread_id"]))
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                rows = rows.filter(checkpoint_ns=checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                rows = rows.filter(checkpoint_id=checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            rows = rows.filter(checkpoint_id__lt=before_id)
+        
+        for row in rows:
+            checkpoint_tuple = self._to_tuple(row)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Stores a checkpoint. The thread's older ones are pruned once per turn, when the turn's
+        first checkpoint ("input", or "update" for update_state) is written, not on every step.
+        """
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        
+        row = GraphCheckpoint(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+            checkpoint_type=checkpoint_type,
+            checkpoint=checkpoint_blob,
+            metadata_type=metadata_type,
+            metadata=metadata_blob,
+        )
+        if metadata.get("source") == "loop":
+            self._upsert(row)
+        else:
+            # One transaction for the write and the prune of the previous turns' checkpoints
+            with transaction.atomic():
+                self._upsert(row)
+                self._prune(thread_id, checkpoint_ns)
+        
+        return self._thread_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    @staticmethod
+    def _upsert(row: GraphCheckpoint) -> None:
+        # Single-statement upsert: avoids the read-then-write lock upgrade that makes
+        # concurrent SQLite writers fail with "database is locked"
+        GraphCheckpoint.objects.bulk_create(
+            [row],
+            update_conflicts=True,
+            unique_fields=['thread_id', 'checkpoint_ns', 'checkpoint_id'],
+            update_fields=['parent_checkpoint_id', 'checkpoint_type', 'checkpoint', 'metadata_type', 'metadata'],
+        )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Stores the pending writes of a task against the current checkpoint."""
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        
+        regular_writes, special_writes = [], []
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            value_type, value_blob = self.serde.dumps_typed(value)
+            row = GraphCheckpointWrite(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint_id,
+                task_id=task_id,
+                task_path=task_path,
+                idx=write_idx,
+                channel=channel,
+                value_type=value_type,
+                value=value_blob,
+            )
+            (special_writes if write_idx < 0 else regular_writes).append(row)
+        
+        # Regular writes are idempotent; special channels (errors, interrupts...) overwrite
+        if regular_writes:
+            GraphCheckpointWrite.objects.bulk_create(regular_writes, ignore_conflicts=True)
+        if special_writes:
+            GraphCheckpointWrite.objects.bulk_create(
+                special_writes,
+                update_conflicts=True,
+                unique_fields=['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'],
+                update_fields=['task_path', 'channel', 'value_type', 'value'],
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Deletes every checkpoint and write of a thread."""
+        with transaction.atomic():
+            GraphCheckpointWrite.objects.filter(thread_id=str(thread_id)).delete()
+            GraphCheckpoint.objects.filter(thread_id=str(thread_id)).delete()
+
+    # --- Async API (the ORM calls run in a worker thread) ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await sync_to_async(self.get_tuple)(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await sync_to_async(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )()
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await sync_to_async(self.put)(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await sync_to_async(self.put_writes)(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await sync_to_async(self.delete_thread)(thread_id)
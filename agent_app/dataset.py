@@ -0,0 +1,53 @@
+# agent_app/dataset.py
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import DatasetVersion
+
+# Name of the DatasetVersion row tracking the property catalogue
+PROPERTY_DATASET = 'projects'
+
+# How often (seconds) a process re-reads the generation from the database.
+# Between checks, cached data derived from the catalogue is served without touching the DB.
+CHECK_INTERVAL = getattr(settings, 'AGENT_DATA_VERSION_CHECK_SECONDS', 5.0)
+
+_lock = threading.Lock()
+_cached_generation = 0
+_checked_at = float('-inf')
+
+
+def current_generation(max_age: float = CHECK_INTERVAL) -> int:
+    """Returns the catalogue generation, re-reading it from the DB at most every max_age seconds."""
+    global _cached_generation, _checked_at
+    
+    now = time.monotonic()
+    if now - _checked_at < max_age:
+        return _cached_generation
+    
+    with _lock:
+        if now - _checked_at >= max_age:
+            _cached_generation = (
+                DatasetVersion.objects
+                .filter(name=PROPERTY_DATASET)
+                .values_list('generation', flat=True)
+                .first()
+            ) or 0
+            _checked_at = time.monotonic()
+    return _cached_generation
+
+
+def bump_generation() -> int:
+    """Marks the catalogue as reloaded. Called by the data loader after it writes Project rows."""
+    global _cached_generation, _checked_at
+    
+    DatasetVersion.objects.get_or_create(name=PROPERTY_DATASET)
+    DatasetVersion.objects.filter(name=PROPERTY_DATASET).update(generation=F('generation') + 1)
+    
+    with _lock:
+        _cached_generation = DatasetVersion.objects.get(name=PROPERTY_DATASET).generation
+        _checked_at = time.monotonic()
+    return _cached_generation
@@ -0,0 +1,110 @@
+# agent_app/formatting.py
+
+import math
+import re
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from django.conf import settings
+
+# Approximate prompt tokens one tool result may add (rows beyond it are summarized as omitted)
+TOKEN_BUDGET = getattr(settings, 'AGENT_TOOL_RESULT_TOKEN_BUDGET', 800)
+
+# Long text values (descriptions, features, facilities) are cut to this many characters
+TEXT_CHARS = getattr(settings, 'AGENT_TOOL_TEXT_CHARS', 160)
+
+SEPARATOR = '|'
+DITTO = '"'
+LEGEND = f"{DITTO} = same as row above"
+
+# Values that mean "nothing" in the CSV-loaded catalogue
+_EMPTY = {'', 'nan', 'none', 'null', '[]'}
+
+
+def approx_tokens(text: str) -> int:
+    """Same estimate as count_tokens_approximately: about four characters per token."""
+    return math.ceil(len(text) / 4)
+
+
+def format_value(value: Any, text_chars: int = TEXT_CHARS) -> str:
+    """One cell: integral numbers without decimals, text on one line and truncated, empties blank."""
+    if value is None:
+        return ''
+    if isinstance(value, (float, Decimal)):
+        if value != value:  # NaN
+            return ''
+        return str(int(value)) if value == int(value) else f"{float(value):.2f}"
+    text = ' '.join(str(value).split())
+    if text.lower() in _EMPTY:
+        return ''
+    # A cell must not read as a column break or as a ditto mark
+    text = text.replace(SEPARATOR, '/')
+    if text == DITTO:
+        text = "''"
+    return text if len(text) <= text_chars else text[:text_chars - 1].rstrip() + '…'
+
+
+def format_table(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    title: str = '',
+    total: Optional[int] = None,
+    token_budget: int = TOKEN_BUDGET,
+    text_chars: int = TEXT_CHARS,
+) -> str:
+    """
+    Compact, token-budgeted rendering of a result set for the model:
+
+        <title>
+        same for all rows: city=Dubai
+        " = same as row above
+        project_name|no_of_bedrooms|price_usd
+        Burj Vista|2|1200000
+        "|3|1850000
+        (12 more rows omitted)
+
+    Columns with one value on every row are stated once, a value repeated from the row above
+    is written as " (with a legend line when one is used), long text is truncated, and rows stop
+    once the token budget is spent.
+    total is the full match count when rows is only the first page of it.
+    """
+    lines = [title] if title else []
+    cells = [[format_value(v, text_chars) for v in row] for row in rows]
+    total = len(rows) if total is None else total
+
+    # 1. Hoist columns that hold the same value on every row
+    keep = list(range(len(columns)))
+    if len(cells) > 1:
+        constant = [i for i in keep if all(row[i] == cells[0][i] for row in cells)]
+        if constant and len(constant) < len(columns):
+            lines.append("same for all rows: " + "; ".join(f"{columns[i]}={cells[0][i] or '(blank)'}" for i in constant))
+            keep = [i for i in keep if i not in constant]
+
+    header = len(lines)
+    lines.append(SEPARATOR.join(columns[i] for i in keep))
+    used = approx_tokens("\n".join(lines)) + approx_tokens(LEGEND) + 1
+
+    # 2. Rows, with ditto marks for repeats of the value above, until the budget is spent
+    shown, dittos = 0, False
+    previous: List[str] = []
+    for row in cells:
+        values = [row[i] for i in keep]
+        compact = [
+            DITTO if previous and value == previous[j] and len(value) > len(DITTO) else value
+            for j, value in enumerate(values)
+        ]
+        line = SEPARATOR.join(compact)
+        cost = approx_tokens(line) + 1
+        if shown and used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+        shown += 1
+        dittos = dittos or DITTO in compact
+        previous = values
+
+    if dittos:
+        lines.insert(header, LEGEND)
+    if total > shown:
+        lines.append(f"({total - shown} more rows omitted)")
+    return "\n".join(lines)
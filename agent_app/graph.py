@@ -1,124 +1,294 @@
-import os
-from typing import TypedDict, Annotated, List
-from langchain_core.messages import BaseMessage, AIMessage
-
-# For the ReAct agent in LangGraph
-from langgraph.prebuilt import create_react_agent
+import functools
+import threading
+from typing import TypedDict, Annotated, Callable, List, Optional, TypeVar
+from typing_extensions import NotRequired  # typing.NotRequired needs Python 3.11
+from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, RemoveMessage
+from langchain_core.runnables import RunnableLambda
 
 # Core components for the agent
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from langgraph.graph.message import add_messages
 from langchain_core.language_models import BaseChatModel
 
-# SQL and Database setup
-from langchain_community.utilities import SQLDatabase 
-from langchain_community.tools import QuerySQLDatabaseTool
-from django.db import connection
-from django.conf import settings
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
-
-# Helper function to create SQLAlchemy engine from Django settings
-def get_sqlalchemy_engine():
-    db_config = settings.DATABASES['default'].copy()
-    engine_str = db_config.pop('ENGINE', '')
-    name = db_config.pop('NAME')
-    user = db_config.pop('USER', '')
-    password = quote_plus(db_config.pop('PASSWORD', ''))
-    host = db_config.pop('HOST', '')
-    port = db_config.pop('PORT', '')
-    
-    # Pop other irrelevant keys
-    db_config.pop('OPTIONS', None)
-    db_config.pop('TEST', None)
-    db_config.pop('TIME_ZONE', None)
-    db_config.pop('CONN_MAX_AGE', None)
-    
-    if 'sqlite' in engine_str:
-        url = f"sqlite:///{name}"
-    elif 'postgresql' in engine_str:
-        url = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}"
-    elif 'mysql' in engine_str:
-        url = f"mysql+pymysql://{user}:{password}@{host}:{port}/{name}"
-    elif 'oracle' in engine_str:
-        url = f"oracle+cx_oracle://{user}:{password}@{host}:{port}/{name}"
-    else:
-        raise ValueError(f"Unsupported database engine: {engine_str}")
-    
-    return create_engine(url)
+from .checkpoint import DjangoCheckpointSaver
+from .llm_scheduler import PRIORITY_KEY, scheduled
+from .memory import TOKEN_BUDGET, extract_preferences, memory_context, split_for_budget, summarize
+from .metrics import ROUTER_TURNS, run_callbacks, span
+from .models import Conversation
+from .property_index import get_property_index, search_properties_tool
+from .router import route_message
+from .amenity_search import search_amenities_tool
+
+# The engine, SQLDatabase, chat model, ReAct agent and compiled graph are built on first use
+# (see the get_* accessors below) rather than at import time, so importing this module, which
+# happens whenever the URLconf loads, stays cheap for manage.py commands and needs no API key.
+# Production workers call warm_up() at boot so the first request does not pay the build cost.
+
+T = TypeVar('T')
+
+_build_lock = threading.RLock()
+
+
+def _lazy(builder: Callable[[], T]) -> Callable[[], T]:
+    """
+    Turns a builder into an accessor that builds once per process (thread-safe) and then
+    returns the same object. accessor.reset() drops it so the next call rebuilds, and
+    accessor.set(value) replaces it.
+    """
+    built = []
+
+    def set_value(value: T) -> None:
+        with _build_lock:
+            built[:] = [value]
+
+    @functools.wraps(builder)
+    def accessor() -> T:
+        if not built:
+            with _build_lock:
+                if not built:
+                    built.append(builder())
+        return built[0]
+
+    accessor.reset = built.clear
+    accessor.set = set_value
+    return accessor
 
 # --- 1. Tool Setup: Database Connection ---
 
-# Create SQLAlchemy engine using Django settings
-engine = get_sqlalchemy_engine()
+@_lazy
+def get_engine():
+    """Pooled, read-only SQLAlchemy engine for the agent's SQL tool (see agent_app/agent_db.py)."""
+    from .agent_db import create_agent_engine
+    return create_agent_engine()
+
 
-# Initialize SQLDatabase using the engine
-db = SQLDatabase(engine=engine, include_tables=['agent_app_project'])
+@_lazy
+def get_db():
+    """SQLDatabase over the property tables (reflecting the schema is the slow part)."""
+    from langchain_community.utilities import SQLDatabase
+    return SQLDatabase(engine=get_engine(), include_tables=['agent_app_project', 'agent_app_unit'])
 
-# Create the SQL tool for the agent to use
-property_retrieval_tool = QuerySQLDatabaseTool(
-    db=db, 
-    name="retrieve_property_info"
-)
-tools = [property_retrieval_tool]
+
+@_lazy
+def get_tools() -> list:
+    """The agent's tools; the SQL tool (sync and async capable) wraps get_db()."""
+    # pandas-backed modules are imported here, not at module level, to keep the import cheap
+    from .aggregates import market_stats_tool
+    from .similarity import similar_projects_tool
+    from .sql_tool import PropertySQLTool
+    property_retrieval_tool = PropertySQLTool(
+        db=get_db(), 
+        name="retrieve_property_info"
+    )
+    return [search_properties_tool, search_amenities_tool, property_retrieval_tool, market_stats_tool, similar_projects_tool]
 
 # --- 2. Agent Model and Chain Setup ---
 
-# Initialize the Chat Model 
-# (Ensure OPENAI_API_KEY is set in your environment)
-model: BaseChatModel = ChatOpenAI(model="gpt-4o", temperature=0)
+@_lazy
+def get_model() -> BaseChatModel:
+    """
+    The chat model (ensure OPENAI_API_KEY is set in your environment), behind the LLM scheduler
+    (agent_app/llm_scheduler.py), which does the retrying.
+    """
+    from langchain_openai import ChatOpenAI
+    return scheduled(ChatOpenAI(model="gpt-4o", temperature=0, max_retries=0))
 
 # Define the System Prompt
 SYSTEM_PROMPT = """
 You are Silver Land Properties AI assistant, a specialized property sales agent.
 Your primary goal is to understand the user's preferences (city, unit size, budget) and recommend suitable properties from the database using the available tools.
-Use the 'retrieve_property_info' tool ONLY when you need to search the database based on specific criteria (e.g., city, bedrooms, price).
-The table to query is 'agent_app_project'. The key columns are: 'project_name', 'city', 'no_of_bedrooms', 'price_usd'.
+For searches by city, bedrooms, price range, property type, completion status or area, use the 'search_properties' tool.
+For amenity or feature requests (e.g., pool, gym, co-working, beach access), use the 'search_amenities' tool, adding any city/price/bedroom filters.
+For averages, price ranges, unit counts and price per square metre of a segment (e.g., average price of a 2-bed in Chicago, cheapest villas by city), use the 'market_stats' tool.
+For recommendations like a project the user names or describes (e.g., "something like St. Regis but cheaper"), use the 'similar_projects' tool.
+Use the 'retrieve_property_info' SQL tool ONLY for questions the other tools cannot answer (e.g., developers).
+The tables are 'agent_app_project' (one row per project: 'id', 'project_name', 'developer_name', 'city', 'project_description', 'facilities')
+and 'agent_app_unit' (one row per unit for sale: 'project_id', 'no_of_bedrooms', 'price_usd', 'area_sq_mtrs', 'property_type', 'completion_status', 'features').
+Join them on agent_app_unit.project_id = agent_app_project.id; count projects on agent_app_project and units on agent_app_unit.
+SQL must be a single SELECT on these tables; results are capped at a few dozen rows, so select only the columns you need.
 Do not make up project names or details. If the tool returns no results, state that politely.
 After providing recommendations, you must subtly nudge the user toward scheduling a property viewing.
 """
 
-# Build the ReAct agent using LangGraph (replaces legacy AgentExecutor)
-agent_executor = create_react_agent(
-    model, 
-    tools, 
-    prompt=SYSTEM_PROMPT
-)
+@_lazy
+def get_agent_executor():
+    """The ReAct agent built with LangGraph (replaces legacy AgentExecutor)."""
+    from langgraph.prebuilt import create_react_agent
+    # checkpointer=False: the inner agent runs inside the "agent" node, whose outer graph
+    # already checkpoints the conversation, so it must not inherit the outer checkpointer
+    return create_react_agent(
+        get_model(), 
+        get_tools(), 
+        prompt=SYSTEM_PROMPT,
+        checkpointer=False
+    )
 
 # --- 3. LangGraph State Definition ---
 
 class ConversationState(TypedDict):
     """Represents the state of our conversation."""
     conversation_id: str
-    messages: Annotated[List[BaseMessage], lambda x, y: x + y] 
+    # add_messages (rather than plain concatenation) lets the memory node drop folded turns via RemoveMessage
+    messages: Annotated[List[BaseMessage], add_messages] 
     lead_data: dict 
+    summary: NotRequired[str]
 
 
 # --- 4. LangGraph Node Definition ---
 
+def known_cities() -> tuple:
+    """Distinct city names in the catalogue, used to spot a city in user messages."""
+    return get_property_index().cities
+
+
+def memory_node(state: ConversationState):
+    """
+    Keeps the prompt within the token budget: pins preferences from the latest user message
+    into lead_data and, once the history exceeds AGENT_MEMORY_TOKEN_BUDGET, folds the oldest
+    turns into a running summary (stored on the Conversation) and removes them from the state.
+    """
+    
+    with span('memory'):
+        return _memory_update(state)
+
+
+def _memory_update(state: ConversationState) -> dict:
+    messages = state['messages']
+    update = {}
+    
+    # 1. Pin preferences mentioned in the latest user message
+    latest_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+    if latest_human is not None:
+        preferences = extract_preferences(str(latest_human.content), known_cities())
+        if preferences:
+            update["lead_data"] = {**state.get('lead_data', {}), **preferences}
+    
+    # 2. Fold the turns that no longer fit the budget into the summary
+    older, _recent = split_for_budget(messages, TOKEN_BUDGET)
+    if older:
+        summary = summarize(get_model(), state.get('summary', ''), older)
+        update["summary"] = summary
+        update["messages"] = [RemoveMessage(id=m.id) for m in older]
+        Conversation.objects.filter(id=state['conversation_id']).update(summary=summary)
+    
+    return update
+
+
+def router_node(state: ConversationState):
+    """
+    Answers greetings, catalogue questions (cities, developers, price ranges) and plain filter
+    searches from the local index (agent_app/router.py); every other message goes on to the agent.
+    """
+    
+    latest = state['messages'][-1] if state['messages'] else None
+    if not isinstance(latest, HumanMessage):
+        return {}
+    
+    with span('router'):
+        route, reply = route_message(str(latest.content))
+    ROUTER_TURNS.inc(route=route)
+    
+    if reply is None:
+        return {}
+    return {"messages": [AIMessage(content=reply, response_metadata={"route": route})]}
+
+
+def after_router(state: ConversationState) -> str:
+    """Ends the turn when the router answered it, otherwise runs the agent."""
+    return END if isinstance(state['messages'][-1], AIMessage) else "agent"
+
+
+def _agent_input(state: ConversationState) -> List[BaseMessage]:
+    """The agent sees the summary and pinned preferences, followed by the recent turns."""
+    context = memory_context(state.get('summary', ''), state.get('lead_data', {}))
+    return ([context] if context else []) + list(state['messages'])
+
+
 def agent_node(state: ConversationState):
     """Node that runs the ReAct agent logic."""
     
-    messages = state['messages']
+    messages = _agent_input(state)
     
-    # Invoke the ReAct agent with the conversation history
-    result = agent_executor.invoke({"messages": messages})
+    # Invoke the ReAct agent with the (budgeted) conversation history
+    result = get_agent_executor().invoke({"messages": messages})
     
     # Return only the newly added messages to append to state
     return {"messages": result["messages"][len(messages):]}
 
 
-# --- 5. LangGraph Graph Builder (Simplified) ---
+async def aagent_node(state: ConversationState):
+    """Async version of agent_node, used by agent_graph.ainvoke / astream."""
+    
+    messages = _agent_input(state)
+    
+    result = await get_agent_executor().ainvoke({"messages": messages})
+    
+    return {"messages": result["messages"][len(messages):]}
+
+
+# --- 5. LangGraph Graph Builder ---
+
+@_lazy
+def get_agent_graph():
+    """The compiled conversation graph."""
+    workflow = StateGraph(ConversationState)
+
+    # Memory management runs first, then the router, then (unless the router answered) the agent
+    # (sync and async implementations of the same step)
+    workflow.add_node("memory", memory_node)
+    workflow.add_node("router", router_node)
+    workflow.add_node("agent", RunnableLambda(agent_node, afunc=aagent_node, name="agent"))
+
+    # Set the entry point and connect memory -> router -> (agent ->) end
+    workflow.set_entry_point("memory")
+    workflow.add_edge("memory", "router")
+    workflow.add_conditional_edges("router", after_router, {"agent": "agent", END: END})
+    workflow.add_edge("agent", END)
+
+    # Compile the graph with a DB-backed checkpointer, so each conversation's state
+    # (including ToolMessages) persists between turns and only new messages are sent in
+    return workflow.compile(checkpointer=DjangoCheckpointSaver())
+
+
+def use_model(model: BaseChatModel) -> None:
+    """Swaps the chat model (e.g. for the local stand-in in benchmarks/) and rebuilds the agent around it."""
+    get_model.set(scheduled(model))
+    get_agent_executor.reset()
+
+
+def warm_up() -> None:
+    """Builds everything the first chat request needs. Call it once per worker at boot (see README)."""
+    from .similarity import get_project_vectors
+    get_agent_graph()
+    get_agent_executor()
+    get_property_index()
+    get_project_vectors()
+
+
+# Old module attribute names, now resolved (and built) on first access
+_ACCESSORS = {
+    'engine': get_engine,
+    'db': get_db,
+    'tools': get_tools,
+    'model': get_model,
+    'agent_executor': get_agent_executor,
+    'agent_graph': get_agent_graph,
+}
 
-# Build the graph
-workflow = StateGraph(ConversationState)
 
-# Add the single agent node
-workflow.add_node("agent", agent_node)
+def __getattr__(name):
+    if name in _ACCESSORS:
+        return _ACCESSORS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Set the entry point and connect it directly to the end
-workflow.set_entry_point("agent")
-workflow.add_edge("agent", END)
 
-# Compile the graph
-agent_graph = workflow.compile()
\ No newline at end of file
+def thread_config(conversation_id, priority: Optional[int] = None) -> dict:
+    """
+    Returns the run config that selects a conversation's checkpoint thread. It also carries
+    the metrics callback, which times every model call of the run (agent_app/metrics.py),
+    and the priority of the run's model calls in the LLM scheduler.
+    """
+    config = {"configurable": {"thread_id": str(conversation_id)}, "callbacks": run_callbacks()}
+    if priority is not None:
+        config["metadata"] = {PRIORITY_KEY: priority}
+    return config
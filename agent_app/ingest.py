@@ -0,0 +1,217 @@
+# agent_app/ingest.py
+
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+
+import pandas as pd
+from django.db import transaction
+
+from .models import Project, Unit
+
+# CSV header -> Project / Unit field
+CSV_COLUMNS = {
+    'Project name': 'project_name',
+    'No of bedrooms': 'no_of_bedrooms',
+    'Completion status (off plan/available)': 'completion_status',
+    'bathrooms': 'bathrooms',
+    'unit type': 'unit_type',
+    'developer name': 'developer_name',
+    'Price (USD)': 'price_usd',
+    'Area (sq mtrs)': 'area_sq_mtrs',
+    'Property type (apartment/villa)': 'property_type',
+    'city': 'city',
+    'country': 'country',
+    'completion_date': 'completion_date',
+    'features': 'features',
+    'facilities': 'facilities',
+    'Project description': 'project_description',
+}
+
+FIELDS = list(CSV_COLUMNS.values())
+TEXT_FIELDS = [
+    'project_name', 'completion_status', 'unit_type', 'developer_name', 'property_type',
+    'city', 'country', 'features', 'facilities', 'project_description',
+]
+NULLABLE_INT_FIELDS = ['no_of_bedrooms', 'bathrooms', 'area_sq_mtrs']
+
+# Columns the CSV repeats on every row of a project; the rest belong to the unit
+PROJECT_FIELDS = ['project_name', 'developer_name', 'city', 'country', 'project_description', 'facilities']
+UNIT_FIELDS = [f for f in FIELDS if f not in PROJECT_FIELDS]
+
+# Columns that identify a unit across reloads (a price or description change is an update, not a new unit)
+KEY_FIELDS = ['project_name', 'developer_name', 'city', 'unit_type', 'no_of_bedrooms', 'bathrooms', 'area_sq_mtrs']
+
+# Dates in the CSV are day-first (e.g. 15-10-2021); an explicit format keeps every chunk parsed the same way
+DATE_FORMAT = '%d-%m-%Y'
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s): "
+            f"{self.inserted} inserted, {self.updated} updated, {self.deleted} deleted, {self.unchanged} unchanged"
+        )
+
+
+def _hash_columns(frame: pd.DataFrame) -> pd.Series:
+    """Stable 64-bit hash per row (hex), computed on the string form so dtype differences between chunks don't matter."""
+    hashes = pd.util.hash_pandas_object(frame.astype(str), index=False)
+    return hashes.map('{:016x}'.format)
+
+
+def project_keys(frame: pd.DataFrame) -> pd.Series:
+    """Identity of the project each row belongs to (rows with equal project columns share one Project)."""
+    return _hash_columns(frame[PROJECT_FIELDS])
+
+
+class _ChunkCleaner:
+    """Vectorized cleanup of CSV chunks. Carries state (last project name, key counts) from one chunk to the next."""
+
+    def __init__(self):
+        self.last_project_name = 'Unknown Project Name'
+        self.key_counts: Dict[str, int] = {}
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        df = chunk.rename(columns=CSV_COLUMNS)[FIELDS]
+
+        # 1. Text: NaN -> '' (instead of the literal 'nan' a row-by-row load stores)
+        df[TEXT_FIELDS] = df[TEXT_FIELDS].fillna('').astype(str)
+
+        # 2. Continuation rows (blank name) belong to the preceding named project
+        names = df['project_name'].str.strip().replace('', pd.NA)
+        names.iloc[0:1] = names.iloc[0:1].fillna(self.last_project_name)
+        df['project_name'] = names.ffill()
+        self.last_project_name = df['project_name'].iloc[-1]
+
+        # 3. Numbers and dates: NaN/NaT -> None
+        for field in NULLABLE_INT_FIELDS:
+            df[field] = pd.to_numeric(df[field], errors='coerce').round().astype('Int64')
+        df['completion_date'] = pd.to_datetime(df['completion_date'], format=DATE_FORMAT, errors='coerce').dt.date
+        df = df.astype(object).where(df.notna(), None)
+
+        # 4. Identity and content hashes; repeated identities get an occurrence suffix
+        keys = _hash_columns(df[KEY_FIELDS])
+        occurrence = keys.groupby(keys).cumcount() + keys.map(self.key_counts).fillna(0).astype(int)
+        for key, count in keys.value_counts().items():
+            self.key_counts[key] = self.key_counts.get(key, 0) + count
+        df['source_key'] = keys.where(occurrence == 0, keys + ':' + occurrence.astype(str))
+        df['content_hash'] = _hash_columns(df[FIELDS])
+        df['project_key'] = project_keys(df)
+        return df
+
+
+def read_chunks(csv_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yields cleaned chunks of the catalogue CSV, ready to be written as Project and Unit rows."""
+    clean = _ChunkCleaner()
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        yield clean(chunk)
+
+
+def _ensure_projects(df: pd.DataFrame, projects: Dict[str, int]) -> None:
+    """Creates the chunk's projects that are not in `projects` yet (project_key -> id), and adds them to it."""
+    new = df[~df['project_key'].isin(projects.keys())].drop_duplicates('project_key')
+    created = Project.objects.bulk_create(
+        [Project(source_key=record['project_key'], **{f: record[f] for f in PROJECT_FIELDS}) for record in new.to_dict('records')]
+    )
+    projects.update((project.source_key, project.pk) for project in created)
+
+
+def _units(df: pd.DataFrame, projects: Dict[str, int]) -> List[Unit]:
+    return [
+        Unit(project_id=projects[record['project_key']], **{f: record[f] for f in UNIT_FIELDS + ['source_key', 'content_hash']})
+        for record in df.to_dict('records')
+    ]
+
+
+def load_full(csv_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> IngestStats:
+    """Replaces the catalogue: deletes every Project (and Unit), then inserts the CSV one chunk (transaction) at a time."""
+    stats = IngestStats()
+    started = time.perf_counter()
+
+    with transaction.atomic():
+        _, deleted = Project.objects.all().delete()
+    stats.deleted = deleted.get(Unit._meta.label, 0)
+
+    projects: Dict[str, int] = {}
+    for df in read_chunks(csv_path, chunk_size):
+        with transaction.atomic():
+            _ensure_projects(df, projects)
+            Unit.objects.bulk_create(_units(df, projects), batch_size=chunk_size)
+        stats.rows += len(df)
+        stats.inserted += len(df)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def load_incremental(csv_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> IngestStats:
+    """
+    Upserts the CSV into the catalogue, writing only the differences: units are matched on source_key,
+    rewritten when their content_hash changed, and units missing from the CSV are deleted at the end,
+    together with the projects left without units. Each chunk is its own short transaction, so the
+    app can keep serving while this runs.
+    """
+    stats = IngestStats()
+    started = time.perf_counter()
+
+    existing: Dict[str, Tuple[int, str]] = {
+        key: (pk, content_hash)
+        for pk, key, content_hash in Unit.objects.exclude(source_key='').values_list('id', 'source_key', 'content_hash')
+    }
+    projects: Dict[str, int] = dict(Project.objects.exclude(source_key='').values_list('source_key', 'id'))
+    seen = set()
+
+    for df in read_chunks(csv_path, chunk_size):
+        stats.rows += len(df)
+        current = df['source_key'].map(lambda key: existing.get(key, (None, None)))
+        ids = current.str[0]
+        new = ids.isna()
+        changed = ~new & (current.str[1] != df['content_hash'])
+        seen.update(df['source_key'])
+
+        with transaction.atomic():
+            _ensure_projects(df[new | changed], projects)
+            to_update = _units(df[changed], projects)
+            for unit, pk in zip(to_update, ids[changed]):
+                unit.pk = int(pk)
+            Unit.objects.bulk_create(_units(df[new], projects), batch_size=chunk_size)
+            Unit.objects.bulk_update(to_update, ['project'] + UNIT_FIELDS + ['content_hash'], batch_size=chunk_size)
+
+        stats.inserted += int(new.sum())
+        stats.updated += int(changed.sum())
+        stats.unchanged += int((~new & ~changed).sum())
+
+    # Units that are no longer in the CSV, and units loaded before source keys existed
+    stale = [pk for key, (pk, _) in existing.items() if key not in seen]
+    stale += list(Unit.objects.filter(source_key='').values_list('id', flat=True))
+    for start in range(0, len(stale), chunk_size):
+        with transaction.atomic():
+            Unit.objects.filter(id__in=stale[start:start + chunk_size]).delete()
+    stats.deleted = len(stale)
+
+    # Projects whose units all moved or went away (e.g. after a description change). A project with
+    # visit bookings stays (without units, so it is off sale): deleting it would cascade to the bookings.
+    with transaction.atomic():
+        Project.objects.filter(units__isnull=True, visitbooking__isnull=True).delete()
+
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,456 @@
+# agent_app/llm_scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from django.conf import settings
+from django.db.models import Q
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from ninja.errors import HttpError
+from pydantic import Field
+
+from .memory import count_tokens
+from .metrics import LLM_QUEUE_SECONDS, LLM_REJECTED, LLM_RETRIES, span
+from .models import Lead, Message
+
+T = TypeVar('T')
+
+# --- 1. Configuration ---
+
+# Model calls in flight at once, per process
+MAX_CONCURRENCY = getattr(settings, 'AGENT_LLM_MAX_CONCURRENCY', 8)
+
+# Provider token budget per minute (prompt + completion), per process; 0 turns the budget off
+TOKENS_PER_MINUTE = getattr(settings, 'AGENT_LLM_TOKENS_PER_MINUTE', 30000)
+
+# Completion tokens reserved per call on top of the prompt; corrected with the real usage afterwards
+COMPLETION_TOKENS = getattr(settings, 'AGENT_LLM_COMPLETION_TOKENS', 400)
+
+# Calls allowed to wait; beyond that (or after waiting QUEUE_TIMEOUT seconds) the request gets a 503
+MAX_QUEUE = getattr(settings, 'AGENT_LLM_MAX_QUEUE', 64)
+QUEUE_TIMEOUT = getattr(settings, 'AGENT_LLM_QUEUE_TIMEOUT', 20.0)
+
+# Rate-limited (429) and transient (5xx, connection) errors are retried this often, with jittered exponential backoff
+MAX_RETRIES = getattr(settings, 'AGENT_LLM_MAX_RETRIES', 3)
+BACKOFF_BASE = getattr(settings, 'AGENT_LLM_BACKOFF_BASE', 1.0)
+BACKOFF_MAX = getattr(settings, 'AGENT_LLM_BACKOFF_MAX', 20.0)
+
+# Retry-After sent with a 503 when there is no better estimate
+RETRY_AFTER = getattr(settings, 'AGENT_LLM_RETRY_AFTER', 5)
+
+# How often waiting async callers look at the queue again (sync callers are woken on release)
+POLL_SECONDS = 0.05
+
+# Priorities, lowest first: leads who are booking, then ongoing conversations, then first turns
+BOOKING, RETURNING, NEW = 0, 1, 2
+PRIORITY_NAMES = {BOOKING: 'booking', RETURNING: 'returning', NEW: 'new'}
+
+# Key of the priority in a run's config metadata (see graph.thread_config)
+PRIORITY_KEY = 'llm_priority'
+
+
+class LLMUnavailable(HttpError):
+    """The model could not be called in time; retry_after (seconds) becomes the Retry-After header."""
+
+    def __init__(self, status_code: int, message: str, retry_after: float):
+        super().__init__(status_code, message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class LLMOverloaded(LLMUnavailable):
+    """503: the scheduler's queue is full or the call waited QUEUE_TIMEOUT seconds."""
+
+    def __init__(self, retry_after: float = RETRY_AFTER):
+        super().__init__(503, "The assistant is busy right now; please retry shortly.", retry_after)
+
+
+class LLMRateLimited(LLMUnavailable):
+    """429: the provider kept rate-limiting the call after MAX_RETRIES retries."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(429, "The assistant is rate-limited right now; please retry shortly.", retry_after)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ == 'RateLimitError'
+
+
+def retry_hint(error: BaseException) -> Optional[float]:
+    """
+    Seconds the provider asked to wait (its Retry-After header; 0.0 without one) if retrying
+    the error may help (rate limit, 5xx, timeout, connection error); None otherwise.
+    """
+    status = _status_code(error)
+    transient = type(error).__name__ in ('APIConnectionError', 'APITimeoutError') or (status is not None and status >= 500)
+    if not (is_rate_limit(error) or transient):
+        return None
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+# --- 2. Scheduler ---
+
+@dataclass(order=True)
+class _Ticket:
+    """A call waiting for (or holding) a slot; the queue is ordered by (priority, arrival)."""
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued: float = field(compare=False)
+    used: Optional[int] = field(default=None, compare=False)
+
+
+class LLMScheduler:
+    """
+    Admits chat model calls in priority order, within a concurrency limit and a tokens-per-minute
+    budget (a token bucket refilled continuously). Calls wait in a bounded queue; a full queue, a
+    wait longer than queue_timeout or a provider that keeps rate-limiting fails fast with an
+    LLMUnavailable error. A rate limit pauses admission for every caller until the backoff ends.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        max_queue: int = MAX_QUEUE,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._waiting: List[_Ticket] = []  # heap
+        self._seq = itertools.count()
+        self._running = 0
+        self._tokens = float(tokens_per_minute)
+        self._refilled = clock()
+        self._paused_until = 0.0
+        self.granted = 0
+        self.rejected = 0
+        self.retries = 0
+
+    # Queue bookkeeping (all with the lock held)
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled) * self.tokens_per_minute / 60)
+        self._refilled = now
+
+    def _reject(self, reason: str, retry_after: float = RETRY_AFTER) -> LLMOverloaded:
+        self.rejected += 1
+        LLM_REJECTED.inc(reason=reason)
+        return LLMOverloaded(max(retry_after, self._paused_until - self._clock()))
+
+    def _enqueue(self, priority: int, tokens: int, retry: bool) -> _Ticket:
+        with self._cond:
+            # A retry was already admitted once, so it does not count against the queue limit
+            if not retry and len(self._waiting) >= self.max_queue:
+                raise self._reject('queue_full')
+            # A budget smaller than one call would never admit it, so such a call waits for a full bucket
+            if self.tokens_per_minute:
+                tokens = min(tokens, self.tokens_per_minute)
+            ticket = _Ticket(priority, next(self._seq), tokens, self._clock())
+            heapq.heappush(self._waiting, ticket)
+            return ticket
+
+    def _drop(self, ticket: _Ticket) -> None:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def _try_grant(self, ticket: _Ticket) -> float:
+        """
+        Grants the ticket (returns 0.0) if it is first in line and a slot and its tokens are free;
+        otherwise returns how long to wait before trying again. Raises once it waited too long.
+        """
+        now = self._clock()
+        if now - ticket.enqueued > self.queue_timeout:
+            self._drop(ticket)
+            raise self._reject('timeout')
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._waiting[0] is not ticket or self._running >= self.max_concurrency:
+            return POLL_SECONDS
+        self._refill(now)
+        if self.tokens_per_minute and self._tokens < ticket.tokens:
+            return (ticket.tokens - self._tokens) * 60 / self.tokens_per_minute
+
+        heapq.heappop(self._waiting)
+        self._running += 1
+        self._tokens -= ticket.tokens
+        self.granted += 1
+        LLM_QUEUE_SECONDS.observe(now - ticket.enqueued, priority=PRIORITY_NAMES.get(ticket.priority, ticket.priority))
+        self._cond.notify_all()  # the next ticket may fit as well
+        return 0.0
+
+    def _release(self, ticket: _Ticket) -> None:
+        with self._cond:
+            self._running -= 1
+            # Settle the estimate against the tokens the provider reported
+            if self.tokens_per_minute and ticket.used is not None:
+                self._refill(self._clock())
+                self._tokens -= ticket.used - ticket.tokens
+            self._cond.notify_all()
+
+    # Acquiring a slot
+
+    @contextmanager
+    def slot(self, priority: int, tokens: int, retry: bool = False) -> Iterator[_Ticket]:
+        """Holds one slot (and reserves `tokens`) for the duration of the block. Set ticket.used when known."""
+        ticket = self._enqueue(priority, tokens, retry)
+        with span('llm_queue', priority=PRIORITY_NAMES.get(priority, priority)):
+            with self._cond:
+                try:
+                    while (delay := self._try_grant(ticket)) > 0:
+                        self._cond.wait(min(delay, 1.0))
+                except BaseException:
+                    self._drop(ticket)
+                    raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int, tokens: int, retry: bool = False) -> AsyncIterator[_Ticket]:
+        """Async version of slot (waits with asyncio.sleep, so the event loop stays free)."""
+        ticket = self._enqueue(priority, tokens, retry)
+        with span('llm_queue', priority=PRIORITY_NAMES.get(priority, priority)):
+            try:
+                while True:
+                    with self._cond:
+                        delay = self._try_grant(ticket)
+                    if not delay:
+                        break
+                    await asyncio.sleep(min(delay, POLL_SECONDS))
+            except BaseException:
+                with self._cond:
+                    self._drop(ticket)
+                raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def check_admission(self) -> None:
+        """Raises LLMOverloaded right away if a new call would be rejected (used before a stream starts)."""
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                raise self._reject('queue_full')
+            if self._paused_until - self._clock() > self.queue_timeout:
+                raise self._reject('paused')
+
+    # Retries
+
+    def backoff(self, error: Exception, attempt: int) -> float:
+        """
+        Seconds to wait before retrying a failed call. Re-raises errors that are not worth retrying,
+        raises LLMRateLimited once MAX_RETRIES is used up, and pauses admission on a rate limit.
+        """
+        hint = retry_hint(error)
+        if hint is None:
+            raise error
+        # Exponential backoff with jitter (half fixed, half random), never shorter than the provider asked for
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = max(hint, ceiling / 2 + random.uniform(0, ceiling / 2))
+        if attempt >= self.max_retries:
+            LLM_REJECTED.inc(reason='rate_limited' if is_rate_limit(error) else 'provider_error')
+            with self._cond:
+                self.rejected += 1
+            raise LLMRateLimited(delay) from error
+        with self._cond:
+            self.retries += 1
+            if is_rate_limit(error):
+                self._paused_until = max(self._paused_until, self._clock() + delay)
+        LLM_RETRIES.inc(reason='rate_limited' if is_rate_limit(error) else 'provider_error')
+        return delay
+
+    def remaining_backoff(self, delay: float) -> float:
+        """What is left of a backoff to sleep outside the queue (a rate limit pause is waited out in the queue)."""
+        return max(0.0, delay - max(0.0, self._paused_until - self._clock()))
+
+    def run(self, call: Callable[[], T], priority: int, tokens: int) -> T:
+        """Runs call() in a slot, retrying it after a backoff."""
+        for attempt in itertools.count():
+            with self.slot(priority, tokens, retry=attempt > 0) as ticket:
+                try:
+                    result = call()
+                except Exception as error:
+                    delay = self.backoff(error, attempt)
+                else:
+                    ticket.used = used_tokens(result)
+                    return result
+            time.sleep(self.remaining_backoff(delay))
+
+    async def arun(self, call: Callable[[], Awaitable[T]], priority: int, tokens: int) -> T:
+        """Async version of run."""
+        for attempt in itertools.count():
+            async with self.aslot(priority, tokens, retry=attempt > 0) as ticket:
+                try:
+                    result = await call()
+                except Exception as error:
+                    delay = self.backoff(error, attempt)
+                else:
+                    ticket.used = used_tokens(result)
+                    return result
+            await asyncio.sleep(self.remaining_backoff(delay))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = self._clock()
+            self._refill(now)
+            return {
+                'queue_depth': len(self._waiting),
+                'oldest_wait_seconds': max((now - t.enqueued for t in self._waiting), default=0.0),
+                'running': self._running,
+                'max_concurrency': self.max_concurrency,
+                'tokens_available': self._tokens if self.tokens_per_minute else 0,
+                'tokens_per_minute': self.tokens_per_minute,
+                'paused_seconds': max(0.0, self._paused_until - now),
+                'granted': self.granted,
+                'rejected': self.rejected,
+                'retries': self.retries,
+            }
+
+
+def used_tokens(message: Any) -> Optional[int]:
+    """Total tokens the provider reported for a reply (None if it did not report usage)."""
+    usage = getattr(message, 'usage_metadata', None) or {}
+    return usage.get('total_tokens')
+
+
+# Process-wide scheduler shared by every chat model call
+llm_scheduler = LLMScheduler()
+
+# --- 3. Scheduled chat model ---
+
+NO_CALLBACKS = {'callbacks': []}
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Wraps a chat model so every call (invoke, stream, sync or async) goes through an LLMScheduler.
+    The priority comes from the run's config metadata (PRIORITY_KEY, set by graph.thread_config).
+    """
+
+    chat_model: Any
+    scheduler: Any = Field(default_factory=lambda: llm_scheduler, exclude=True)
+
+    def _inner(self) -> BaseChatModel:
+        """The wrapped model without its tool binding."""
+        return getattr(self.chat_model, 'bound', self.chat_model)
+
+    @property
+    def _llm_type(self) -> str:
+        return self._inner()._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self._inner()._identifying_params
+
+    def _get_invocation_params(self, stop=None, **kwargs) -> Dict[str, Any]:
+        return self._inner()._get_invocation_params(stop=stop, **kwargs)
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self._inner()._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools, **kwargs) -> 'ScheduledChatModel':
+        return ScheduledChatModel(chat_model=self.chat_model.bind_tools(tools, **kwargs), scheduler=self.scheduler)
+
+    def _demand(self, messages: List[BaseMessage], run_manager) -> tuple:
+        """(priority, estimated tokens) of a call."""
+        metadata = getattr(run_manager, 'metadata', None) or {}
+        return metadata.get(PRIORITY_KEY, RETURNING), count_tokens(messages) + COMPLETION_TOKENS
+
+    # The wrapped model runs with no callbacks (it would otherwise inherit the run's from the context),
+    # so the call and its tokens are reported once, by this model's own run
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        priority, tokens = self._demand(messages, run_manager)
+        message = self.scheduler.run(lambda: self.chat_model.invoke(messages, NO_CALLBACKS, stop=stop, **kwargs), priority, tokens)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        priority, tokens = self._demand(messages, run_manager)
+        message = await self.scheduler.arun(lambda: self.chat_model.ainvoke(messages, NO_CALLBACKS, stop=stop, **kwargs), priority, tokens)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        # The slot is held until the last chunk; a call is only retried if it failed before its first chunk
+        priority, tokens = self._demand(messages, run_manager)
+        for attempt in itertools.count():
+            streamed = False
+            with self.scheduler.slot(priority, tokens, retry=attempt > 0) as ticket:
+                try:
+                    for chunk in self.chat_model.stream(messages, NO_CALLBACKS, stop=stop, **kwargs):
+                        streamed = True
+                        ticket.used = used_tokens(chunk) or ticket.used
+                        yield ChatGenerationChunk(message=chunk)
+                    return
+                except Exception as error:
+                    if streamed:
+                        raise
+                    delay = self.scheduler.backoff(error, attempt)
+            time.sleep(self.scheduler.remaining_backoff(delay))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        priority, tokens = self._demand(messages, run_manager)
+        for attempt in itertools.count():
+            streamed = False
+            async with self.scheduler.aslot(priority, tokens, retry=attempt > 0) as ticket:
+                try:
+                    async for chunk in self.chat_model.astream(messages, NO_CALLBACKS, stop=stop, **kwargs):
+                        streamed = True
+                        ticket.used = used_tokens(chunk) or ticket.used
+                        yield ChatGenerationChunk(message=chunk)
+                    return
+                except Exception as error:
+                    if streamed:
+                        raise
+                    delay = self.scheduler.backoff(error, attempt)
+            await asyncio.sleep(self.scheduler.remaining_backoff(delay))
+
+
+def scheduled(model: BaseChatModel) -> ScheduledChatModel:
+    """model behind the process-wide scheduler (unchanged if it already is)."""
+    return model if isinstance(model, ScheduledChatModel) else ScheduledChatModel(chat_model=model)
+
+# --- 4. Request priority ---
+
+def request_priority(conversation) -> int:
+    """
+    BOOKING for leads who left contact details or booked a viewing, RETURNING for conversations
+    with earlier user messages, NEW for first turns.
+    """
+    contact = Q(email__gt='') | Q(phone__gt='') | Q(visitbooking__isnull=False)
+    if Lead.objects.filter(id=conversation.lead_id).filter(contact).exists():
+        return BOOKING
+    if Message.objects.filter(conversation_id=conversation.id, sender='Human').exists():
+        return RETURNING
+    return NEW
@@ -0,0 +1,39 @@
+# agent_app/management/commands/archive_conversations.py
+
+from django.core.management.base import BaseCommand
+
+from agent_app.archive import IDLE_DAYS, archive_idle, idle_conversations
+from agent_app.models import ConversationArchive, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Ends idle conversations and moves their transcripts into compressed ConversationArchive rows. "
+        "Run it daily (e.g. from cron); archived conversations are restored when the user comes back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-days', type=int, default=IDLE_DAYS,
+            help=f"Archive conversations with no message for this many days (default {IDLE_DAYS}).",
+        )
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help="Archive at most this many conversations per run (default 1000).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only print how many conversations are idle.",
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            idle = idle_conversations(options['idle_days']).count()
+            self.stdout.write(f"{idle} conversations idle for more than {options['idle_days']} days.")
+            return
+
+        stats = archive_idle(options['idle_days'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {stats}."))
+        self.stdout.write(
+            f"Live messages: {Message.objects.count()}; archived conversations: {ConversationArchive.objects.count()}."
+        )
@@ -0,0 +1,116 @@
+# agent_app/management/commands/explain_queries.py
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from agent_app.models import Conversation, GraphCheckpoint, Message, ResponseCacheEntry, VisitBooking
+from agent_app.pagination import DEFAULT_PAGE_SIZE, encode_cursor, keyset_queryset
+
+# Representative SQL of the kind the agent's retrieve_property_info tool generates
+_UNITS = "FROM agent_app_unit AS u JOIN agent_app_project AS p ON p.id = u.project_id "
+
+AGENT_QUERIES = [
+    (
+        "city + bedrooms + budget",
+        "SELECT p.project_name, u.price_usd " + _UNITS +
+        "WHERE p.city = 'Dubai' AND u.no_of_bedrooms = 2 AND u.price_usd <= 1000000",
+    ),
+    (
+        "city + bedrooms, cheapest first",
+        "SELECT p.project_name, u.price_usd " + _UNITS +
+        "WHERE p.city = 'Miami' AND u.no_of_bedrooms = 3 ORDER BY u.price_usd LIMIT 5",
+    ),
+    (
+        "city + price range",
+        "SELECT p.project_name, u.no_of_bedrooms, u.price_usd " + _UNITS +
+        "WHERE p.city = 'Dubai' AND u.price_usd BETWEEN 500000 AND 2000000",
+    ),
+    (
+        "property type + completion status",
+        "SELECT p.project_name, p.city, u.price_usd " + _UNITS +
+        "WHERE u.property_type = 'villa' AND u.completion_status = 'available'",
+    ),
+    (
+        "projects per city",
+        "SELECT city, COUNT(*) FROM agent_app_project GROUP BY city",
+    ),
+]
+
+
+_CURSOR = encode_cursor(timezone.now(), 1)
+
+
+def _page(queryset, field, **cursor):
+    """The page query of the keyset-paginated history endpoints."""
+    return keyset_queryset(queryset, field, **cursor)[:DEFAULT_PAGE_SIZE + 1]
+
+
+def _orm_queries():
+    """The ORM reads on the request path (conversation history, bookings, checkpoints, response cache)."""
+    return [
+        ("conversation history", Message.objects.filter(conversation_id=1).order_by('timestamp')),
+        ("message page", _page(Message.objects.filter(conversation_id=1), 'timestamp', before=_CURSOR)),
+        ("messages since cursor", _page(Message.objects.filter(conversation_id=1), 'timestamp', after=_CURSOR)),
+        ("lead conversations", _page(Conversation.objects.filter(lead_id=1), 'start_time', before=_CURSOR)),
+        ("opening-turn check", Message.objects.filter(conversation_id=1, sender='Human')[:1]),
+        ("lead bookings", VisitBooking.objects.filter(lead_id=1).order_by('booking_date')),
+        (
+            "latest checkpoint",
+            GraphCheckpoint.objects.filter(thread_id='1', checkpoint_ns='').order_by('-checkpoint_id')[:1],
+        ),
+        (
+            "response cache candidates",
+            ResponseCacheEntry.objects.filter(context_key='opening', generation=1, expires_at__gt=timezone.now()),
+        ),
+    ]
+
+
+# SQLite plan line for a full table scan ("SCAN agent_app_unit"); index scans say "USING ... INDEX"
+_FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)(?!.*\bINDEX\b)')
+
+
+class Command(BaseCommand):
+    help = "Prints the query plan of the hot agent queries and flags full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan', action='store_true',
+            help="Exit with an error if any query scans a whole table (SQLite only).",
+        )
+
+    def _explain_sql(self, sql: str, params=()) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+        # SQLite returns (id, parent, notused, detail); other engines return one text column
+        return "\n".join(str(row[-1]) for row in rows)
+
+    def handle(self, *args, **options):
+        plans = [(label, self._explain_sql(sql)) for label, sql in AGENT_QUERIES]
+        plans += [
+            (label, self._explain_sql(*queryset.query.sql_with_params())) for label, queryset in _orm_queries()
+        ]
+
+        scans = []
+        for label, plan in plans:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"--- {label} ---"))
+            for line in plan.splitlines():
+                flagged = connection.vendor == 'sqlite' and _FULL_SCAN_RE.search(line)
+                if flagged:
+                    scans.append(f"{label}: {flagged.group(1)}")
+                    self.stdout.write(self.style.WARNING(f"{line.strip()}   <-- full scan"))
+                else:
+                    self.stdout.write(line.strip())
+
+        if connection.vendor != 'sqlite':
+            self.stdout.write("Full-scan detection is only implemented for SQLite plans.")
+        elif scans:
+            self.stdout.write(self.style.WARNING(f"{len(scans)} full table scan(s): " + "; ".join(scans)))
+        else:
+            self.stdout.write(self.style.SUCCESS("No hot query scans a whole table."))
+
+        if scans and options['fail_on_scan']:
+            raise CommandError("Full table scans found.")
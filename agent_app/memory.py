@@ -0,0 +1,149 @@
+# agent_app/memory.py
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.constants import TAG_NOSTREAM
+
+# --- 1. Configuration ---
+
+# Token budget for the conversation history sent to the agent on each turn
+# (the system prompt, summary and pinned preferences come on top of it).
+TOKEN_BUDGET = getattr(settings, 'AGENT_MEMORY_TOKEN_BUDGET', 2000)
+
+# When the history exceeds the budget, older turns are folded into the summary until
+# the remaining recent turns fit in this fraction of the budget. Folding below the
+# budget (rather than exactly to it) means the summarizer runs every few turns
+# instead of on every turn once a conversation gets long.
+KEEP_RATIO = getattr(settings, 'AGENT_MEMORY_KEEP_RATIO', 0.5)
+
+# Maximum characters of a single message quoted into the summarization transcript
+SUMMARY_SNIPPET_CHARS = 600
+
+SUMMARY_PROMPT = """
+You maintain the running memory of a property sales conversation for Silver Land Properties.
+Update the existing summary with the new conversation excerpt. Keep it under 150 words.
+Preserve: the user's preferences (city, bedrooms, budget, property type), projects already
+recommended with their prices, anything the user rejected, and any name, email or booking details.
+Return only the updated summary.
+"""
+
+# --- 2. Token accounting and history split ---
+
+def count_tokens(messages: Iterable[BaseMessage]) -> int:
+    """Approximate token count of a list of messages (no tokenizer download required)."""
+    return count_tokens_approximately(list(messages))
+
+
+def split_for_budget(messages: List[BaseMessage], budget: int = TOKEN_BUDGET) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """
+    Splits the history into (older, recent) where recent fits the budget.
+
+    Returns ([], messages) while the whole history fits. Otherwise recent keeps whole turns,
+    each starting at a HumanMessage, so an AIMessage with tool calls is never separated from
+    its ToolMessages. The latest turn is always kept, even if it alone exceeds the budget.
+    """
+    if count_tokens(messages) <= budget:
+        return [], messages
+
+    target = int(budget * KEEP_RATIO)
+    turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if not turn_starts:
+        return [], messages
+
+    cut = turn_starts[-1]
+    for start in reversed(turn_starts[:-1]):
+        if count_tokens(messages[start:]) > target:
+            break
+        cut = start
+
+    return messages[:cut], messages[cut:]
+
+# --- 3. Rolling summary ---
+
+def _transcript_line(message: BaseMessage) -> Optional[str]:
+    """Renders one message for the summarizer; tool-call-only AI steps are skipped."""
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    if not text:
+        return None
+    text = text[:SUMMARY_SNIPPET_CHARS]
+    if isinstance(message, HumanMessage):
+        return f"User: {text}"
+    if isinstance(message, AIMessage):
+        return f"Agent: {text}"
+    if isinstance(message, ToolMessage):
+        return f"Database result: {text}"
+    return None
+
+
+def summarize(model: BaseChatModel, previous_summary: str, older: List[BaseMessage]) -> str:
+    """Folds the older messages into the running summary with one LLM call."""
+    transcript = "\n".join(filter(None, map(_transcript_line, older)))
+    if not transcript:
+        return previous_summary
+
+    request = [
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Existing summary:\n{previous_summary or '(none)'}\n\nNew excerpt:\n{transcript}"),
+    ]
+    # Tagged nostream so the summary's tokens are not relayed to the chat stream
+    response = model.invoke(request, config={"tags": [TAG_NOSTREAM]})
+    return response.content if isinstance(response.content, str) else str(response.content)
+
+# --- 4. Preference extraction ---
+
+_NUMBER_WORDS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6}
+
+_BEDROOMS_RE = re.compile(
+    r'\b(\d+|one|two|three|four|five|six)\s*-?\s*(?:bed(?:room)?s?|br|bhk)\b', re.IGNORECASE
+)
+_STUDIO_RE = re.compile(r'\bstudios?\b', re.IGNORECASE)
+_BUDGET_RE = re.compile(
+    r'(?:under|below|less than|up to|upto|max(?:imum)?|budget(?: of| is)?|within|around|about)\s*'
+    r'(?:usd|us\$|\$)?\s*([\d][\d,]*(?:\.\d+)?)\s*(k|thousand|m|mn|mil|million)?\b',
+    re.IGNORECASE
+)
+_MULTIPLIERS = {'k': 1_000, 'thousand': 1_000, 'm': 1_000_000, 'mn': 1_000_000, 'mil': 1_000_000, 'million': 1_000_000}
+
+
+def extract_preferences(text: str, known_cities: Iterable[str] = ()) -> Dict[str, object]:
+    """
+    Extracts buyer preferences (city, bedrooms, budget_usd) from a user message with cheap rules.
+    Only the keys that were found are returned.
+    """
+    preferences: Dict[str, object] = {}
+
+    if match := _BEDROOMS_RE.search(text):
+        value = match.group(1).lower()
+        preferences['bedrooms'] = _NUMBER_WORDS.get(value) or int(value)
+    elif _STUDIO_RE.search(text):
+        preferences['bedrooms'] = 0
+
+    if match := _BUDGET_RE.search(text):
+        amount = float(match.group(1).replace(',', ''))
+        multiplier = _MULTIPLIERS.get((match.group(2) or '').lower(), 1)
+        preferences['budget_usd'] = int(amount * multiplier)
+
+    # Longest names first so e.g. "South Malé Atoll" wins over a shorter overlapping name
+    lowered = text.lower()
+    for city in sorted(known_cities, key=len, reverse=True):
+        if city and re.search(r'\b' + re.escape(city.lower()) + r'\b', lowered):
+            preferences['city'] = city
+            break
+
+    return preferences
+
+
+def memory_context(summary: str, lead_data: Dict[str, object]) -> Optional[SystemMessage]:
+    """Builds the system message that carries the summary and pinned preferences into the prompt."""
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    preferences = {k: lead_data[k] for k in ('city', 'bedrooms', 'budget_usd') if k in lead_data}
+    if preferences:
+        parts.append("Known user preferences: " + ", ".join(f"{k}={v}" for k, v in preferences.items()))
+    return SystemMessage(content="\n\n".join(parts)) if parts else None
@@ -0,0 +1,357 @@
+# agent_app/metrics.py
+
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- 1. Configuration ---
+
+# Metrics and per-request traces are cheap (a lock and a few dict updates per span), so they are on by default
+ENABLED = getattr(settings, 'AGENT_METRICS_ENABLED', True)
+
+# Also write one JSON line per chat request (all its spans) to the 'agent_app.trace' logger
+TRACE_LOG = getattr(settings, 'AGENT_TRACE_LOG', False)
+
+# Histogram buckets: seconds for latencies, counts for tokens and rows
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+trace_logger = logging.getLogger('agent_app.trace')
+
+# --- 2. Metric types (Prometheus text format) ---
+
+Labels = Tuple[str, ...]
+
+
+def _label_text(names: Sequence[str], values: Labels, extra: str = '') -> str:
+    pairs = [f'{n}="{str(v)}"'.replace('\n', ' ') for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(n, '')) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels (count and sum per label set)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, List[float]] = {}  # per-bucket counts (+Inf last), then sum
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, '')) for n in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[slot] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                labels = _label_text(self.labels, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {counts[-1]:g}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {running}")
+        return lines
+
+
+class Gauges:
+    """Gauges read from a stats() callable at scrape time (e.g. pool occupancy, cache hit counts)."""
+
+    kind = 'gauge'
+
+    def __init__(self, prefix: str, help_text: str, read: Callable[[], Dict[str, Any]]):
+        self.prefix, self.help, self.read = prefix, help_text, read
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, value in sorted(self.read().items()):
+            if isinstance(value, (int, float)):
+                name = f"{self.prefix}_{key}"
+                lines += [f"# HELP {name} {self.help}", f"# TYPE {name} gauge", f"{name} {float(value):g}"]
+        return lines
+
+
+REGISTRY: List[Any] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        if metric.kind != 'gauge':
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = register(Histogram(
+    'agent_request_seconds', "Chat request latency (streams: until the last event).", ['endpoint', 'status']
+))
+STAGE_SECONDS = register(Histogram(
+    'agent_stage_seconds', "Time per pipeline stage (lock, history, memory, graph, llm_queue, persist, response_cache, tool).", ['stage']
+))
+LLM_SECONDS = register(Histogram('agent_llm_seconds', "Latency of each chat model call.", ['model']))
+LLM_TOKENS = register(Counter('agent_llm_tokens_total', "Tokens reported by the chat model.", ['model', 'kind']))
+LLM_ERRORS = register(Counter('agent_llm_errors_total', "Chat model calls that raised.", ['model']))
+LLM_QUEUE_SECONDS = register(Histogram(
+    'agent_llm_queue_seconds', "Time chat model calls waited in the LLM scheduler's queue.", ['priority']
+))
+LLM_REJECTED = register(Counter(
+    'agent_llm_rejected_total', "Chat model calls the LLM scheduler refused (queue_full, timeout, paused, rate_limited, provider_error).", ['reason']
+))
+LLM_RETRIES = register(Counter('agent_llm_retries_total', "Chat model calls retried after a backoff.", ['reason']))
+TOOL_SECONDS = register(Histogram('agent_tool_seconds', "Latency of each tool call.", ['tool', 'status']))
+TOOL_ROWS = register(Histogram('agent_tool_rows', "Rows returned by each tool call.", ['tool'], ROW_BUCKETS))
+ROUTER_TURNS = register(Counter(
+    'agent_router_turns_total', "Turns by router decision ('agent' = sent to the LLM agent, anything else answered locally).", ['route']
+))
+
+
+def _pool_stats() -> Dict[str, Any]:
+    from .agent_db import pool_stats
+    return pool_stats()
+
+
+def _sql_cache_stats() -> Dict[str, Any]:
+    from .cache import sql_result_cache
+    return sql_result_cache.stats()
+
+
+def _llm_scheduler_stats() -> Dict[str, Any]:
+    from .llm_scheduler import llm_scheduler
+    return llm_scheduler.stats()
+
+
+register(Gauges('agent_db_pool', "Agent SQL connection pool (occupancy and cumulative counters).", _pool_stats))
+register(Gauges('agent_sql_cache', "Agent SQL result cache (size, hits, misses, evictions).", _sql_cache_stats))
+register(Gauges('agent_llm_scheduler', "LLM scheduler (queue depth, running calls, token budget, pause).", _llm_scheduler_stats))
+
+# --- 3. Request traces and spans ---
+
+class Trace:
+    """The spans of one chat request, collected across the request's threads and tasks."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.status = 'ok'
+        self.attrs: Dict[str, Any] = {}
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, span: Dict[str, Any]) -> None:
+        self.spans.append(span)  # list.append is atomic; tools may run on other threads
+
+    def as_dict(self, seconds: float) -> Dict[str, Any]:
+        return {'endpoint': self.endpoint, 'status': self.status, 'ms': round(seconds * 1000, 1), **self.attrs, 'spans': self.spans}
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar('agent_trace', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def start_trace(endpoint: str, **attrs) -> Optional[Trace]:
+    """A new trace for one request (None when metrics are off). Activate it, then finish it once."""
+    if not ENABLED:
+        return None
+    trace = Trace(endpoint)
+    trace.attrs.update(attrs)
+    return trace
+
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Makes trace the current one, so spans recorded here (and in threads started from here) join it."""
+    if trace is None:
+        yield None
+        return
+    previous = _current.get()
+    _current.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.status = 'error'
+        raise
+    finally:
+        _current.set(previous)
+
+
+def finish_trace(trace: Optional[Trace]) -> None:
+    """Records the request latency (and, with AGENT_TRACE_LOG, the trace as a JSON log line)."""
+    if trace is None:
+        return
+    seconds = time.perf_counter() - trace.started
+    REQUEST_SECONDS.observe(seconds, endpoint=trace.endpoint, status=trace.status)
+    if TRACE_LOG:
+        trace_logger.info(json.dumps(trace.as_dict(seconds), default=str))
+
+
+@contextmanager
+def trace_request(endpoint: str, **attrs) -> Iterator[Optional[Trace]]:
+    """start_trace + activate + finish_trace for requests that complete inside the view."""
+    trace = start_trace(endpoint, **attrs)
+    try:
+        with activate(trace):
+            yield trace
+    finally:
+        finish_trace(trace)
+
+
+def mark(status: str) -> None:
+    """Sets the status of the current request (e.g. 'cached', 'error'), used as a label of its latency."""
+    if (trace := _current.get()) is not None:
+        trace.status = status
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Times one stage of the current request. The yielded dict is the span record, so callers
+    can attach results (e.g. span['rows'] = 12) before it closes.
+    """
+    record = {'stage': stage, **attrs}
+    if not ENABLED:
+        yield record
+        return
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record['error'] = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        record['ms'] = round(seconds * 1000, 2)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if (trace := _current.get()) is not None:
+            trace.add(record)
+
+
+@contextmanager
+def tool_span(tool: str) -> Iterator[Dict[str, Any]]:
+    """
+    span('tool') that also feeds the per-tool latency and row-count histograms. Callers set
+    record['rows'], and record['status'] when the call did not run normally (e.g. 'cached', 'rejected').
+    """
+    record: Dict[str, Any] = {}
+    try:
+        with span('tool', tool=tool) as record:
+            yield record
+    finally:
+        if ENABLED and 'ms' in record:
+            status = record.get('status') or ('error' if record.get('error') else 'ok')
+            TOOL_SECONDS.observe(record['ms'] / 1000, tool=tool, status=status)
+            if 'rows' in record:
+                TOOL_ROWS.observe(record['rows'], tool=tool)
+
+# --- 4. LLM calls (LangChain callback) ---
+
+def _token_usage(response) -> Dict[str, int]:
+    """Prompt/completion tokens from an LLMResult (usage_metadata, or OpenAI's llm_output token_usage)."""
+    usage: Dict[str, int] = {}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+            usage['prompt'] = usage.get('prompt', 0) + metadata.get('input_tokens', 0)
+            usage['completion'] = usage.get('completion', 0) + metadata.get('output_tokens', 0)
+    if not any(usage.values()):
+        token_usage = (response.llm_output or {}).get('token_usage') or {}
+        usage = {'prompt': token_usage.get('prompt_tokens', 0), 'completion': token_usage.get('completion_tokens', 0)}
+    return usage
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Times every chat model call in a run and records its token counts as an 'llm' span."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, Tuple[float, str]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        params = kwargs.get('invocation_params') or {}
+        model = params.get('model_name') or params.get('model') or params.get('_type') or 'unknown'
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), str(model))
+
+    def _finish(self, run_id: UUID) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        return time.perf_counter() - started[0], started[1]
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        if (finished := self._finish(run_id)) is None:
+            return
+        seconds, model = finished
+        usage = _token_usage(response)
+        LLM_SECONDS.observe(seconds, model=model)
+        for kind, tokens in usage.items():
+            if tokens:
+                LLM_TOKENS.inc(tokens, model=model, kind=kind)
+        if (trace := _current.get()) is not None:
+            trace.add({'stage': 'llm', 'model': model, 'ms': round(seconds * 1000, 2),
+                       'prompt_tokens': usage['prompt'], 'completion_tokens': usage['completion']})
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        if (finished := self._finish(run_id)) is not None:
+            LLM_ERRORS.inc(model=finished[1])
+
+
+llm_metrics = LLMMetricsCallback()
+
+
+def run_callbacks() -> list:
+    """Callbacks to pass in a graph run's config."""
+    return [llm_metrics] if ENABLED else []
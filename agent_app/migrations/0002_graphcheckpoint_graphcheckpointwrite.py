@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GraphCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=255)),
+                ('checkpoint_ns', models.CharField(blank=True, default='', max_length=255)),
+                ('checkpoint_id', models.CharField(max_length=255)),
+                ('parent_checkpoint_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('checkpoint_type', models.CharField(max_length=50)),
+                ('checkpoint', models.BinaryField()),
+                ('metadata_type', models.CharField(max_length=50)),
+                ('metadata', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('thread_id', 'checkpoint_ns', 'checkpoint_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GraphCheckpointWrite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=255)),
+                ('checkpoint_ns', models.CharField(blank=True, default='', max_length=255)),
+                ('checkpoint_id', models.CharField(max_length=255)),
+                ('task_id', models.CharField(max_length=255)),
+                ('task_path', models.CharField(blank=True, default='', max_length=255)),
+                ('idx', models.IntegerField()),
+                ('channel', models.CharField(max_length=255)),
+                ('value_type', models.CharField(max_length=50)),
+                ('value', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx')},
+            },
+        ),
+    ]
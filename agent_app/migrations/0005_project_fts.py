@@ -0,0 +1,67 @@
+# Full-text index over the Project text columns (SQLite FTS5 only; other engines use
+# the ORM fallback in agent_app/amenity_search.py).
+
+from django.db import migrations
+
+FTS_TABLE = 'agent_app_project_fts'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        project_name, project_description, features, facilities,
+        content='agent_app_project', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    # Triggers keep the external-content index in sync with every write to agent_app_project
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON agent_app_project BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, project_name, project_description, features, facilities)
+        VALUES (new.id, new.project_name, new.project_description, new.features, new.facilities);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON agent_app_project BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, project_name, project_description, features, facilities)
+        VALUES ('delete', old.id, old.project_name, old.project_description, old.features, old.facilities);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON agent_app_project BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, project_name, project_description, features, facilities)
+        VALUES ('delete', old.id, old.project_name, old.project_description, old.features, old.facilities);
+        INSERT INTO {FTS_TABLE}(rowid, project_name, project_description, features, facilities)
+        VALUES (new.id, new.project_name, new.project_description, new.features, new.facilities);
+    END
+    """,
+    # Index the rows that already exist
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0004_datasetversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0005_project_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('context_key', models.CharField(default='opening', max_length=50)),
+                ('question', models.TextField()),
+                ('normalized_question', models.TextField()),
+                ('embedding', models.BinaryField()),
+                ('reply', models.TextField()),
+                ('generation', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['context_key', 'generation', 'expires_at'], name='agent_app_r_context_144a0d_idx')],
+            },
+        ),
+    ]
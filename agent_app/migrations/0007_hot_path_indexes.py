@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0006_responsecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'timestamp'], name='message_conv_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['city', 'no_of_bedrooms', 'price_usd'], name='project_city_bed_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['property_type', 'completion_status'], name='project_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitbooking',
+            index=models.Index(fields=['lead', 'booking_date'], name='booking_lead_date_idx'),
+        ),
+    ]
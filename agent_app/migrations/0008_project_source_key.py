@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:03
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite adds these columns by rebuilding agent_app_project, which drops the FTS triggers
+# created in 0005; they are re-created (and the index rebuilt) afterwards.
+project_fts = import_module('agent_app.migrations.0005_project_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='source_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.RunPython(project_fts._run(project_fts.CREATE_SQL), migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0008_project_source_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tool_call_id', models.CharField(max_length=255)),
+                ('tool_name', models.CharField(max_length=100)),
+                ('arguments', models.JSONField(default=dict)),
+                ('result', models.TextField(blank=True, default='')),
+                ('status', models.CharField(default='success', max_length=10)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tool_calls', to='agent_app.conversation')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tool_calls', to='agent_app.message')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation', 'tool_name'], name='toolcall_conv_tool_idx')],
+            },
+        ),
+    ]
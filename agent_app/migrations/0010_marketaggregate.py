@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0009_toolcall'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(blank=True, default='', max_length=100)),
+                ('no_of_bedrooms', models.IntegerField(blank=True, null=True)),
+                ('property_type', models.CharField(blank=True, default='', max_length=50)),
+                ('completion_status', models.CharField(blank=True, default='', max_length=50)),
+                ('units', models.PositiveIntegerField()),
+                ('min_price', models.FloatField(null=True)),
+                ('median_price', models.FloatField(null=True)),
+                ('p90_price', models.FloatField(null=True)),
+                ('max_price', models.FloatField(null=True)),
+                ('avg_price', models.FloatField(null=True)),
+                ('median_price_per_sqm', models.FloatField(null=True)),
+                ('generation', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['city', 'no_of_bedrooms', 'property_type', 'completion_status'], name='market_aggregate_lookup_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,226 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:23
+
+# Splits the flat catalogue into projects and units: rows sharing the project columns
+# (continuation rows included) become one Project, and every row becomes a Unit of it.
+# The amenity full-text index moves from agent_app_project to the units.
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+project_fts = import_module('agent_app.migrations.0005_project_fts')
+
+FTS_TABLE = 'agent_app_unit_fts'
+TEXT_VIEW = 'agent_app_unit_text'
+
+# Indexed columns, and their values for a unit row ({u}) joined with its project (p)
+_FTS_COLUMNS = 'project_name, project_description, features, facilities'
+_VALUES = 'p.project_name, p.project_description, {u}.features, p.facilities'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIEW IF NOT EXISTS {TEXT_VIEW} AS
+    SELECT u.id, {_VALUES.format(u='u')}
+    FROM agent_app_unit AS u JOIN agent_app_project AS p ON p.id = u.project_id
+    """,
+    # External content: the index reads its text through the view and stores none of it
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_FTS_COLUMNS},
+        content='{TEXT_VIEW}', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    # Unit writes (Django deletes a project's units before the project, so "p" still exists)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON agent_app_unit BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS})
+        SELECT new.id, {_VALUES.format(u='new')} FROM agent_app_project AS p WHERE p.id = new.project_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON agent_app_unit BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS})
+        SELECT 'delete', old.id, {_VALUES.format(u='old')} FROM agent_app_project AS p WHERE p.id = old.project_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON agent_app_unit BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS})
+        SELECT 'delete', old.id, {_VALUES.format(u='old')} FROM agent_app_project AS p WHERE p.id = old.project_id;
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS})
+        SELECT new.id, {_VALUES.format(u='new')} FROM agent_app_project AS p WHERE p.id = new.project_id;
+    END
+    """,
+    # A project edit re-indexes all of its units
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_pu AFTER UPDATE ON agent_app_project BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS})
+        SELECT 'delete', u.id, old.project_name, old.project_description, u.features, old.facilities
+        FROM agent_app_unit AS u WHERE u.project_id = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS})
+        SELECT u.id, new.project_name, new.project_description, u.features, new.facilities
+        FROM agent_app_unit AS u WHERE u.project_id = new.id;
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_pu",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    f"DROP VIEW IF EXISTS {TEXT_VIEW}",
+]
+
+# Frozen copies of agent_app.ingest's PROJECT_FIELDS and project_keys() as of this migration,
+# so later changes to the loader cannot change what it does
+PROJECT_FIELDS = ['project_name', 'developer_name', 'city', 'country', 'project_description', 'facilities']
+
+UNIT_FIELDS = [
+    'no_of_bedrooms', 'completion_status', 'bathrooms', 'unit_type', 'price_usd', 'area_sq_mtrs',
+    'property_type', 'completion_date', 'features', 'source_key', 'content_hash',
+]
+
+
+def project_keys(frame):
+    """Identity of the project each row belongs to: stable 64-bit hash (hex) of the project columns."""
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(frame[PROJECT_FIELDS].astype(str), index=False)
+    return hashes.map('{:016x}'.format)
+
+
+def split_projects(apps, schema_editor):
+    """One Project per distinct set of project columns (the lowest id is kept), one Unit per old row."""
+    # Imported here so loading the migration graph (every manage.py command) does not import pandas
+    import pandas as pd
+
+    Project = apps.get_model('agent_app', 'Project')
+    Unit = apps.get_model('agent_app', 'Unit')
+    VisitBooking = apps.get_model('agent_app', 'VisitBooking')
+
+    rows = pd.DataFrame.from_records(Project.objects.order_by('id').values('id', *PROJECT_FIELDS, *UNIT_FIELDS))
+    if rows.empty:
+        return
+
+    # Continuation rows of row-by-row loads still have a blank name
+    names = rows['project_name'].str.strip()
+    rows['project_name'] = names.mask(names.isin(['', 'nan'])).ffill().fillna('Unknown Project Name')
+    rows['project_key'] = project_keys(rows)
+    rows['keep_id'] = rows.groupby('project_key')['id'].transform('min')
+    rows = rows.astype(object).where(rows.notna(), None)
+
+    kept = rows[rows['id'] == rows['keep_id']]
+    Project.objects.bulk_update(
+        [Project(id=r['id'], project_name=r['project_name'], source_key=r['project_key']) for r in kept.to_dict('records')],
+        ['project_name', 'source_key'], batch_size=500,
+    )
+    Unit.objects.bulk_create(
+        [Unit(project_id=r['keep_id'], **{f: r[f] for f in UNIT_FIELDS}) for r in rows.to_dict('records')],
+        batch_size=500,
+    )
+
+    merged = rows[rows['id'] != rows['keep_id']]
+    for old_id, keep_id in zip(merged['id'], merged['keep_id']):
+        VisitBooking.objects.filter(project_id=old_id).update(project_id=keep_id)
+    Project.objects.filter(id__in=list(merged['id'])).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0010_marketaggregate'),
+    ]
+
+    operations = [
+        # The 0005 index and triggers read columns that move to Unit
+        migrations.RunPython(project_fts._run(project_fts.DROP_SQL), migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Unit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('no_of_bedrooms', models.IntegerField(blank=True, null=True)),
+                ('completion_status', models.CharField(default='available', max_length=50)),
+                ('bathrooms', models.IntegerField(blank=True, null=True)),
+                ('unit_type', models.CharField(max_length=100)),
+                ('price_usd', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('area_sq_mtrs', models.IntegerField()),
+                ('property_type', models.CharField(default='apartment', max_length=50)),
+                ('completion_date', models.DateField(blank=True, null=True)),
+                ('features', models.TextField(default='[]')),
+                ('source_key', models.CharField(blank=True, db_index=True, default='', max_length=32)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=16)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='units', to='agent_app.project'),
+        ),
+        migrations.RunPython(split_projects),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_city_bed_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_type_status_idx',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='area_sq_mtrs',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='bathrooms',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='completion_date',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='completion_status',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='content_hash',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='features',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='no_of_bedrooms',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='price_usd',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='property_type',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='unit_type',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['city'], name='project_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['project', 'no_of_bedrooms', 'price_usd'], name='unit_project_bed_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['property_type', 'completion_status'], name='unit_type_status_idx'),
+        ),
+        migrations.RunPython(project_fts._run(CREATE_SQL), project_fts._run(DROP_SQL)),
+    ]
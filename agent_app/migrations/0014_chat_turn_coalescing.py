@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0013_conversationarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='locked_by',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ChatRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('status', models.CharField(default='running', max_length=10)),
+                ('reply', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_requests', to='agent_app.conversation')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'key'), name='chat_request_conv_key_uniq')],
+            },
+        ),
+    ]
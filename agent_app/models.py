@@ -4,33 +4,59 @@ from django.db import models
 from django.utils import timezone
 import uuid 
 
-# --- 1. Property Model ---
+# --- 1. Property Models ---
 
 class Project(models.Model):
-    """Stores details about property projects available for sale."""
+    """A property project: the columns shared by all of its units (the CSV repeats them on every row)."""
     
     project_name = models.CharField(max_length=255, default='Unknown Project Name') 
+    developer_name = models.CharField(max_length=255)
+    
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=5, default='US')
+    
+    facilities = models.TextField(default='[]')
+    project_description = models.TextField(default='')
+    
+    # Set by agent_app/ingest.py: hash of the project columns (rows with the same hash share one Project)
+    source_key = models.CharField(max_length=32, blank=True, default='', db_index=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['city'], name='project_city_idx')]
+    
+    def __str__(self):
+        return self.project_name
+
+class Unit(models.Model):
+    """A unit for sale in a project (one CSV row)."""
+    
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='units')
     no_of_bedrooms = models.IntegerField(null=True, blank=True)
     completion_status = models.CharField(max_length=50, default='available')
     bathrooms = models.IntegerField(null=True, blank=True)
     unit_type = models.CharField(max_length=100)
-    developer_name = models.CharField(max_length=255)
     
     price_usd = models.DecimalField(max_digits=15, decimal_places=2)
     area_sq_mtrs = models.IntegerField()
     property_type = models.CharField(max_length=50, default='apartment') 
     
-    city = models.CharField(max_length=100)
-    country = models.CharField(max_length=5, default='US')
-    
     completion_date = models.DateField(null=True, blank=True)
     
     features = models.TextField(default='[]') 
-    facilities = models.TextField(default='[]')
-    project_description = models.TextField(default='')
+    
+    # Set by agent_app/ingest.py: hash of the columns identifying the unit, and of the whole row
+    source_key = models.CharField(max_length=32, blank=True, default='', db_index=True)
+    content_hash = models.CharField(max_length=16, blank=True, default='')
+    
+    class Meta:
+        # Match the agent's filters: city (on the project) + bedrooms with a price range, and type + status
+        indexes = [
+            models.Index(fields=['project', 'no_of_bedrooms', 'price_usd'], name='unit_project_bed_price_idx'),
+            models.Index(fields=['property_type', 'completion_status'], name='unit_type_status_idx'),
+        ]
     
     def __str__(self):
-        return self.project_name
+        return f"{self.project.project_name}: {self.unit_type}"
 
 # --- 2. Lead Model ---
 
@@ -58,6 +84,9 @@ class VisitBooking(models.Model):
     booking_date = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=50, default='pending') 
     
+    class Meta:
+        indexes = [models.Index(fields=['lead', 'booking_date'], name='booking_lead_date_idx')]
+    
     def __str__(self):
         return f"Booking for {self.project.project_name} by {self.lead.session_id}"
 
@@ -69,6 +98,15 @@ class Conversation(models.Model):
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE)
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    # Rolling summary of the turns folded out of the agent's prompt (see agent_app/memory.py)
+    summary = models.TextField(blank=True, default='')
+    # Lease held while a turn runs, so turns of one conversation never overlap (see agent_app/turns.py)
+    locked_by = models.CharField(max_length=32, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        # A lead's conversations are listed newest first (keyset pages on start_time, id)
+        indexes = [models.Index(fields=['lead', 'start_time'], name='conversation_lead_start_idx')]
     
     def __str__(self):
         return f"Conversation {self.id} with Lead {self.lead.session_id}"
@@ -81,5 +119,178 @@ class Message(models.Model):
     text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        # History is always read per conversation in timestamp order
+        indexes = [models.Index(fields=['conversation', 'timestamp'], name='message_conv_time_idx')]
+    
+    def __str__(self):
+        return f"[{self.timestamp.strftime('%H:%M:%S')}] {self.sender}: {self.text[:50]}"
+
+class ChatRequest(models.Model):
+    """A chat turn in progress or answered, keyed so retries and double submits share one agent run."""
+    
+    RUNNING, DONE = 'running', 'done'
+    
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='chat_requests')
+    # "key:<client idempotency key>" or "msg:<hash of the message text>"
+    key = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, default=RUNNING)
+    reply = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['conversation', 'key'], name='chat_request_conv_key_uniq')]
+    
+    def __str__(self):
+        return f"{self.key} in conversation {self.conversation_id} ({self.status})"
+
+class ToolCall(models.Model):
+    """A tool call the agent made while answering a turn, with its (compacted) result."""
+    
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='tool_calls')
+    # The Human message of the turn the call belongs to
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='tool_calls')
+    tool_call_id = models.CharField(max_length=255)
+    tool_name = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict)
+    result = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=10, default='success') # 'success' or 'error'
+    timestamp = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['conversation', 'tool_name'], name='toolcall_conv_tool_idx')]
+    
+    def __str__(self):
+        return f"{self.tool_name}({self.arguments}) in conversation {self.conversation_id}"
+
+# --- 5. LangGraph Checkpoint Models ---
+
+class GraphCheckpoint(models.Model):
+    """Serialized LangGraph checkpoint for a conversation thread (thread_id = conversation id)."""
+    
+    thread_id = models.CharField(max_length=255)
+    checkpoint_ns = models.CharField(max_length=255, default='', blank=True)
+    checkpoint_id = models.CharField(max_length=255)
+    parent_checkpoint_id = models.CharField(max_length=255, null=True, blank=True)
+    checkpoint_type = models.CharField(max_length=50)
+    checkpoint = models.BinaryField()
+    metadata_type = models.CharField(max_length=50)
+    metadata = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('thread_id', 'checkpoint_ns', 'checkpoint_id')
+    
+    def __str__(self):
+        return f"Checkpoint {self.checkpoint_id} of thread {self.thread_id}"
+
+class GraphCheckpointWrite(models.Model):
+    """Pending channel write recorded against a checkpoint while a graph step runs."""
+    
+    thread_id = models.CharField(max_length=255)
+    checkpoint_ns = models.CharField(max_length=255, default='', blank=True)
+    checkpoint_id = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255)
+    task_path = models.CharField(max_length=255, default='', blank=True)
+    idx = models.IntegerField()
+    channel = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=50)
+    value = models.BinaryField()
+    
+    class Meta:
+        unique_together = ('thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx')
+    
+    def __str__(self):
+        return f"Write {self.channel} for checkpoint {self.checkpoint_id}"
+
+
+# --- 6. Dataset Version Model ---
+
+class DatasetVersion(models.Model):
+    """Generation counter bumped by setup_db.py on every data load, so in-process caches can detect reloads."""
+    
+    name = models.CharField(max_length=50, unique=True)
+    generation = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} (generation {self.generation})"
+
+
+# --- 7. Response Cache Model ---
+
+class ResponseCacheEntry(models.Model):
+    """Cached agent reply to a conversation-opening question (see agent_app/response_cache.py)."""
+    
+    context_key = models.CharField(max_length=50, default='opening')
+    question = models.TextField()
+    normalized_question = models.TextField()
+    embedding = models.BinaryField()
+    reply = models.TextField()
+    generation = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(default=timezone.now)
+    hits = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        indexes = [models.Index(fields=['context_key', 'generation', 'expires_at'])]
+    
+    def __str__(self):
+        return f"[{self.context_key}] {self.normalized_question[:50]}"
+
+
+# --- 8. Market Aggregate Model ---
+
+class MarketAggregate(models.Model):
+    """
+    Price statistics per city x bedrooms x property type x completion status, rebuilt by
+    setup_db.py after each load (see agent_app/aggregates.py). A blank dimension ('' or
+    NULL bedrooms) means "all", so every combination of filters is a single-row lookup.
+    """
+    
+    city = models.CharField(max_length=100, blank=True, default='')
+    no_of_bedrooms = models.IntegerField(null=True, blank=True)
+    property_type = models.CharField(max_length=50, blank=True, default='')
+    completion_status = models.CharField(max_length=50, blank=True, default='')
+    
+    units = models.PositiveIntegerField()
+    min_price = models.FloatField(null=True)
+    median_price = models.FloatField(null=True)
+    p90_price = models.FloatField(null=True)
+    max_price = models.FloatField(null=True)
+    avg_price = models.FloatField(null=True)
+    median_price_per_sqm = models.FloatField(null=True)
+    generation = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['city', 'no_of_bedrooms', 'property_type', 'completion_status'],
+                name='market_aggregate_lookup_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        dims = [self.city or 'all cities', f"{self.no_of_bedrooms} bed" if self.no_of_bedrooms is not None else 'all sizes',
+                self.property_type or 'all types', self.completion_status or 'any status']
+        return f"{' / '.join(dims)}: {self.units} units"
+
+
+# --- 9. Conversation Archive Model ---
+
+class ConversationArchive(models.Model):
+    """
+    Transcript of an ended conversation (messages and their tool calls) as one gzip-compressed
+    JSON blob, moved out of the live Message/ToolCall tables by agent_app/archive.py.
+    """
+    
+    conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, related_name='archive')
+    data = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    # Size of the JSON before compression
+    raw_bytes = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
     def __str__(self):
-        return f"[{self.timestamp.strftime('%H:%M:%S')}] {self.sender}: {self.text[:50]}"
\ No newline at end of file
+        return f"Archive of conversation {self.conversation_id} ({self.message_count} messages)"
@@ -0,0 +1,81 @@
+# agent_app/pagination.py
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from ninja.errors import HttpError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(timestamp: datetime, pk: int) -> str:
+    """Opaque cursor for the position of a row in (timestamp, id) order."""
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(timestamp, id) of a cursor; a malformed cursor is a 400 error."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except ValueError:
+        raise HttpError(400, "Invalid cursor.")
+
+
+def keyset_queryset(queryset: QuerySet, field: str, before: Optional[str] = None, after: Optional[str] = None) -> QuerySet:
+    """
+    `queryset` positioned at a cursor in (field, id) order: with `after`, the rows following it,
+    oldest first; otherwise the newest rows (preceding `before` if given), newest first.
+    """
+    # (field, id) > (t, pk), spelled with a plain bound on field first so the index range starts at t
+    if after:
+        timestamp, pk = decode_cursor(after)
+        queryset = queryset.filter(Q(**{f'{field}__gte': timestamp}), Q(**{f'{field}__gt': timestamp}) | Q(id__gt=pk))
+        return queryset.order_by(field, 'id')
+    if before:
+        timestamp, pk = decode_cursor(before)
+        queryset = queryset.filter(Q(**{f'{field}__lte': timestamp}), Q(**{f'{field}__lt': timestamp}) | Q(id__lt=pk))
+    return queryset.order_by(f'-{field}', '-id')
+
+
+def keyset_page(
+    queryset: QuerySet,
+    field: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[dict], bool]:
+    """
+    One page of keyset_queryset(), read as an index range instead of with an OFFSET, so the cost
+    is the same for the first and the thousandth page. Returns (rows, has_more), where has_more
+    means further rows exist in the same direction.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # One extra row tells whether there is another page
+    rows = list(keyset_queryset(queryset, field, before, after)[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def keyset_slice(
+    rows: List[dict],
+    field: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[dict], bool]:
+    """keyset_page() over rows already in memory, sorted oldest first by (field, id)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after:
+        position = decode_cursor(after)
+        rows = [row for row in rows if (row[field], row['id']) > position]
+    else:
+        if before:
+            position = decode_cursor(before)
+            rows = [row for row in rows if (row[field], row['id']) < position]
+        rows = rows[::-1]
+    return rows[:limit], len(rows) > limit
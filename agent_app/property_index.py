@@ -0,0 +1,268 @@
+# agent_app/property_index.py
+
+import threading
+import time
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+from django.db.models import F
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from .dataset import current_generation
+from .formatting import format_table
+from .metrics import tool_span
+from .models import Unit
+
+# Values stored for missing data in the CSV-loaded catalogue
+_MISSING = {'', 'nan', 'none', 'null'}
+
+MAX_TOP_K = 50
+
+SortOrder = Literal['price_asc', 'price_desc', 'area_asc', 'area_desc', 'bedrooms_asc', 'bedrooms_desc']
+
+
+def _normalize(value: Optional[str]) -> str:
+    """Canonical form of a categorical value: 'x_offplan', 'Off Plan' and 'off-plan' all become 'offplan'."""
+    if value is None:
+        return ''
+    text = str(value).strip().lower()
+    if text in _MISSING:
+        return ''
+    if text.startswith('x_'):
+        text = text[2:]
+    return text.replace(' ', '').replace('-', '').replace('_', '')
+
+
+class _Categorical:
+    """Dictionary-encoded column: one small int code per row plus the table of distinct values."""
+
+    def __init__(self, values: List[Optional[str]]):
+        # Display labels drop the CSV's 'x_' prefix ('x_offplan' -> 'offplan')
+        labels = ['' if _normalize(v) == '' else str(v).strip().removeprefix('x_') for v in values]
+        self.categories, self.codes = np.unique(np.array(labels, dtype=object), return_inverse=True)
+        self.codes = self.codes.astype(np.int32)
+        self._lookup = {_normalize(c): i for i, c in enumerate(self.categories)}
+
+    def code(self, value: str) -> int:
+        """Code of a value (-1 if the value does not occur, which matches no row)."""
+        return self._lookup.get(_normalize(value), -1)
+
+    def label(self, row: int) -> str:
+        return self.categories[self.codes[row]]
+
+
+class PropertyIndex:
+    """
+    Read-only columnar snapshot of the catalogue: one row per Unit, with its project's columns.
+
+    Categorical columns (city, property type, completion status) are dictionary-encoded,
+    and price and area keep a sorted copy so range filters are two binary searches (units
+    with unknown area are left out of the area copy).
+    Searches run entirely in NumPy and never touch the database.
+    """
+
+    def __init__(self, rows: List[dict], generation: int = 0):
+        started = time.perf_counter()
+        self.generation = generation
+        self.size = len(rows)
+
+        self.ids = np.array([r['id'] for r in rows], dtype=np.int64)
+        self.project_ids = np.array([r['project_id'] for r in rows], dtype=np.int64)
+        self.project_names = np.array([r['project_name'] for r in rows], dtype=object)
+        self.developers = np.array([r['developer_name'] for r in rows], dtype=object)
+        self.bedrooms = np.array(
+            [r['no_of_bedrooms'] if r['no_of_bedrooms'] is not None else -1 for r in rows], dtype=np.int32
+        )
+        self.price = np.array([float(r['price_usd'] or 0) for r in rows], dtype=np.float64)
+        # Unknown (missing or 0) area is NaN: it never matches an area filter and sorts last
+        self.area = np.array([float(r['area_sq_mtrs'] or 0) for r in rows], dtype=np.float64)
+        self.area[self.area <= 0] = np.nan
+
+        self.city = _Categorical([r['city'] for r in rows])
+        self.property_type = _Categorical([r['property_type'] for r in rows])
+        self.completion_status = _Categorical([r['completion_status'] for r in rows])
+
+        # Sorted views for range lookups
+        self._price_order = np.argsort(self.price, kind='stable')
+        self._price_sorted = self.price[self._price_order]
+        known_area = np.flatnonzero(~np.isnan(self.area))
+        self._area_order = known_area[np.argsort(self.area[known_area], kind='stable')]
+        self._area_sorted = self.area[self._area_order]
+
+        self.build_seconds = time.perf_counter() - started
+
+    @classmethod
+    def from_database(cls, generation: int = 0) -> 'PropertyIndex':
+        rows = list(
+            Unit.objects.order_by('id').values(
+                'id', 'project_id', 'no_of_bedrooms', 'price_usd', 'area_sq_mtrs', 'property_type', 'completion_status',
+                project_name=F('project__project_name'), developer_name=F('project__developer_name'), city=F('project__city'),
+            )
+        )
+        return cls(rows, generation)
+
+    @property
+    def cities(self) -> tuple:
+        return tuple(c for c in self.city.categories if c)
+
+    # --- Queries ---
+
+    def _range(self, order: np.ndarray, sorted_values: np.ndarray, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """Row positions whose value lies in [low, high], via binary search on the sorted copy."""
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        stop = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side='right')
+        return order[start:stop]
+
+    def search(
+        self,
+        city: Optional[str] = None,
+        bedrooms: Optional[int] = None,
+        min_bedrooms: Optional[int] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        property_type: Optional[str] = None,
+        completion_status: Optional[str] = None,
+        min_area: Optional[float] = None,
+        max_area: Optional[float] = None,
+        sort_by: SortOrder = 'price_asc',
+        top_k: int = 10,
+    ) -> Dict[str, object]:
+        """Filters, sorts and returns the top_k matching units plus the total match count."""
+
+        # 1. Start from a range filter (a contiguous slice of the sorted prices or areas)
+        if min_price is not None or max_price is not None:
+            candidates = self._range(self._price_order, self._price_sorted, min_price, max_price)
+        elif min_area is not None or max_area is not None:
+            candidates = self._range(self._area_order, self._area_sorted, min_area, max_area)
+        else:
+            candidates = np.arange(self.size)
+
+        mask = np.ones(len(candidates), dtype=bool)
+
+        # 2. Equality filters on the dictionary codes
+        for column, value in (
+            (self.city, city),
+            (self.property_type, property_type),
+            (self.completion_status, completion_status),
+        ):
+            if value:
+                mask &= column.codes[candidates] == column.code(value)
+
+        if bedrooms is not None:
+            mask &= self.bedrooms[candidates] == bedrooms
+        if min_bedrooms is not None:
+            mask &= self.bedrooms[candidates] >= min_bedrooms
+
+        # 3. Area range (a no-op when the area slice was the starting point)
+        if min_area is not None:
+            mask &= self.area[candidates] >= min_area
+        if max_area is not None:
+            mask &= self.area[candidates] <= max_area
+
+        matches = candidates[mask]
+
+        # 4. Sort and take the top k (NumPy puts NaN, i.e. unknown area, last in both directions)
+        key, direction = sort_by.rsplit('_', 1)
+        values = {'price': self.price, 'area': self.area, 'bedrooms': self.bedrooms}[key][matches]
+        order = np.argsort(-values if direction == 'desc' else values, kind='stable')
+        top = matches[order[:max(1, min(top_k, MAX_TOP_K))]]
+
+        return {
+            'total': int(len(matches)),
+            'results': [self.row(i) for i in top],
+        }
+
+    def row(self, i: int) -> Dict[str, object]:
+        """One unit as a plain dict."""
+        return {
+            'id': int(self.ids[i]),
+            'project_id': int(self.project_ids[i]),
+            'project_name': self.project_names[i],
+            'developer_name': self.developers[i],
+            'city': self.city.label(i),
+            'property_type': self.property_type.label(i),
+            'completion_status': self.completion_status.label(i),
+            'no_of_bedrooms': int(self.bedrooms[i]) if self.bedrooms[i] >= 0 else None,
+            'price_usd': float(self.price[i]),
+            'area_sq_mtrs': None if np.isnan(self.area[i]) else float(self.area[i]),
+        }
+
+
+# --- Process-wide snapshot ---
+
+_index: Optional[PropertyIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_property_index() -> PropertyIndex:
+    """Returns the process's index, (re)building it when the catalogue generation changes."""
+    global _index
+
+    generation = current_generation()
+    if _index is not None and _index.generation == generation:
+        return _index
+
+    with _index_lock:
+        if _index is None or _index.generation != generation:
+            _index = PropertyIndex.from_database(generation)
+    return _index
+
+
+def rebuild_property_index() -> PropertyIndex:
+    """Forces a rebuild from the database (used by setup_db.py after loading data)."""
+    global _index
+
+    with _index_lock:
+        _index = PropertyIndex.from_database(current_generation(max_age=0))
+    return _index
+
+
+# --- Agent tool ---
+
+class PropertySearch(BaseModel):
+    """Structured property search over the in-memory catalogue index."""
+    city: Optional[str] = Field(default=None, description="City name, e.g. 'Dubai'.")
+    bedrooms: Optional[int] = Field(default=None, description="Exact number of bedrooms (0 for studios).")
+    min_bedrooms: Optional[int] = Field(default=None, description="Minimum number of bedrooms.")
+    min_price: Optional[float] = Field(default=None, description="Minimum price in USD.")
+    max_price: Optional[float] = Field(default=None, description="Maximum price (budget) in USD.")
+    property_type: Optional[str] = Field(default=None, description="'apartment', 'villa' or 'house'.")
+    completion_status: Optional[str] = Field(default=None, description="'available', 'offplan' or 'sold'.")
+    min_area: Optional[float] = Field(default=None, description="Minimum area in square metres.")
+    max_area: Optional[float] = Field(default=None, description="Maximum area in square metres.")
+    sort_by: SortOrder = Field(default='price_asc', description="Sort order of the results.")
+    top_k: int = Field(default=5, description=f"Number of results to return (max {MAX_TOP_K}).")
+
+
+# Columns of the search result table shown to the model
+_RESULT_COLUMNS = [
+    'project_name', 'city', 'no_of_bedrooms', 'property_type', 'completion_status',
+    'price_usd', 'area_sq_mtrs', 'developer_name',
+]
+
+
+def search_properties(**filters) -> str:
+    """Searches the property catalogue by city, bedrooms, price, type, status and area."""
+    with tool_span('search_properties') as record:
+        result = get_property_index().search(**filters)
+        record['rows'] = len(result['results'])
+    if not result['total']:
+        return "No properties match these criteria."
+    rows = [[unit[c] for c in _RESULT_COLUMNS] for unit in result['results']]
+    return format_table(
+        _RESULT_COLUMNS, rows,
+        title=f"{result['total']} matching units (no_of_bedrooms 0 = studio):",
+        total=result['total'],
+    )
+
+
+search_properties_tool = StructuredTool.from_function(
+    func=search_properties,
+    name="search_properties",
+    description=(
+        "Fast structured search of the property catalogue. Use it for any search by city, bedrooms, "
+        "price range/budget, property type, completion status or area, with sorting and top-k."
+    ),
+    args_schema=PropertySearch,
+)
@@ -0,0 +1,188 @@
+# agent_app/response_cache.py
+
+import hashlib
+import json
+import re
+import zlib
+from datetime import timedelta
+from itertools import takewhile
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .dataset import current_generation
+from .memory import extract_preferences
+from .models import ResponseCacheEntry
+
+Embedder = Callable[[str], np.ndarray]
+SlotExtractor = Callable[[str], Dict[str, object]]
+
+# Context key for the first user message of a conversation (the only turns cached today)
+OPENING = 'opening'
+
+_WORD_RE = re.compile(r"[a-z0-9$]+")
+
+# Words that end the place named after a city ("Dubai Marina" is its own place, "Dubai apartments" is Dubai)
+_PLACE_STOP_WORDS = {
+    'a', 'an', 'and', 'apartment', 'apartments', 'around', 'at', 'bed', 'bedroom', 'bedrooms', 'below',
+    'between', 'by', 'condo', 'condos', 'flat', 'flats', 'for', 'from', 'home', 'homes', 'house', 'houses',
+    'in', 'is', 'near', 'of', 'on', 'or', 'over', 'penthouse', 'penthouses', 'please', 'properties',
+    'property', 'studio', 'studios', 'that', 'the', 'thanks', 'to', 'townhouse', 'townhouses', 'under',
+    'unit', 'units', 'up', 'villa', 'villas', 'what', 'which', 'with', 'within',
+}
+
+
+def normalize_message(text: str) -> str:
+    """Lower-cased words only, so punctuation and spacing don't change the cache key."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def hashing_embedder(text: str, dim: int = 512) -> np.ndarray:
+    """
+    Local, deterministic embedding: signed feature hashing of words, word bigrams and
+    character trigrams, L2-normalized. Needs no model download or network, and doubles
+    as the stand-in embedder for tests.
+    """
+    words = normalize_message(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        h = zlib.crc32(feature.encode('utf-8'))
+        vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def message_slots(text: str, known_cities: Optional[Iterable[str]] = None) -> Dict[str, object]:
+    """
+    The facts a cached reply must share exactly with the new message: bedrooms, budget and city
+    (memory.extract_preferences), plus the place, i.e. the city with the words that qualify it.
+    """
+    if known_cities is None:
+        from .property_index import get_property_index
+        known_cities = get_property_index().cities
+
+    slots = extract_preferences(text, known_cities)
+    if 'city' in slots:
+        words = normalize_message(text).split()
+        city = normalize_message(str(slots['city'])).split()
+        for start in range(len(words) - len(city) + 1):
+            if words[start:start + len(city)] == city:
+                rest = words[start + len(city):]
+                qualifier = list(takewhile(lambda w: w not in _PLACE_STOP_WORDS and not any(c.isdigit() for c in w), rest))
+                slots['place'] = " ".join(city + qualifier[:3])
+                break
+    return slots
+
+
+def slot_key(context_key: str, slots: Dict[str, object]) -> str:
+    """Context key narrowed to one combination of slots (short hash, fits the indexed column)."""
+    digest = hashlib.sha1(json.dumps(slots, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:12]
+    return f"{context_key}:{digest}"
+
+
+class ResponseCache:
+    """
+    Similarity cache of agent replies, stored in the ResponseCacheEntry table.
+
+    A lookup embeds the message and returns the reply of the most similar live entry with
+    the same context key and the same slots (city/place, bedrooms, budget: "2-bed" and
+    "3-bed" embed alike but must not share a reply) if the cosine similarity reaches the
+    threshold. Entries expire
+    after their TTL and whenever the catalogue generation changes, and the table is capped
+    at max_entries (least recently used entries are deleted first).
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: float = 0.9,
+        ttl_seconds: float = 24 * 3600,
+        max_entries: int = 500,
+        enabled: bool = True,
+        slots: Optional[SlotExtractor] = None,
+    ):
+        self.embedder = embedder or hashing_embedder
+        self.slots = slots or message_slots
+        self.threshold = threshold
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+    def _live_entries(self, context_key: str):
+        return ResponseCacheEntry.objects.filter(
+            context_key=context_key,
+            generation=current_generation(),
+            expires_at__gt=timezone.now(),
+        )
+
+    def lookup(self, message: str, context_key: str = OPENING) -> Optional[str]:
+        """Returns the cached reply for a similar enough message, or None."""
+        if not self.enabled:
+            return None
+
+        context_key = slot_key(context_key, self.slots(message))
+        entries = list(self._live_entries(context_key).values_list('id', 'embedding', 'reply'))
+        if not entries:
+            return None
+
+        query = self.embedder(message).astype(np.float32)
+        matrix = np.vstack([np.frombuffer(bytes(blob), dtype=np.float32) for _, blob, _ in entries])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        entry_id, _, reply = entries[best]
+        ResponseCacheEntry.objects.filter(id=entry_id).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        return reply
+
+    def store(self, message: str, reply: str, context_key: str = OPENING) -> None:
+        """Caches a reply and enforces the expiry and size bounds."""
+        if not self.enabled:
+            return
+
+        now = timezone.now()
+        ResponseCacheEntry.objects.create(
+            context_key=slot_key(context_key, self.slots(message)),
+            question=message,
+            normalized_question=normalize_message(message),
+            embedding=self.embedder(message).astype(np.float32).tobytes(),
+            reply=reply,
+            generation=current_generation(),
+            expires_at=now + self.ttl,
+            last_used_at=now,
+        )
+
+        # Drop entries that expired or belong to an older catalogue, then trim to size
+        ResponseCacheEntry.objects.exclude(generation=current_generation()).delete()
+        ResponseCacheEntry.objects.filter(expires_at__lte=now).delete()
+        surplus = list(
+            ResponseCacheEntry.objects.order_by('-last_used_at').values_list('id', flat=True)[self.max_entries:]
+        )
+        if surplus:
+            ResponseCacheEntry.objects.filter(id__in=surplus).delete()
+
+
+def _configured_embedder() -> Optional[Embedder]:
+    """AGENT_RESPONSE_CACHE_EMBEDDER may name a callable (dotted path) returning a 1-D vector."""
+    path = getattr(settings, 'AGENT_RESPONSE_CACHE_EMBEDDER', None)
+    return import_string(path) if path else None
+
+
+# Process-wide cache used by the chat endpoints (off unless AGENT_RESPONSE_CACHE_ENABLED is set)
+response_cache = ResponseCache(
+    embedder=_configured_embedder(),
+    threshold=getattr(settings, 'AGENT_RESPONSE_CACHE_THRESHOLD', 0.9),
+    ttl_seconds=getattr(settings, 'AGENT_RESPONSE_CACHE_TTL', 24 * 3600),
+    max_entries=getattr(settings, 'AGENT_RESPONSE_CACHE_MAX_ENTRIES', 500),
+    enabled=getattr(settings, 'AGENT_RESPONSE_CACHE_ENABLED', False),
+)
@@ -0,0 +1,253 @@
+# agent_app/router.py
+
+import re
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .memory import extract_preferences
+from .property_index import PropertyIndex, get_property_index
+
+# --- 1. Configuration ---
+
+# Set AGENT_ROUTER_ENABLED = False to send every message to the agent
+ENABLED = getattr(settings, 'AGENT_ROUTER_ENABLED', True)
+
+# Units listed in a direct search answer
+SEARCH_RESULTS = 5
+
+# Developers / cities listed in catalogue answers
+LIST_LIMIT = 10
+
+# Routes; 'agent' means the message went on to the ReAct agent
+GREETING, THANKS, CITIES, DEVELOPERS, PRICES, SEARCH, AGENT = (
+    'greeting', 'thanks', 'cities', 'developers', 'prices', 'search', 'agent'
+)
+
+NUDGE = "Would you like to schedule a viewing of any of these, or narrow the search further?"
+
+_GREETING_RE = re.compile(
+    r"^(hi|hello|hey|hiya|hola|salaam|greetings|good (morning|afternoon|evening))( there)?[\s!.,]*$"
+)
+_THANKS_RE = re.compile(
+    r"^(ok(ay)?,? )?(thanks|thank you|thx|ty|cheers|great,? thanks|bye|goodbye|see you)( (so|very) much)?[\s!.,]*$"
+)
+_CITIES_RE = re.compile(
+    r"\b(which|what) (cities|locations|countries)\b|\bcities (do )?you (cover|have|offer)\b"
+    r"|\bwhere do you have (properties|projects|units)\b"
+)
+# Matched against the whole message (city removed): any other detail ("which developers have the
+# cheapest 2-bed in Dubai") makes it a question for the agent, not a request for the list
+_DEVELOPERS_RE = re.compile(
+    r"((can|could) you |please )?"
+    r"((which|what) developers( do you (have|work with|list|cover)| are (there|available|listed|active)| are)?"
+    r"|(list|show( me)?|tell me)( the| all| all the| your)? developers( (you (have|work with)|available))?"
+    r"|(who are )?(the |your )?developers (do )?you (have|work with))"
+    r"( (in|at|for))?( please)?( \?)?"
+)
+_PRICES_RE = re.compile(
+    r"\bprice range\b|\bwhat are (the )?prices\b|\bhow much do (properties|units|apartments|villas|homes) cost\b"
+)
+
+# A direct search answers only messages made of filters and these filler words; anything else
+# (amenities, comparisons, follow-ups about earlier results) goes to the agent
+_FILLER = set("""
+    i im i'm we are am looking look for a an the some any in at with of to me us show find get want need would like
+    please pls hi hello hey do you have is there are there available options option units unit property properties
+    apartment apartments flat flats villa villas house houses home homes bed beds bedroom bedrooms br bhk studio studios
+    under below less than up upto max maximum budget within around about usd k m mn mil million thousand and or
+""".split())
+_TYPE_WORDS = {'apartment': 'apartment', 'flat': 'apartment', 'villa': 'villa', 'house': 'house', 'home': 'house'}
+_WORD_RE = re.compile(r"[a-z']+|\d[\d,.]*")
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().replace('?', ' ? ').split())
+
+# --- 2. Precomputed catalogue facts ---
+
+class CatalogueFacts:
+    """Per-city unit counts and price ranges plus developer counts, derived once per catalogue generation."""
+
+    def __init__(self, index: PropertyIndex):
+        self.generation = index.generation
+        self.units = index.size
+        priced = index.price > 0
+
+        # 1. Cities: units and price range
+        self.cities: Dict[str, Tuple[int, float, float, float]] = {}
+        for code, city in enumerate(index.city.categories):
+            if not city:
+                continue
+            rows = index.city.codes == code
+            prices = index.price[rows & priced]
+            self.cities[city] = (
+                int(rows.sum()),
+                float(prices.min()) if len(prices) else 0.0,
+                float(np.median(prices)) if len(prices) else 0.0,
+                float(prices.max()) if len(prices) else 0.0,
+            )
+
+        # 2. Developers (case variants such as 'DAMAC'/'Damac' counted together), overall and per city
+        display: Dict[str, str] = {}
+        self.developers: Counter = Counter()
+        self.developers_by_city: Dict[str, Counter] = {}
+        for i, name in enumerate(index.developers):
+            name = str(name or '').strip()
+            if not name or name.lower() == 'nan':
+                continue
+            key = display.setdefault(name.lower(), name)
+            self.developers[key] += 1
+            self.developers_by_city.setdefault(index.city.label(i), Counter())[key] += 1
+
+        all_prices = index.price[priced]
+        self.price_range = (
+            float(all_prices.min()) if len(all_prices) else 0.0,
+            float(np.median(all_prices)) if len(all_prices) else 0.0,
+            float(all_prices.max()) if len(all_prices) else 0.0,
+        )
+
+
+_facts: Optional[CatalogueFacts] = None
+_facts_lock = threading.Lock()
+
+
+def get_catalogue_facts(index: PropertyIndex) -> CatalogueFacts:
+    """Facts for the current index, recomputed when the catalogue generation changes."""
+    global _facts
+    if _facts is None or _facts.generation != index.generation:
+        with _facts_lock:
+            if _facts is None or _facts.generation != index.generation:
+                _facts = CatalogueFacts(index)
+    return _facts
+
+# --- 3. Answers ---
+
+def _usd(value: float) -> str:
+    if value >= 1_000_000:
+        return f"${value / 1_000_000:.1f}M"
+    return f"${value / 1_000:.0f}K" if value >= 1_000 else f"${value:,.0f}"
+
+
+def _greeting() -> str:
+    return (
+        "Hello! I can help you find a property: tell me the city, number of bedrooms and budget "
+        "you have in mind (e.g. \"2 bedroom apartment in Dubai under $1M\"), or ask which cities we cover."
+    )
+
+
+def _thanks() -> str:
+    return "You're welcome! Let me know if you'd like more options, or I can book a viewing for you."
+
+
+def _cities(facts: CatalogueFacts) -> str:
+    by_units = sorted(facts.cities.items(), key=lambda item: -item[1][0])
+    lines = [f"- {city}: {units} units, {_usd(low)}-{_usd(high)}" for city, (units, low, _, high) in by_units[:LIST_LIMIT]]
+    more = len(by_units) - LIST_LIMIT
+    tail = f"\n...and {more} more: {', '.join(city for city, _ in by_units[LIST_LIMIT:])}." if more > 0 else ""
+    return (
+        f"We have {facts.units} units in {len(facts.cities)} cities. The largest selections are:\n"
+        + "\n".join(lines) + tail
+        + "\nWhich city interests you, and what size and budget are you looking for?"
+    )
+
+
+def _developers(facts: CatalogueFacts, city: Optional[str]) -> str:
+    counts = facts.developers_by_city.get(city, Counter()) if city else facts.developers
+    if not counts:
+        return f"I don't have developer information for {city}."
+    where = f" in {city}" if city else ""
+    top = ", ".join(f"{name} ({units} units)" for name, units in counts.most_common(LIST_LIMIT))
+    return f"We work with {len(counts)} developers{where}. The largest are: {top}. Would you like to see projects from any of them?"
+
+
+def _prices(facts: CatalogueFacts, city: Optional[str]) -> str:
+    if city:
+        units, low, median, high = facts.cities[city]
+        return (
+            f"In {city} we have {units} units priced from {_usd(low)} to {_usd(high)} (median {_usd(median)}). "
+            "What budget and number of bedrooms should I search for?"
+        )
+    low, median, high = facts.price_range
+    return (
+        f"Across our {facts.units} units, prices range from {_usd(low)} to {_usd(high)} (median {_usd(median)}). "
+        "Which city and budget should I search for?"
+    )
+
+
+def _search(index: PropertyIndex, filters: Dict[str, object]) -> Optional[str]:
+    """A direct answer to a plain filter search, or None when nothing matches (the agent can suggest alternatives)."""
+    result = index.search(**filters, sort_by='price_asc', top_k=SEARCH_RESULTS)
+    if not result['total']:
+        return None
+    lines = []
+    for unit in result['results']:
+        bedrooms = 'studio' if unit['no_of_bedrooms'] == 0 else f"{unit['no_of_bedrooms']}-bed" if unit['no_of_bedrooms'] else ''
+        details = ", ".join(filter(None, [
+            bedrooms, unit['property_type'], unit['completion_status'], _usd(unit['price_usd']),
+            f"{unit['area_sq_mtrs']:.0f} m²" if unit['area_sq_mtrs'] else '',
+        ]))
+        developer = str(unit['developer_name'] or '').strip()
+        developer = f" by {developer}" if developer and developer.lower() not in unit['project_name'].lower() else ''
+        lines.append(f"- {unit['project_name']}{developer}: {details}")
+    shown = len(result['results'])
+    intro = f"I found {result['total']} matching units" + (f"; here are the {shown} most affordable:" if result['total'] > shown else ":")
+    return intro + "\n" + "\n".join(lines) + "\n" + NUDGE
+
+
+def _search_filters(text: str, cities: Tuple[str, ...]) -> Optional[Dict[str, object]]:
+    """Search filters if the message is nothing but a city plus bedrooms/budget/type (and filler words)."""
+    preferences = extract_preferences(text, cities)
+    city = preferences.get('city')
+    if not city or (len(preferences) < 2 and not any(w in text for w in _TYPE_WORDS)):
+        return None
+
+    residue = text
+    for city_name in [city, str(city).lower()]:
+        residue = residue.replace(city_name.lower(), ' ')
+    words = [w for w in _WORD_RE.findall(residue) if not w[0].isdigit()]
+    if any(w.strip("'") not in _FILLER and w.rstrip('s') not in _FILLER for w in words):
+        return None
+
+    filters: Dict[str, object] = {'city': city}
+    if 'bedrooms' in preferences:
+        filters['bedrooms'] = preferences['bedrooms']
+    if 'budget_usd' in preferences:
+        filters['max_price'] = preferences['budget_usd']
+    types = {_TYPE_WORDS[w.rstrip('s')] for w in words if w.rstrip('s') in _TYPE_WORDS}
+    if len(types) == 1:
+        filters['property_type'] = types.pop()
+    return filters
+
+
+def route_message(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Classifies a user message with local rules and answers it from the catalogue index when it can.
+    Returns (route, reply); reply is None (and route AGENT) when the message needs the agent.
+    """
+    text = _normalize(text)
+    if not ENABLED or not text:
+        return AGENT, None
+
+    if _GREETING_RE.match(text):
+        return GREETING, _greeting()
+    if _THANKS_RE.match(text):
+        return THANKS, _thanks()
+
+    index = get_property_index()
+    facts = get_catalogue_facts(index)
+    city = extract_preferences(text, index.cities).get('city')
+
+    if _CITIES_RE.search(text) and not city:
+        return CITIES, _cities(facts)
+    if _DEVELOPERS_RE.fullmatch(' '.join(text.replace(city.lower(), ' ').split()) if city else text):
+        return DEVELOPERS, _developers(facts, city)
+    if _PRICES_RE.search(text) and not extract_preferences(text).keys() - {'city'}:
+        return PRICES, _prices(facts, city)
+
+    if (filters := _search_filters(text, index.cities)) and (reply := _search(index, filters)):
+        return SEARCH, reply
+    return AGENT, None
@@ -0,0 +1,458 @@
+# agent_app/similarity.py
+
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from .dataset import current_generation
+from .formatting import format_table
+from .metrics import tool_span
+from .models import Project, Unit
+
+# --- 1. Configuration ---
+
+# Directory of the saved vectors (a .npy matrix, memory-mapped by every process, and a small .npz of metadata)
+VECTOR_DIR = getattr(settings, 'AGENT_VECTOR_DIR', os.path.join(getattr(settings, 'BASE_DIR', '.'), 'vector_index'))
+MATRIX_FILE = 'project_vectors.npy'
+META_FILE = 'project_vectors_meta.npz'
+
+# Share of the similarity from each block of the vector: description words, amenities, numbers
+WEIGHTS = {'text': 0.6, 'amenities': 0.25, 'numeric': 0.15}
+
+# Vocabulary caps (terms used by at least two projects, most common first)
+MAX_TERMS = 4096
+MAX_AMENITIES = 512
+
+MAX_TOP_K = 20
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9]+")
+_ITEM_RE = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+# Words that say nothing about what a project is like
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'each', 'every', 'for', 'from', 'has', 'have', 'in',
+    'into', 'is', 'it', 'its', 'of', 'on', 'or', 'our', 'that', 'the', 'their', 'this', 'to', 'with',
+    'where', 'which', 'while', 'will', 'you', 'your', 'like', 'similar', 'something', 'project', 'projects',
+    'property', 'properties', 'residence', 'residences', 'but', 'cheaper', 'one',
+}
+
+# Numeric attributes of a project, from its units (standardized before use)
+NUMERIC = ['log_median_price', 'log_median_area', 'median_bedrooms', 'share_villa', 'share_house', 'share_offplan']
+
+# --- 2. Features ---
+
+def words(text: Optional[str]) -> List[str]:
+    return [w for w in _WORD_RE.findall(str(text or '').lower()) if w not in _STOPWORDS]
+
+
+def amenity_items(text: Optional[str]) -> List[str]:
+    """Items of a features/facilities list as stored from the CSV ("['sea_view' 'gym']" -> ['sea view', 'gym'])."""
+    items = (a or b for a, b in _ITEM_RE.findall(str(text or '')))
+    return [' '.join(item.lower().replace('_', ' ').split()) for item in items if item.strip()]
+
+
+def _vocabulary(documents: List[Sequence[str]], limit: int) -> Tuple[Dict[str, int], np.ndarray]:
+    """Terms found in at least two documents (the `limit` most common) and their smoothed idf."""
+    df = Counter(term for doc in documents for term in set(doc))
+    terms = [t for t, n in sorted(df.items(), key=lambda item: (-item[1], item[0])) if n >= 2][:limit]
+    idf = np.array([math.log((1 + len(documents)) / (1 + df[t])) + 1 for t in terms], dtype=np.float32)
+    return {t: i for i, t in enumerate(terms)}, idf
+
+
+def _tfidf(doc: Sequence[str], vocabulary: Dict[str, int], idf: np.ndarray, sublinear: bool = True) -> np.ndarray:
+    """L2-normalized tf-idf vector of one document (all zeros if none of its terms are known)."""
+    vector = np.zeros(len(vocabulary), dtype=np.float32)
+    for term, count in Counter(doc).items():
+        if (i := vocabulary.get(term)) is not None:
+            vector[i] = (1 + math.log(count) if sublinear else 1.0) * idf[i]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _project_frame() -> pd.DataFrame:
+    """One row per project: its text fields plus price, area, bedroom and type statistics of its units."""
+    projects = pd.DataFrame.from_records(
+        Project.objects.order_by('id').values(
+            'id', 'project_name', 'developer_name', 'city', 'project_description', 'facilities'
+        ),
+        columns=['id', 'project_name', 'developer_name', 'city', 'project_description', 'facilities'],
+    ).set_index('id')
+    units = pd.DataFrame.from_records(
+        Unit.objects.values_list('project_id', 'price_usd', 'area_sq_mtrs', 'no_of_bedrooms', 'property_type', 'completion_status', 'features'),
+        columns=['project_id', 'price', 'area', 'bedrooms', 'property_type', 'completion_status', 'features'],
+    )
+    for column in ('price', 'area', 'bedrooms'):
+        units[column] = pd.to_numeric(units[column], errors='coerce').astype(float)
+    units['price'] = units['price'].where(units['price'] > 0)
+    units['area'] = units['area'].where(units['area'] > 0)
+    units['features'] = units['features'].fillna('')
+    # Bit n set = the project has an n-bedroom unit
+    bits = np.left_shift(1, units['bedrooms'].clip(0, 62).fillna(0).astype(np.int64))
+    units['bedroom_bit'] = bits.where(units['bedrooms'].notna(), 0)
+    kind = units['property_type'].fillna('').str.lower()
+    status = units['completion_status'].fillna('').str.lower().str.removeprefix('x_')
+
+    grouped = units.assign(
+        villa=(kind == 'villa').astype(float), house=(kind == 'house').astype(float), offplan=(status == 'offplan').astype(float),
+    ).groupby('project_id')
+    stats = pd.DataFrame({
+        'min_price': grouped['price'].min(),
+        'median_price': grouped['price'].median(),
+        'max_price': grouped['price'].max(),
+        'log_median_price': np.log1p(grouped['price'].median()),
+        'log_median_area': np.log1p(grouped['area'].median()),
+        'median_bedrooms': grouped['bedrooms'].median(),
+        'min_bedrooms': grouped['bedrooms'].min(),
+        'max_bedrooms': grouped['bedrooms'].max(),
+        'share_villa': grouped['villa'].mean(),
+        'share_house': grouped['house'].mean(),
+        'share_offplan': grouped['offplan'].mean(),
+        'bedroom_mask': grouped['bedroom_bit'].agg(np.bitwise_or.reduce),
+        'features': grouped['features'].agg(' '.join),
+    })
+    # Inner join: projects without units (kept by an incremental load for their bookings) are off sale
+    frame = projects.join(stats, how='inner')
+    frame['bedroom_mask'] = frame['bedroom_mask'].fillna(0).astype(np.int64)
+    frame['features'] = frame['features'].fillna('')
+    return frame
+
+# --- 3. Vector index ---
+
+class ProjectVectors:
+    """
+    One row per Project: [text tf-idf | amenity tf-idf | standardized numbers], each block unit
+    length and scaled by the square root of its weight, so a dot product is the weighted sum of
+    the three cosine similarities. The matrix is memory-mapped from disk; the per-project
+    attributes used by the pre-filters (city, price range, bedroom counts) are small arrays.
+    """
+
+    def __init__(self, matrix: np.ndarray, meta: Dict[str, np.ndarray]):
+        self.matrix = matrix
+        self.generation = int(meta['generation'])
+        self.ids = meta['ids']
+        self.names = meta['names']
+        self.developers = meta['developers']
+        self.cities = meta['cities']
+        self.min_price, self.median_price, self.max_price = meta['min_price'], meta['median_price'], meta['max_price']
+        self.min_bedrooms, self.max_bedrooms = meta['min_bedrooms'], meta['max_bedrooms']
+        self.bedroom_mask = meta['bedroom_mask']
+        self.amenities = meta['amenities']
+        self.vocabulary = {t: i for i, t in enumerate(meta['vocabulary'].tolist())}
+        self.idf = meta['idf']
+        self.size = len(self.ids)
+        self.build_seconds = 0.0
+        self._name_keys = [' '.join(words(n)) for n in self.names.tolist()]
+        self._city_keys = np.array([str(c).strip().lower() for c in self.cities.tolist()], dtype=object)
+
+    @classmethod
+    def build(cls, generation: int = 0) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Computes the matrix and metadata from the database."""
+        frame = _project_frame()
+        texts = [
+            words(f"{row.project_name} {row.project_description}") + [w for item in items for w in words(item)]
+            for row, items in zip(
+                frame.itertuples(), (amenity_items(f) + amenity_items(u) for f, u in zip(frame['facilities'], frame['features']))
+            )
+        ]
+        amenities = [sorted(set(amenity_items(f) + amenity_items(u))) for f, u in zip(frame['facilities'], frame['features'])]
+
+        vocabulary, idf = _vocabulary(texts, MAX_TERMS)
+        amenity_vocabulary, amenity_idf = _vocabulary(amenities, MAX_AMENITIES)
+        text_block = np.stack([_tfidf(doc, vocabulary, idf) for doc in texts]) if texts else np.zeros((0, len(vocabulary)), np.float32)
+        amenity_block = (
+            np.stack([_tfidf(doc, amenity_vocabulary, amenity_idf, sublinear=False) for doc in amenities])
+            if amenities else np.zeros((0, len(amenity_vocabulary)), np.float32)
+        )
+
+        numbers = frame[NUMERIC].astype(float)
+        std = numbers.std(ddof=0).replace(0, 1).fillna(1)
+        numeric_block = ((numbers - numbers.mean()) / std).fillna(0).to_numpy(np.float32)
+        norms = np.linalg.norm(numeric_block, axis=1, keepdims=True)
+        numeric_block = np.divide(numeric_block, norms, out=np.zeros_like(numeric_block), where=norms > 0)
+
+        matrix = np.hstack([
+            text_block * math.sqrt(WEIGHTS['text']),
+            amenity_block * math.sqrt(WEIGHTS['amenities']),
+            numeric_block * math.sqrt(WEIGHTS['numeric']),
+        ]).astype(np.float32)
+
+        def numbers_of(name: str) -> np.ndarray:
+            return frame[name].astype(float).to_numpy(np.float64)
+
+        def text_of(name: str) -> np.ndarray:
+            return frame[name].fillna('').astype(str).to_numpy(str)
+
+        meta = {
+            'generation': np.array(generation),
+            'ids': frame.index.to_numpy(np.int64),
+            'names': text_of('project_name'), 'developers': text_of('developer_name'), 'cities': text_of('city'),
+            'min_price': numbers_of('min_price'), 'median_price': numbers_of('median_price'), 'max_price': numbers_of('max_price'),
+            'min_bedrooms': numbers_of('min_bedrooms'), 'max_bedrooms': numbers_of('max_bedrooms'),
+            'bedroom_mask': frame['bedroom_mask'].to_numpy(np.int64),
+            'amenities': np.array(['|'.join(a) for a in amenities], dtype=str),
+            'vocabulary': np.array(list(vocabulary), dtype=str), 'idf': idf,
+        }
+        return matrix, meta
+
+    # Persistence
+
+    @staticmethod
+    def save(matrix: np.ndarray, meta: Dict[str, np.ndarray], directory: str = VECTOR_DIR) -> None:
+        """
+        Writes both files next to the live ones and swaps them in (processes that mapped the old file keep it).
+        Each write goes to its own temporary file, so concurrent rebuilds never share a half-written one.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, write in ((META_FILE, lambda f: np.savez(f, **meta)), (MATRIX_FILE, lambda f: np.save(f, matrix))):
+            with tempfile.NamedTemporaryFile(dir=directory, prefix=name + '.', suffix='.tmp', delete=False) as f:
+                try:
+                    write(f)
+                except BaseException:
+                    f.close()
+                    os.unlink(f.name)
+                    raise
+            os.replace(f.name, os.path.join(directory, name))
+
+    @classmethod
+    def load(cls, directory: str = VECTOR_DIR) -> Optional['ProjectVectors']:
+        """The saved vectors, with the matrix memory-mapped read-only (None if there are none)."""
+        try:
+            with np.load(os.path.join(directory, META_FILE), allow_pickle=False) as data:
+                meta = {key: data[key] for key in data.files}
+            matrix = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if matrix.shape[0] != len(meta['ids']):
+            return None
+        return cls(matrix, meta)
+
+    # Queries
+
+    def find(self, name: str) -> List[int]:
+        """Rows of the projects a name refers to: exact matches, else every project whose name has all its words ('St. Regis')."""
+        key = ' '.join(words(name))
+        if not key:
+            return []
+        exact = [i for i, k in enumerate(self._name_keys) if k == key]
+        if exact:
+            return exact
+        wanted = set(key.split())
+        return [i for i, k in enumerate(self._name_keys) if wanted <= set(k.split())]
+
+    def text_vector(self, text: str) -> np.ndarray:
+        """Query vector for a free-text description (only the text block is non-zero)."""
+        vector = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        vector[:len(self.vocabulary)] = _tfidf(words(text), self.vocabulary, self.idf) * math.sqrt(WEIGHTS['text'])
+        return vector
+
+    def candidates(
+        self,
+        city: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        bedrooms: Optional[int] = None,
+    ) -> np.ndarray:
+        """Boolean mask of the projects passing the structured filters (a project passes if one of its units does)."""
+        mask = np.ones(self.size, dtype=bool)
+        if city:
+            mask &= self._city_keys == city.strip().lower()
+        # NaN prices (no priced unit) fail every comparison, so those projects drop out of budget searches
+        if max_price is not None:
+            mask &= self.min_price <= max_price
+        if min_price is not None:
+            mask &= self.max_price >= min_price
+        if bedrooms is not None:
+            mask &= (self.bedroom_mask & (1 << max(0, min(int(bedrooms), 62)))) != 0
+        return mask
+
+    def top_k(self, queries: np.ndarray, mask: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Batched cosine top-k: one matrix product scores every query against every project, then
+        argpartition picks each query's best k rows among those allowed by mask. Returns
+        (row, score) pairs per query, best first.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+        scores = np.asarray(self.matrix @ queries.T)  # (projects, queries)
+        scores[~mask] = -np.inf
+
+        if not mask.any():
+            return [[] for _ in range(len(queries))]
+        k = max(1, min(k, int(mask.sum())))
+        best = np.argpartition(-scores, k - 1, axis=0)[:k]
+        results = []
+        for q in range(len(queries)):
+            rows = best[:, q][np.argsort(-scores[best[:, q], q], kind='stable')]
+            results.append([(int(r), float(scores[r, q])) for r in rows if np.isfinite(scores[r, q])])
+        return results
+
+    def similar(
+        self,
+        like: Sequence[str] = (),
+        description: str = '',
+        top_k: int = 5,
+        cheaper: bool = False,
+        **filters,
+    ) -> Dict[str, object]:
+        """
+        Projects most similar to the named ones (each a query of the batch; a project's score is
+        its best match) and/or to a free-text description, after the structured filters.
+        """
+        found = [(name, self.find(name)) for name in like]
+        references = [rows for _, rows in found if rows]
+        missing = [name for name, rows in found if not rows]
+        if not references and not description:
+            return {'missing': missing, 'references': [], 'results': []}
+
+        reference_rows = [r for rows in references for r in rows]
+        queries = [self.matrix[rows].mean(axis=0) for rows in references]
+        if description:
+            text = self.text_vector(description)
+            queries = [q + text for q in queries] or [text]
+
+        # "Cheaper" means below the cheapest median price of the references
+        if cheaper and reference_rows:
+            medians = self.median_price[reference_rows]
+            if np.isfinite(medians).any():
+                cap = float(np.nanmin(medians))
+                filters['max_price'] = min(filters.get('max_price') or cap, cap)
+
+        mask = self.candidates(**filters)
+        reference_names = {self._name_keys[r] for r in reference_rows}
+        mask &= np.array([k not in reference_names for k in self._name_keys], dtype=bool)
+
+        k = max(1, min(top_k, MAX_TOP_K))
+        # Extra rows per query leave room to merge the batch and drop duplicate names
+        best: Dict[str, Tuple[float, int]] = {}
+        for matches in self.top_k(np.stack(queries), mask, k * 3):
+            for row, score in matches:
+                key = self._name_keys[row]
+                if key not in best or score > best[key][0]:
+                    best[key] = (score, row)
+        ranked = sorted(best.values(), key=lambda item: -item[0])[:k]
+        return {
+            'missing': missing,
+            'references': list(dict.fromkeys(str(self.names[r]) for r in reference_rows)),
+            'results': [self.row(r, score, reference_rows) for score, r in ranked],
+        }
+
+    def row(self, i: int, score: float, reference_rows: Sequence[int] = ()) -> Dict[str, object]:
+        """One recommended project, with the amenities it shares with the references."""
+        shared = set(str(self.amenities[i]).split('|')) - {''}
+        if reference_rows:
+            shared &= set().union(*(str(self.amenities[r]).split('|') for r in reference_rows))
+        low, high = self.min_bedrooms[i], self.max_bedrooms[i]
+        return {
+            'project_id': int(self.ids[i]),
+            'project_name': str(self.names[i]),
+            'city': str(self.cities[i]),
+            'developer_name': str(self.developers[i]),
+            'from_price_usd': None if np.isnan(self.min_price[i]) else float(self.min_price[i]),
+            'median_price_usd': None if np.isnan(self.median_price[i]) else float(self.median_price[i]),
+            'bedrooms': '' if np.isnan(low) else (f"{int(low)}" if low == high else f"{int(low)}-{int(high)}"),
+            'similarity': round(score, 3),
+            'shared_amenities': ', '.join(sorted(shared)[:5]),
+        }
+
+
+# --- 4. Process-wide index ---
+
+_vectors: Optional[ProjectVectors] = None
+_vectors_lock = threading.Lock()
+
+
+def rebuild_project_vectors(generation: Optional[int] = None) -> ProjectVectors:
+    """Recomputes the vectors from the database, saves them to VECTOR_DIR and loads them (used by setup_db.py)."""
+    global _vectors
+
+    started = time.perf_counter()
+    with _vectors_lock:
+        matrix, meta = ProjectVectors.build(current_generation(max_age=0) if generation is None else generation)
+        ProjectVectors.save(matrix, meta)
+        _vectors = ProjectVectors.load() or ProjectVectors(matrix, meta)
+        _vectors.build_seconds = time.perf_counter() - started
+    return _vectors
+
+
+def get_project_vectors() -> ProjectVectors:
+    """
+    The process's vectors: the saved files when they match the catalogue generation, otherwise
+    rebuilt (and saved) from the database, e.g. on the first query after a reload.
+    """
+    global _vectors
+
+    generation = current_generation()
+    if _vectors is not None and _vectors.generation == generation:
+        return _vectors
+
+    with _vectors_lock:
+        if _vectors is None or _vectors.generation != generation:
+            saved = ProjectVectors.load()
+            if saved is not None and saved.generation == generation:
+                _vectors = saved
+    if _vectors is None or _vectors.generation != generation:
+        return rebuild_project_vectors(generation)
+    return _vectors
+
+# --- 5. Agent tool ---
+
+class SimilarProjects(BaseModel):
+    """Recommendations of projects similar to ones the user likes or describes."""
+    like: List[str] = Field(default_factory=list, description="Names of projects the user likes, e.g. ['St. Regis'].")
+    description: Optional[str] = Field(default=None, description="What the user wants in their own words, e.g. 'beachfront resort with a marina'.")
+    cheaper: bool = Field(default=False, description="Only projects cheaper than the liked ones ('like X but cheaper').")
+    city: Optional[str] = Field(default=None, description="City name, e.g. 'Dubai'.")
+    min_price: Optional[float] = Field(default=None, description="Minimum price in USD.")
+    max_price: Optional[float] = Field(default=None, description="Maximum price (budget) in USD.")
+    bedrooms: Optional[int] = Field(default=None, description="Exact number of bedrooms (0 for studios).")
+    top_k: int = Field(default=5, description=f"Number of projects to return (max {MAX_TOP_K}).")
+
+
+_RESULT_COLUMNS = [
+    'project_name', 'city', 'from_price_usd', 'median_price_usd', 'bedrooms', 'similarity', 'shared_amenities', 'developer_name',
+]
+
+
+def similar_projects(
+    like: Optional[List[str]] = None,
+    description: Optional[str] = None,
+    cheaper: bool = False,
+    top_k: int = 5,
+    **filters,
+) -> str:
+    """Projects similar to the named ones and/or a description, within the city/budget/bedroom filters."""
+    if not like and not description:
+        return "Name a project the user likes or describe what they want."
+    with tool_span('similar_projects') as record:
+        result = get_project_vectors().similar(like or (), description or '', top_k, cheaper, **filters)
+        record['rows'] = len(result['results'])
+
+    note = f" No project named {', '.join(result['missing'])} in the catalogue." if result['missing'] else ''
+    if not result['results']:
+        return ("No similar projects match these criteria." + note).strip()
+    basis = ', '.join(result['references']) or 'the description'
+    rows = [[project[c] for c in _RESULT_COLUMNS] for project in result['results']]
+    return format_table(_RESULT_COLUMNS, rows, title=f"Projects most similar to {basis} (similarity 0-1):{note}")
+
+
+similar_projects_tool = StructuredTool.from_function(
+    func=similar_projects,
+    name="similar_projects",
+    description=(
+        "Recommends projects similar to ones the user names ('something like St. Regis but cheaper') or describes, "
+        "comparing descriptions, amenities, prices and unit mix, with optional city, budget and bedroom filters."
+    ),
+    args_schema=SimilarProjects,
+)
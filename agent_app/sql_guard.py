@@ -0,0 +1,166 @@
+# agent_app/sql_guard.py
+
+import re
+from typing import List, Set
+
+import sqlparse
+from django.conf import settings
+from sqlparse import sql as sql_nodes
+from sqlparse import tokens as T
+
+# --- 1. Configuration ---
+
+# Tables the agent's SQL may read
+ALLOWED_TABLES = {t.lower() for t in getattr(settings, 'AGENT_SQL_ALLOWED_TABLES', ['agent_app_project', 'agent_app_unit'])}
+
+# Row cap: injected when the query has no LIMIT, and the ceiling for the LIMIT it has
+MAX_ROWS = getattr(settings, 'AGENT_SQL_MAX_ROWS', 50)
+
+# Long free-text columns that make full scans and sorts expensive (and flood the prompt)
+LARGE_TEXT_COLUMNS = {'project_description', 'features', 'facilities'}
+
+_CTE_NAME_RE = re.compile(r'(?:\bWITH\s+(?:RECURSIVE\s+)?|,\s*)(\w+)\s+AS\s*\(', re.IGNORECASE)
+
+# SQLite plan lines: "SCAN agent_app_unit" is a full scan, "SCAN ... USING (COVERING) INDEX" is not
+_FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)(?!.*\bINDEX\b)')
+
+
+class SQLGuardError(Exception):
+    """A rejected statement. str() is the short message returned to the agent in place of a result."""
+
+    def __init__(self, code: str, message: str, hint: str = ''):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.hint = hint
+
+    def __str__(self):
+        text = f"Error (guard: {self.code}): {self.message}"
+        return f"{text} Hint: {self.hint}" if self.hint else text
+
+# --- 2. Statement checks and LIMIT rewrite ---
+
+def _tables(statement: sql_nodes.Statement) -> Set[str]:
+    """
+    Names that appear as tables after FROM / JOIN (including comma-separated FROM lists).
+    Quoted names ("t", `t`, [t]) are unquoted; anything else in a table position (a string
+    literal, a keyword) is returned as written, so it never matches an allowed table.
+    """
+    tables = set()
+    expect_table = in_from_list = False
+    for token in statement.flatten():
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+        if token.ttype in T.Keyword and (token.normalized == 'FROM' or token.normalized.endswith('JOIN')):
+            expect_table = in_from_list = True
+        elif expect_table and token.match(T.Punctuation, '('):
+            # Subquery: its own FROM is checked when the scan reaches it
+            expect_table = in_from_list = False
+        elif expect_table:
+            if token.ttype in T.Name or token.ttype in T.String.Symbol:
+                tables.add(token.value.strip('"`[]').lower())
+            else:
+                tables.add(token.value)
+            expect_table = False
+        elif in_from_list and token.match(T.Punctuation, ','):
+            expect_table = True
+        elif token.ttype in T.Keyword or token.match(T.Punctuation, ('(', ')')):
+            expect_table = in_from_list = False
+    return tables
+
+
+def _column_names(node) -> Set[str]:
+    return {t.value.strip('"`[]').lower() for t in node.flatten() if t.ttype in T.Name}
+
+
+def _where_columns(node) -> Set[str]:
+    """Names used in any WHERE clause, including those of subqueries."""
+    columns = set()
+    for child in node.get_sublists():
+        columns |= _column_names(child) if isinstance(child, sql_nodes.Where) else _where_columns(child)
+    return columns
+
+
+def _clamp_limit(tokens: List[sqlparse.sql.Token]) -> List[str]:
+    """Top-level tokens as text, with the LIMIT clamped to MAX_ROWS (or appended if missing)."""
+    parts = [str(t) for t in tokens]
+    limit_at = next(
+        (i for i, t in enumerate(tokens) if t.ttype in T.Keyword and t.normalized == 'LIMIT'), None
+    )
+    if limit_at is None:
+        return parts + [f" LIMIT {MAX_ROWS}"]
+
+    value_at = next((i for i in range(limit_at + 1, len(tokens)) if not tokens[i].is_whitespace), None)
+    value = str(tokens[value_at]) if value_at is not None else ''
+    # "LIMIT n" or "LIMIT offset, n"
+    match = re.fullmatch(r'\s*(?:(\d+)\s*,\s*)?(\d+)\s*', value)
+    if not match:
+        raise SQLGuardError('bad_limit', "LIMIT must be a plain number.", f"Use LIMIT {MAX_ROWS} or less.")
+    offset, count = match.groups()
+    count = min(int(count), MAX_ROWS)
+    parts[value_at] = f"{offset}, {count}" if offset else str(count)
+    return parts
+
+
+def guard_sql(query: str) -> str:
+    """
+    Checks that the query is a single SELECT over the allowed tables and returns it with its
+    LIMIT injected or clamped. Raises SQLGuardError with a short, agent-readable reason otherwise.
+    """
+    # Without comments, a trailing "-- ..." cannot swallow the injected LIMIT
+    query = sqlparse.format(query, strip_comments=True)
+    statements = [s for s in sqlparse.parse(query) if str(s).strip(' \t\n;')]
+    if len(statements) != 1:
+        raise SQLGuardError('multiple_statements', "Send exactly one SQL statement.")
+    statement = statements[0]
+
+    if statement.get_type() != 'SELECT' or any(
+        t.ttype in (T.Keyword.DML, T.Keyword.DDL) and t.normalized != 'SELECT' for t in statement.flatten()
+    ):
+        raise SQLGuardError('not_select', "Only read-only SELECT statements are allowed.")
+
+    ctes = {name.lower() for name in _CTE_NAME_RE.findall(str(statement))}
+    if not_allowed := _tables(statement) - ALLOWED_TABLES - ctes:
+        raise SQLGuardError(
+            'table_not_allowed', f"Table(s) {', '.join(sorted(not_allowed))} cannot be queried.",
+            f"Query only: {', '.join(sorted(ALLOWED_TABLES))}."
+        )
+
+    tokens = list(statement.tokens)
+    while tokens and (tokens[-1].is_whitespace or tokens[-1].match(T.Punctuation, ';')):
+        tokens.pop()
+    return ''.join(_clamp_limit(tokens)).strip()
+
+# --- 3. Plan check ---
+
+def check_plan(engine, query: str) -> None:
+    """
+    Rejects (SQLite) plans that scan a whole table while filtering or sorting on the large
+    text columns. Queries that use an index, or scan without touching those columns, pass.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    with engine.connect() as connection:
+        plan = [str(row[-1]) for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}").fetchall()]
+    if not any(_FULL_SCAN_RE.search(line) for line in plan):
+        return
+
+    statement = sqlparse.parse(query)[0]
+    if _where_columns(statement) & LARGE_TEXT_COLUMNS:
+        raise SQLGuardError(
+            'text_scan', "Filtering on description/features/facilities scans every row.",
+            "Use the search_amenities tool for keyword searches, or filter on city, no_of_bedrooms or price_usd."
+        )
+
+    # SELECT * reads the text columns; COUNT(*) does not
+    select_all = any(
+        t.ttype is T.Wildcard and not isinstance(t.parent, sql_nodes.Parenthesis) for t in statement.flatten()
+    )
+    reads_text = select_all or bool(_column_names(statement) & LARGE_TEXT_COLUMNS)
+    if reads_text and any('USE TEMP B-TREE' in line for line in plan):
+        raise SQLGuardError(
+            'unbounded_sort', "Sorting or grouping every row together with its long text columns.",
+            "Select only the columns you need (e.g. project_name, city, no_of_bedrooms, price_usd) "
+            "or filter on city, no_of_bedrooms or price_usd first."
+        )
@@ -0,0 +1,112 @@
+# agent_app/sql_tool.py
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+from langchain_community.tools import QuerySQLDatabaseTool
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from sqlalchemy.exc import SQLAlchemyError
+
+from .agent_db import QUERY_TIMEOUT_SECONDS, is_timeout_error, query_deadline
+from .cache import normalize_sql, sql_result_cache
+from .formatting import format_table
+from .metrics import tool_span
+from .sql_guard import SQLGuardError, check_plan, guard_sql
+
+# Dedicated, bounded pool for the blocking SQL driver calls made from the async graph.
+# Keeping it separate from the event loop's default executor means a burst of slow
+# queries cannot starve the other sync_to_async work (ORM calls, sync graph nodes).
+_sql_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AGENT_SQL_MAX_THREADS', 8),
+    thread_name_prefix='agent-sql'
+)
+
+
+class PropertySQLTool(QuerySQLDatabaseTool):
+    """
+    SQL query tool for the property tables.
+    
+    Statements pass a guard first (agent_app/sql_guard.py: single SELECT on allowed tables,
+    capped LIMIT, plan check) and run under a time budget, and rows come back as a compact,
+    token-budgeted table rather than Python tuple reprs. Results are cached per normalized
+    statement (see agent_app/cache.py), so repeated searches skip the database, and there is
+    a non-blocking path for agent_graph.ainvoke.
+    """
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Any:
+        """Serves the query from the result cache, running it against the database on a miss."""
+        with tool_span(self.name) as record:
+            return self._guarded_run(query, record)
+
+    def _guarded_run(self, query: str, record: dict) -> str:
+        try:
+            query = guard_sql(query)
+        except SQLGuardError as error:
+            record['status'] = 'rejected'
+            return str(error)
+        
+        key = normalize_sql(query)
+        hit, result = sql_result_cache.get(key)
+        if hit:
+            record['status'] = 'cached'
+            return result
+        
+        try:
+            check_plan(self.db._engine, query)
+        except SQLGuardError as error:
+            record['status'] = 'rejected'
+            return str(error)
+        except SQLAlchemyError as error:
+            # A bad column or syntax error shows up at EXPLAIN already; the agent can fix and retry
+            record['status'] = 'error'
+            return f"Error: {error}"
+        
+        result, record['rows'] = self._execute(query)
+        if is_timeout_error(result):
+            record['status'] = 'timeout'
+            return str(SQLGuardError(
+                'timeout', f"The query exceeded the {QUERY_TIMEOUT_SECONDS:g}s time budget.",
+                "Add filters on city, no_of_bedrooms or price_usd, or select fewer columns."
+            ))
+        
+        # Errors are not cached, so a corrected retry of the same statement still runs
+        if not (isinstance(result, str) and result.startswith('Error')):
+            sql_result_cache.set(key, result)
+        else:
+            record['status'] = 'error'
+        return result
+
+    def _execute(self, query: str) -> Tuple[str, int]:
+        """
+        Runs the query under the time budget and renders the rows compactly (agent_app/formatting.py).
+        Returns the text for the model and the number of rows.
+        """
+        try:
+            with query_deadline(QUERY_TIMEOUT_SECONDS):
+                rows = self.db._execute(query, 'all')
+        except SQLAlchemyError as error:
+            return f"Error: {error}", 0
+        
+        if not rows:
+            return "No rows.", 0
+        columns = list(rows[0].keys())
+        return format_table(columns, [list(row.values()) for row in rows]), len(rows)
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> Any:
+        """Runs the synchronous query path on the SQL thread pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # run_in_executor does not carry context variables over; copy them so the call joins the request's trace
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_sql_executor, functools.partial(context.run, self._run, query))
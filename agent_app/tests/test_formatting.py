@@ -0,0 +1,37 @@
+# agent_app/tests/test_formatting.py
+
+from django.test import SimpleTestCase
+
+from agent_app.formatting import LEGEND, format_table, format_value
+
+
+class FormatValueTests(SimpleTestCase):
+
+    def test_numbers_and_empties(self):
+        self.assertEqual(format_value(1200000.0), '1200000')
+        self.assertEqual(format_value(2.5), '2.50')
+        self.assertEqual(format_value(float('nan')), '')
+        self.assertEqual(format_value('nan'), '')
+
+    def test_separator_and_ditto_are_escaped(self):
+        self.assertEqual(format_value('pool | gym'), 'pool / gym')
+        self.assertEqual(format_value('"'), "''")
+
+
+class FormatTableTests(SimpleTestCase):
+
+    def test_ditto_adds_legend(self):
+        table = format_table(['name', 'price'], [['Burj Vista', 1200000], ['Burj Vista', 1850000], ['Azure', 900000]])
+        self.assertEqual(table.splitlines(), [LEGEND, 'name|price', 'Burj Vista|1200000', '"|1850000', 'Azure|900000'])
+
+    def test_no_legend_without_ditto(self):
+        table = format_table(['name', 'price'], [['Burj Vista', 1200000], ['Azure', 900000]])
+        self.assertNotIn(LEGEND, table)
+
+    def test_constant_columns_are_hoisted(self):
+        table = format_table(['city', 'price'], [['Dubai', 1], ['Dubai', 2]], title='2 units')
+        self.assertEqual(table.splitlines(), ['2 units', 'same for all rows: city=Dubai', 'price', '1', '2'])
+
+    def test_budget_omits_rows(self):
+        table = format_table(['name'], [[f'Project number {i}'] for i in range(100)], token_budget=50)
+        self.assertRegex(table.splitlines()[-1], r'^\(\d+ more rows omitted\)$')
@@ -0,0 +1,237 @@
+# agent_app/tests/test_llm_scheduler.py
+
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase, TestCase
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from agent_app.llm_scheduler import (
+    BOOKING, NEW, PRIORITY_KEY, RETURNING, LLMOverloaded, LLMRateLimited, LLMScheduler, ScheduledChatModel,
+    request_priority,
+)
+from agent_app.models import Conversation, Lead, Message, Project, VisitBooking
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+def scheduler(**kwargs) -> LLMScheduler:
+    options = {'max_concurrency': 1, 'tokens_per_minute': 0, 'backoff_base': 0.01, 'backoff_max': 0.02}
+    return LLMScheduler(**{**options, **kwargs})
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+class AdmissionTests(SimpleTestCase):
+
+    def test_priority_order(self):
+        llm = scheduler()
+        granted = []
+
+        def call(name, priority):
+            with llm.slot(priority, tokens=10):
+                granted.append(name)
+
+        with llm.slot(NEW, tokens=10):
+            # Queued while the only slot is taken: new conversation first, then a booking lead
+            threads = [threading.Thread(target=call, args=('new', NEW))]
+            threads[0].start()
+            wait_for(lambda: llm.stats()['queue_depth'] == 1)
+            threads.append(threading.Thread(target=call, args=('booking', BOOKING)))
+            threads[1].start()
+            wait_for(lambda: llm.stats()['queue_depth'] == 2)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(granted, ['booking', 'new'])
+
+    def test_concurrency_limit(self):
+        llm = scheduler(max_concurrency=2)
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def call():
+            with llm.slot(RETURNING, tokens=10):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.02)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(llm.stats()['granted'], 6)
+
+    def test_token_budget_delays_calls(self):
+        # 6000 tokens per minute = 100 per second; the first call empties the bucket
+        llm = scheduler(tokens_per_minute=6000, max_concurrency=4)
+        with llm.slot(RETURNING, tokens=6000):
+            pass
+        started = time.monotonic()
+        with llm.slot(RETURNING, tokens=30):
+            pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+    def test_full_queue_is_a_503(self):
+        llm = scheduler(max_queue=0)
+        with self.assertRaises(LLMOverloaded) as caught:
+            with llm.slot(RETURNING, tokens=10):
+                pass
+        self.assertEqual(caught.exception.status_code, 503)
+        self.assertGreaterEqual(caught.exception.retry_after, 1)
+        self.assertEqual(llm.stats()['rejected'], 1)
+
+    def test_queue_timeout_is_a_503(self):
+        llm = scheduler(queue_timeout=0.05)
+        with llm.slot(RETURNING, tokens=10):
+            result = []
+            thread = threading.Thread(target=lambda: result.append(self._try_slot(llm)))
+            thread.start()
+            thread.join()
+        self.assertIsInstance(result[0], LLMOverloaded)
+        self.assertEqual(llm.stats()['queue_depth'], 0)
+
+    @staticmethod
+    def _try_slot(llm):
+        try:
+            with llm.slot(RETURNING, tokens=10):
+                return None
+        except LLMOverloaded as error:
+            return error
+
+    def test_async_slot(self):
+        llm = scheduler()
+
+        async def main():
+            async def call(name):
+                async with llm.aslot(RETURNING, tokens=10):
+                    await asyncio.sleep(0.01)
+                    return name
+            return await asyncio.gather(*(call(i) for i in range(3)))
+
+        self.assertEqual(asyncio.run(main()), [0, 1, 2])
+        self.assertEqual(llm.stats()['running'], 0)
+
+
+class RetryTests(SimpleTestCase):
+
+    def flaky(self, failures, error=RateLimitError):
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise error()
+            return AIMessage(content='ok', usage_metadata={'input_tokens': 5, 'output_tokens': 5, 'total_tokens': 10})
+        return call, calls
+
+    def test_rate_limit_is_retried(self):
+        llm = scheduler(max_retries=3)
+        call, calls = self.flaky(2)
+        self.assertEqual(llm.run(call, RETURNING, tokens=10).content, 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(llm.stats()['retries'], 2)
+
+    def test_server_error_is_retried(self):
+        llm = scheduler(max_retries=3)
+        call, calls = self.flaky(1, ServerError)
+        self.assertEqual(llm.run(call, RETURNING, tokens=10).content, 'ok')
+        self.assertEqual(len(calls), 2)
+
+    def test_retries_used_up_is_a_429(self):
+        llm = scheduler(max_retries=2)
+        call, calls = self.flaky(10)
+        with self.assertRaises(LLMRateLimited) as caught:
+            llm.run(call, RETURNING, tokens=10)
+        self.assertEqual(caught.exception.status_code, 429)
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        llm = scheduler()
+        call, calls = self.flaky(1, ValueError)
+        with self.assertRaises(ValueError):
+            llm.run(call, RETURNING, tokens=10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(llm.stats()['running'], 0)
+
+    def test_async_retry(self):
+        llm = scheduler(max_retries=3)
+        call, calls = self.flaky(1)
+
+        async def acall():
+            return call()
+
+        self.assertEqual(asyncio.run(llm.arun(acall, RETURNING, tokens=10)).content, 'ok')
+        self.assertEqual(len(calls), 2)
+
+    def test_reported_usage_settles_the_estimate(self):
+        llm = scheduler(tokens_per_minute=6000)
+        call, _ = self.flaky(0)
+        llm.run(call, RETURNING, tokens=1000)
+        # 1000 were reserved, 10 used: the rest goes back to the bucket
+        self.assertGreater(llm.stats()['tokens_available'], 5900)
+
+
+class RecordingScheduler(LLMScheduler):
+
+    def run(self, call, priority, tokens):
+        self.priority = priority
+        return super().run(call, priority, tokens)
+
+
+class ScheduledChatModelTests(SimpleTestCase):
+
+    def test_priority_comes_from_run_metadata(self):
+        llm = RecordingScheduler(max_concurrency=1, tokens_per_minute=0)
+        model = ScheduledChatModel(chat_model=GenericFakeChatModel(messages=iter([AIMessage(content='hello')])), scheduler=llm)
+        reply = model.invoke("hi", {'metadata': {PRIORITY_KEY: BOOKING}})
+        self.assertEqual(reply.content, 'hello')
+        self.assertEqual(llm.priority, BOOKING)
+        self.assertEqual(llm.stats()['granted'], 1)
+
+    def test_stream_goes_through_the_scheduler(self):
+        llm = scheduler()
+        model = ScheduledChatModel(chat_model=GenericFakeChatModel(messages=iter([AIMessage(content='hello there')])), scheduler=llm)
+        self.assertEqual(''.join(chunk.content for chunk in model.stream("hi")), 'hello there')
+        self.assertEqual(llm.stats()['granted'], 1)
+        self.assertEqual(llm.stats()['running'], 0)
+
+
+class RequestPriorityTests(TestCase):
+
+    def setUp(self):
+        self.lead = Lead.objects.create(session_id='priority')
+        self.conversation = Conversation.objects.create(lead=self.lead)
+
+    def test_first_turn_is_new(self):
+        self.assertEqual(request_priority(self.conversation), NEW)
+
+    def test_returning_conversation(self):
+        Message.objects.create(conversation=self.conversation, sender='Human', text='hi')
+        self.assertEqual(request_priority(self.conversation), RETURNING)
+
+    def test_contact_details_or_booking(self):
+        Lead.objects.filter(id=self.lead.id).update(email='buyer@example.com')
+        self.assertEqual(request_priority(self.conversation), BOOKING)
+
+        other = Conversation.objects.create(lead=Lead.objects.create(session_id='priority-2'))
+        project = Project.objects.create(project_name='P', developer_name='D', city='Dubai')
+        VisitBooking.objects.create(lead=other.lead, project=project)
+        self.assertEqual(request_priority(other), BOOKING)
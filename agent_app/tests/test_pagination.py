@@ -0,0 +1,128 @@
+# agent_app/tests/test_pagination.py
+
+from datetime import timedelta
+
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from agent_app.api import list_messages
+from agent_app.archive import archive_conversation
+from agent_app.models import Conversation, ConversationArchive, Lead, Message
+from agent_app.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, keyset_page
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        now = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(now, 42)), (now, 42))
+
+    def test_malformed_cursor_is_a_400(self):
+        for cursor in ('not-a-cursor', encode_cursor(timezone.now(), 1)[:-3] + '!!!', ''):
+            with self.subTest(cursor=cursor), self.assertRaises(HttpError) as caught:
+                decode_cursor(cursor)
+            self.assertEqual(caught.exception.status_code, 400)
+
+
+class KeysetPageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.conversation = Conversation.objects.create(lead=Lead.objects.create(session_id='pagination'))
+        Message.objects.bulk_create([Message(conversation=cls.conversation, sender='Human', text=str(i)) for i in range(7)])
+        # Timestamps: messages 2 and 3 share one, so the id breaks the tie
+        start = timezone.now() - timedelta(hours=1)
+        for i, message in enumerate(Message.objects.filter(conversation=cls.conversation).order_by('id')):
+            message.timestamp = start + timedelta(minutes=min(i, 2) if i < 4 else i)
+            message.save(update_fields=['timestamp'])
+
+    def messages(self):
+        return Message.objects.filter(conversation=self.conversation).values('id', 'text', 'timestamp')
+
+    def texts(self, rows):
+        return [row['text'] for row in rows]
+
+    def cursor(self, row):
+        return encode_cursor(row['timestamp'], row['id'])
+
+    def test_newest_first(self):
+        rows, has_more = keyset_page(self.messages(), 'timestamp', limit=3)
+        self.assertEqual(self.texts(rows), ['6', '5', '4'])
+        self.assertTrue(has_more)
+
+    def test_walking_back_visits_every_row_once(self):
+        seen, before = [], None
+        while True:
+            rows, has_more = keyset_page(self.messages(), 'timestamp', before=before, limit=2)
+            seen += self.texts(rows)
+            if not has_more:
+                break
+            before = self.cursor(rows[-1])
+        self.assertEqual(seen, ['6', '5', '4', '3', '2', '1', '0'])
+
+    def test_after_returns_newer_rows_oldest_first(self):
+        rows, _ = keyset_page(self.messages(), 'timestamp', limit=10)
+        by_text = {row['text']: row for row in rows}
+        rows, has_more = keyset_page(self.messages(), 'timestamp', after=self.cursor(by_text['2']), limit=10)
+        self.assertEqual(self.texts(rows), ['3', '4', '5', '6'])
+        self.assertFalse(has_more)
+
+    def test_limit_is_clamped(self):
+        rows, _ = keyset_page(self.messages(), 'timestamp', limit=0)
+        self.assertEqual(len(rows), 1)
+        rows, _ = keyset_page(self.messages(), 'timestamp', limit=MAX_PAGE_SIZE * 10)
+        self.assertEqual(len(rows), 7)
+
+
+class ListMessagesTests(TestCase):
+
+    def setUp(self):
+        self.conversation = Conversation.objects.create(lead=Lead.objects.create(session_id='pagination-api'))
+        for i in range(5):
+            Message.objects.create(conversation=self.conversation, sender='Human', text=str(i))
+
+    def page(self, **params):
+        return list_messages(RequestFactory().get('/'), self.conversation.id, **params)
+
+    def test_pages_are_chronological_and_chain(self):
+        first = self.page(limit=3)
+        self.assertEqual([m['text'] for m in first['messages']], ['2', '3', '4'])
+        self.assertTrue(first['has_more'])
+
+        older = self.page(limit=3, before=first['before_cursor'])
+        self.assertEqual([m['text'] for m in older['messages']], ['0', '1'])
+        self.assertFalse(older['has_more'])
+
+    def test_delta_mode(self):
+        page = self.page(limit=3)
+        Message.objects.create(conversation=self.conversation, sender='AI', text='new')
+        delta = self.page(after=page['after_cursor'])
+        self.assertEqual([m['text'] for m in delta['messages']], ['new'])
+        self.assertEqual(self.page(after=delta['after_cursor'])['messages'], [])
+
+    def test_bad_cursor(self):
+        with self.assertRaises(HttpError):
+            self.page(before='garbage')
+
+
+class ArchivedListMessagesTests(ListMessagesTests):
+
+    def setUp(self):
+        super().setUp()
+        archive_conversation(self.conversation, idle_days=0)
+
+    def test_archive_is_read_not_restored(self):
+        page = self.page(limit=3)
+        self.assertEqual([m['text'] for m in page['messages']], ['2', '3', '4'])
+        self.assertEqual([m['text'] for m in self.page(before=page['before_cursor'])['messages']], ['0', '1'])
+        self.assertEqual(self.page(after=page['before_cursor'])['messages'], page['messages'][1:])
+
+        self.conversation.refresh_from_db()
+        self.assertIsNotNone(self.conversation.end_time)
+        self.assertFalse(Message.objects.filter(conversation=self.conversation).exists())
+        self.assertTrue(ConversationArchive.objects.filter(conversation=self.conversation).exists())
+
+    def test_delta_mode(self):
+        page = self.page(limit=3)
+        self.assertEqual(self.page(after=page['after_cursor'])['messages'], [])
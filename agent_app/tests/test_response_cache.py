@@ -0,0 +1,91 @@
+# agent_app/tests/test_response_cache.py
+
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from agent_app.dataset import bump_generation
+from agent_app.models import ResponseCacheEntry
+from agent_app.response_cache import ResponseCache, hashing_embedder, message_slots
+
+CITIES = ('Dubai', 'Chicago', 'Costa del Sol')
+
+
+def cosine(a: str, b: str) -> float:
+    return float(hashing_embedder(a) @ hashing_embedder(b))
+
+
+class MessageSlotsTests(SimpleTestCase):
+
+    def test_slots(self):
+        self.assertEqual(
+            message_slots("2-bed apartments in Dubai under $2m", CITIES),
+            {'bedrooms': 2, 'budget_usd': 2000000, 'city': 'Dubai', 'place': 'dubai'},
+        )
+
+    def test_place_keeps_words_qualifying_the_city(self):
+        self.assertEqual(message_slots("apartments in Dubai Marina", CITIES)['place'], 'dubai marina')
+        self.assertEqual(message_slots("Dubai apartments with a pool", CITIES)['place'], 'dubai')
+        self.assertEqual(message_slots("villas on the Costa del Sol please", CITIES)['place'], 'costa del sol')
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(threshold=0.9, slots=lambda text: message_slots(text, CITIES))
+        # The generation is re-read from the database at most every few seconds; read it every time here
+        patcher = mock.patch('agent_app.response_cache.current_generation', side_effect=self._generation)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _generation(self):
+        from agent_app.dataset import current_generation
+        return current_generation(max_age=0)
+
+    def test_paraphrase_hits(self):
+        self.cache.store("Do you have 2-bed apartments in Dubai?", "reply-2bed")
+        self.assertEqual(self.cache.lookup("do you have 2 bed apartments in dubai"), "reply-2bed")
+
+    def test_different_bedrooms_miss(self):
+        # Near-identical text: the embedding alone would count this as a hit
+        self.assertGreaterEqual(cosine("Do you have 2-bed apartments in Dubai?", "Do you have 3-bed apartments in Dubai?"), 0.9)
+        self.cache.store("Do you have 2-bed apartments in Dubai?", "reply-2bed")
+        self.assertIsNone(self.cache.lookup("Do you have 3-bed apartments in Dubai?"))
+
+    def test_more_specific_place_misses(self):
+        self.assertGreaterEqual(cosine("Do you have any apartments for sale in Dubai?", "Do you have any apartments for sale in Dubai Marina?"), 0.9)
+        self.cache.store("Do you have any apartments for sale in Dubai?", "reply-dubai")
+        self.assertIsNone(self.cache.lookup("Do you have any apartments for sale in Dubai Marina?"))
+
+    def test_different_budget_or_city_misses(self):
+        self.cache.store("Villas in Dubai under $2m", "reply-2m")
+        self.assertIsNone(self.cache.lookup("Villas in Dubai under $3m"))
+        self.assertIsNone(self.cache.lookup("Villas in Chicago under $2m"))
+
+    def test_dissimilar_message_misses(self):
+        self.cache.store("Do you have villas in Dubai?", "reply-villas")
+        self.assertIsNone(self.cache.lookup("What payment plans do you offer in Dubai?"))
+
+    def test_new_generation_invalidates(self):
+        self.cache.store("Do you have villas in Dubai?", "reply-villas")
+        bump_generation()
+        self.assertIsNone(self.cache.lookup("Do you have villas in Dubai?"))
+
+    def test_expired_entries_miss(self):
+        self.cache.store("Do you have villas in Dubai?", "reply-villas")
+        ResponseCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(self.cache.lookup("Do you have villas in Dubai?"))
+
+    def test_size_is_capped(self):
+        self.cache.max_entries = 2
+        for bedrooms in (1, 2, 3):
+            self.cache.store(f"{bedrooms}-bed flats in Dubai", f"reply-{bedrooms}")
+        self.assertEqual(ResponseCacheEntry.objects.count(), 2)
+
+    def test_disabled_cache_does_nothing(self):
+        self.cache.enabled = False
+        self.cache.store("Do you have villas in Dubai?", "reply-villas")
+        self.assertIsNone(self.cache.lookup("Do you have villas in Dubai?"))
+        self.assertFalse(ResponseCacheEntry.objects.exists())
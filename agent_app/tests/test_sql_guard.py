@@ -0,0 +1,97 @@
+# agent_app/tests/test_sql_guard.py
+
+from django.test import SimpleTestCase, TestCase
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from agent_app.cache import sql_result_cache
+from agent_app.sql_guard import MAX_ROWS, SQLGuardError, guard_sql
+from agent_app.sql_tool import PropertySQLTool
+
+
+class GuardSQLTests(SimpleTestCase):
+
+    def assertRejected(self, query: str, code: str):
+        with self.assertRaises(SQLGuardError) as caught:
+            guard_sql(query)
+        self.assertEqual(caught.exception.code, code)
+
+    # --- Table whitelist ---
+
+    def test_allowed_tables_pass(self):
+        self.assertEqual(
+            guard_sql("SELECT u.price_usd FROM agent_app_unit u JOIN agent_app_project p ON p.id = u.project_id"),
+            f"SELECT u.price_usd FROM agent_app_unit u JOIN agent_app_project p ON p.id = u.project_id LIMIT {MAX_ROWS}",
+        )
+
+    def test_quoted_allowed_table_passes(self):
+        self.assertEqual(guard_sql('SELECT city FROM "agent_app_unit"'), f'SELECT city FROM "agent_app_unit" LIMIT {MAX_ROWS}')
+
+    def test_other_table_rejected(self):
+        self.assertRejected("SELECT email, phone FROM agent_app_lead", 'table_not_allowed')
+
+    def test_quoted_other_table_rejected(self):
+        for name in ('"agent_app_lead"', '`agent_app_lead`', '[agent_app_lead]', "'agent_app_lead'"):
+            with self.subTest(name=name):
+                self.assertRejected(f"SELECT email, phone FROM {name}", 'table_not_allowed')
+
+    def test_other_table_in_from_list_or_subquery_rejected(self):
+        self.assertRejected('SELECT 1 FROM agent_app_unit, "agent_app_lead"', 'table_not_allowed')
+        self.assertRejected("SELECT city FROM (SELECT email AS city FROM agent_app_lead) t", 'table_not_allowed')
+
+    def test_schema_qualified_table_rejected(self):
+        self.assertRejected("SELECT email FROM main.agent_app_lead", 'table_not_allowed')
+
+    def test_cte_name_allowed(self):
+        query = "WITH c AS (SELECT city FROM agent_app_unit) SELECT city FROM c"
+        self.assertEqual(guard_sql(query), f"{query} LIMIT {MAX_ROWS}")
+
+    # --- Statement type ---
+
+    def test_writes_and_multiple_statements_rejected(self):
+        self.assertRejected("DELETE FROM agent_app_unit", 'not_select')
+        self.assertRejected("SELECT 1 FROM agent_app_unit; DROP TABLE agent_app_unit", 'multiple_statements')
+
+    # --- LIMIT ---
+
+    def test_limit_clamped(self):
+        self.assertEqual(guard_sql("SELECT id FROM agent_app_unit LIMIT 5000"), f"SELECT id FROM agent_app_unit LIMIT {MAX_ROWS}")
+        self.assertEqual(guard_sql("SELECT id FROM agent_app_unit LIMIT 10, 5000"), f"SELECT id FROM agent_app_unit LIMIT 10, {MAX_ROWS}")
+        self.assertEqual(guard_sql("SELECT id FROM agent_app_unit LIMIT 3;"), "SELECT id FROM agent_app_unit LIMIT 3")
+
+    def test_trailing_comment_does_not_hide_limit(self):
+        self.assertEqual(
+            guard_sql("SELECT id, price_usd FROM agent_app_unit -- all units"),
+            f"SELECT id, price_usd FROM agent_app_unit LIMIT {MAX_ROWS}",
+        )
+        self.assertTrue(guard_sql("SELECT id FROM agent_app_unit /* every row */").endswith(f"LIMIT {MAX_ROWS}"))
+
+    def test_non_numeric_limit_rejected(self):
+        self.assertRejected("SELECT id FROM agent_app_unit LIMIT (SELECT 100000)", 'bad_limit')
+
+
+class PropertySQLToolTests(TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE agent_app_unit (id INTEGER PRIMARY KEY, city TEXT, price_usd REAL, project_description TEXT)"
+            )
+            connection.exec_driver_sql("INSERT INTO agent_app_unit (city, price_usd) VALUES ('Dubai', 1000000)")
+        self.tool = PropertySQLTool(db=SQLDatabase(engine=engine), name='retrieve_property_info')
+        sql_result_cache.clear()
+
+    def test_unknown_column_is_returned_as_error(self):
+        result = self.tool.run("SELECT project_name, city FROM agent_app_unit WHERE city = 'Dubai'")
+        self.assertTrue(result.startswith("Error:"), result)
+        self.assertIn("project_name", result)
+
+    def test_rows_are_returned(self):
+        result = self.tool.run("SELECT city, price_usd FROM agent_app_unit")
+        self.assertIn("Dubai", result)
+
+    def test_rejection_is_returned_as_error(self):
+        result = self.tool.run('SELECT email FROM "agent_app_lead"')
+        self.assertTrue(result.startswith("Error (guard: table_not_allowed)"), result)
@@ -0,0 +1,88 @@
+# agent_app/transcript.py
+
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from .models import Conversation, Message, ToolCall
+
+# Tool results are already compact (agent_app/formatting.py); this only bounds outliers
+RESULT_CHARS = getattr(settings, 'AGENT_TOOL_CALL_RESULT_CHARS', 4000)
+
+
+def turn_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """The messages the agent appended after the latest HumanMessage (tool calls, tool results, reply)."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return list(messages[i + 1:])
+    return list(messages)
+
+
+def _tool_calls(conversation: Conversation, human: Message, turn: List[BaseMessage]) -> List[ToolCall]:
+    """ToolCall rows for the calls requested by the turn's AI messages, matched with their ToolMessages."""
+    results: Dict[str, ToolMessage] = {m.tool_call_id: m for m in turn if isinstance(m, ToolMessage)}
+    rows = []
+    for message in turn:
+        for call in getattr(message, 'tool_calls', None) or []:
+            result = results.get(call['id'])
+            content = '' if result is None else result.content
+            rows.append(ToolCall(
+                conversation=conversation,
+                message=human,
+                tool_call_id=call['id'] or '',
+                tool_name=call['name'],
+                arguments=call.get('args') or {},
+                result=(content if isinstance(content, str) else str(content))[:RESULT_CHARS],
+                status='error' if result is None else result.status,
+            ))
+    return rows
+
+
+def create_messages(messages: List[Message]) -> List[Message]:
+    """
+    Inserts the messages and returns them with their primary keys set (their tool calls need them).
+    One bulk insert where the backend returns the keys, else one INSERT per message (MySQL, SQLite < 3.35).
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Message.objects.bulk_create(messages)
+    for message in messages:
+        message.save(force_insert=True)
+    return messages
+
+
+def save_turn(conversation: Conversation, message_text: str, turn: List[BaseMessage], reply_text: Optional[str]) -> None:
+    """
+    Writes one turn in a single transaction: the Human message, the AI reply (if any)
+    and every tool call of the turn, with one bulk insert per table (see create_messages).
+    """
+    with transaction.atomic():
+        rows = [Message(conversation=conversation, sender='Human', text=message_text)]
+        if reply_text is not None:
+            rows.append(Message(conversation=conversation, sender='AI', text=reply_text))
+        human = create_messages(rows)[0]
+        ToolCall.objects.bulk_create(_tool_calls(conversation, human, turn))
+
+
+def history_messages(conversation: Conversation) -> List[BaseMessage]:
+    """
+    Rebuilds a conversation's LangChain messages from its transcript, with each turn's tool
+    calls and results between the question and the reply (used to seed a missing checkpoint).
+    """
+    history: List[BaseMessage] = []
+    for message in conversation.messages.order_by('timestamp', 'id').prefetch_related('tool_calls'):
+        if message.sender == 'AI':
+            history.append(AIMessage(content=message.text))
+        elif message.sender == 'Human':
+            history.append(HumanMessage(content=message.text))
+            calls = list(message.tool_calls.all())
+            if calls:
+                history.append(AIMessage(content='', tool_calls=[
+                    {'id': c.tool_call_id, 'name': c.tool_name, 'args': c.arguments} for c in calls
+                ]))
+                history.extend(
+                    ToolMessage(content=c.result, tool_call_id=c.tool_call_id, name=c.tool_name, status=c.status)
+                    for c in calls
+                )
+    return history
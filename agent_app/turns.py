@@ -0,0 +1,171 @@
+# agent_app/turns.py
+
+import asyncio
+import hashlib
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from .models import ChatRequest, Conversation
+
+# --- 1. Configuration ---
+
+# Lease on a conversation while one of its turns runs; a crashed worker's lease simply expires
+LOCK_SECONDS = getattr(settings, 'AGENT_CHAT_LOCK_SECONDS', 300)
+
+# How long a request waits for the conversation (or for an identical request to finish) before a 409
+WAIT_SECONDS = getattr(settings, 'AGENT_CHAT_WAIT_SECONDS', 60)
+
+# How long an answered request's reply is kept for retries with the same idempotency key
+DEDUP_SECONDS = getattr(settings, 'AGENT_CHAT_DEDUP_SECONDS', 300)
+
+POLL_SECONDS = 0.05
+
+
+class TurnBusy(HttpError):
+    """The conversation stayed busy for WAIT_SECONDS."""
+
+    def __init__(self):
+        super().__init__(409, "This conversation is busy with another message; please retry.")
+
+
+@dataclass
+class Turn:
+    """
+    One chat turn. The owner runs the agent and sets `reply`; a coalesced turn (no owner)
+    is a retry or double submit and already carries the reply of the turn it duplicated.
+    """
+    conversation_id: int
+    request_id: int = 0
+    owner: str = ''
+    reply: Optional[str] = None
+
+    @property
+    def coalesced(self) -> bool:
+        return not self.owner
+
+
+def request_key(message: str, idempotency_key: Optional[str] = None) -> str:
+    """The client's idempotency key, or else a hash of the message text."""
+    if idempotency_key:
+        return f"key:{idempotency_key[:90]}"
+    return "msg:" + hashlib.sha256(message.strip().encode('utf-8')).hexdigest()[:32]
+
+# --- 2. Claim, lock and release ---
+
+def _claim(conversation_id: int, key: str, waited: bool = False) -> tuple:
+    """
+    Registers the request. Returns ('owner', request id), ('done', reply) when the request it
+    duplicates has answered, or ('wait', None) while that one is running.
+
+    An answered request is a duplicate only for the same idempotency key, or for a message that
+    arrived while it was running (`waited`): the same text sent again later ("yes", "more") is a
+    new message and runs again.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            row = ChatRequest.objects.create(conversation_id=conversation_id, key=key, updated_at=now)
+        return 'owner', row.id
+    except IntegrityError:
+        pass
+
+    row = ChatRequest.objects.filter(conversation_id=conversation_id, key=key).values('id', 'status', 'reply', 'updated_at').first()
+    if row is None:
+        return 'wait', None
+    if row['status'] == ChatRequest.DONE and (key.startswith('key:') or waited):
+        return 'done', row['reply']
+
+    # A running request older than the lease was abandoned
+    reusable = row['status'] == ChatRequest.DONE or row['updated_at'] < now - timedelta(seconds=LOCK_SECONDS)
+    if reusable and ChatRequest.objects.filter(id=row['id'], updated_at=row['updated_at']).update(
+        status=ChatRequest.RUNNING, reply='', updated_at=now
+    ):
+        return 'owner', row['id']
+    return 'wait', None
+
+
+def _lock(conversation_id: int, owner: str) -> bool:
+    """Takes the conversation's lease if it is free or expired (one conditional UPDATE, so it works across processes)."""
+    now = timezone.now()
+    return bool(
+        Conversation.objects.filter(id=conversation_id)
+        .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+        .update(locked_by=owner, locked_until=now + timedelta(seconds=LOCK_SECONDS))
+    )
+
+
+def _begin_steps(conversation_id: int, message: str, idempotency_key: Optional[str]) -> Iterator[Optional[Turn]]:
+    """Claims the request, then the conversation; yields None whenever it has to wait, and finally the Turn."""
+    key = request_key(message, idempotency_key)
+    deadline = time.monotonic() + WAIT_SECONDS
+
+    waited = False
+    while True:
+        state, value = _claim(conversation_id, key, waited)
+        if state == 'done':
+            yield Turn(conversation_id, reply=value)
+            return
+        if state == 'owner':
+            turn = Turn(conversation_id, request_id=value, owner=uuid.uuid4().hex)
+            break
+        if time.monotonic() > deadline:
+            raise TurnBusy()
+        waited = True
+        yield None
+
+    # Different messages of one conversation run one after the other
+    while not _lock(conversation_id, turn.owner):
+        if time.monotonic() > deadline:
+            ChatRequest.objects.filter(id=turn.request_id).delete()
+            raise TurnBusy()
+        yield None
+    yield turn
+
+
+def begin_turn(conversation_id: int, message: str, idempotency_key: Optional[str] = None) -> Turn:
+    """
+    Starts a turn: returns an owned Turn once the conversation is free, or a coalesced Turn with
+    the reply of an identical request (waiting for it if it is still running). Raises TurnBusy.
+    """
+    steps = _begin_steps(conversation_id, message, idempotency_key)
+    while (turn := next(steps)) is None:
+        time.sleep(POLL_SECONDS)
+    return turn
+
+
+async def abegin_turn(conversation_id: int, message: str, idempotency_key: Optional[str] = None) -> Turn:
+    """Async version of begin_turn (waits with asyncio.sleep, so the event loop stays free)."""
+    steps = _begin_steps(conversation_id, message, idempotency_key)
+    while (turn := await sync_to_async(next)(steps)) is None:
+        await asyncio.sleep(POLL_SECONDS)
+    return turn
+
+
+def end_turn(turn: Turn) -> None:
+    """
+    Stores the owner's reply for duplicates and retries (or, if the turn failed and has no reply,
+    forgets the request so a retry runs it again), deletes the conversation's answered requests
+    older than DEDUP_SECONDS and releases the conversation.
+    """
+    if turn.coalesced:
+        return
+    now = timezone.now()
+    requests = ChatRequest.objects.filter(id=turn.request_id)
+    if turn.reply is None:
+        requests.delete()
+    else:
+        requests.update(status=ChatRequest.DONE, reply=turn.reply, updated_at=now)
+    ChatRequest.objects.filter(
+        conversation_id=turn.conversation_id, status=ChatRequest.DONE, updated_at__lt=now - timedelta(seconds=DEDUP_SECONDS)
+    ).delete()
+    Conversation.objects.filter(id=turn.conversation_id, locked_by=turn.owner).update(locked_by='', locked_until=None)
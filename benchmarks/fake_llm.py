@@ -0,0 +1,103 @@
+"""
+Deterministic local stand-in for ChatOpenAI, used by the benchmarks.
+
+For each user message it makes one scripted tool call (chosen by keywords in the message),
+then answers with a short reply quoting the tool result. Every call sleeps for a configurable
+latency to mimic the network and the model, and records its duration in the current turn's
+stats (see benchmarks/load_test.py). With rate_limit_every=N every Nth call fails with an
+HTTP 429 error, like a provider's rate limit, to exercise the retries in agent_app/llm_scheduler.py.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+# (keywords, tool name, tool arguments): the first entry whose keyword appears in the message wins
+SCRIPT: List[Tuple[Tuple[str, ...], str, Dict[str, Any]]] = [
+    (('pool', 'gym', 'beach', 'amenit'), 'search_amenities', {'keywords': 'pool gym', 'city': 'Dubai'}),
+    (('developer', 'average', 'how many'), 'retrieve_property_info', {
+        'query': "SELECT p.developer_name, COUNT(*) AS units, AVG(u.price_usd) AS avg_price "
+                 "FROM agent_app_unit AS u JOIN agent_app_project AS p ON p.id = u.project_id "
+                 "WHERE p.city = 'Dubai' GROUP BY p.developer_name ORDER BY units DESC",
+    }),
+    (('villa',), 'search_properties', {'property_type': 'villa', 'sort_by': 'price_asc', 'top_k': 5}),
+    ((), 'search_properties', {'city': 'Dubai', 'bedrooms': 2, 'max_price': 2_000_000, 'top_k': 5}),
+]
+
+# Set by the load test for each turn; the model adds its call count and time to it
+turn_stats: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar('turn_stats', default=None)
+
+
+def record(stage: str, seconds: float) -> None:
+    """Adds one timed call to the current turn's stats (no-op outside a measured turn)."""
+    stats = turn_stats.get()
+    if stats is not None:
+        stats[f'{stage}_ms'] = stats.get(f'{stage}_ms', 0.0) + seconds * 1000
+        stats[f'{stage}_calls'] = stats.get(f'{stage}_calls', 0) + 1
+
+
+class RateLimitError(Exception):
+    """Stand-in for the provider's 429 error."""
+
+    status_code = 429
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that follows SCRIPT instead of calling an API."""
+
+    latency_ms: float = 300.0
+    rate_limit_every: int = 0
+    _calls: Any = PrivateAttr(default_factory=lambda: itertools.count(1))
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        if "running memory" in str(messages[0].content):
+            return AIMessage(content="Summary: the user is looking for property in Dubai.")
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content="Here are some options:\n" + str(messages[-1].content)[:300])
+
+        question = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), '').lower()
+        name, args = next((name, args) for keywords, name, args in SCRIPT if not keywords or any(k in question for k in keywords))
+        return AIMessage(content='', tool_calls=[{'name': name, 'args': args, 'id': f'call_{len(messages)}'}])
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        """The scripted reply, with approximate token usage like a real model reports."""
+        message = self._respond(messages)
+        prompt, completion = count_tokens_approximately(messages), count_tokens_approximately([message])
+        message.usage_metadata = {'input_tokens': prompt, 'output_tokens': completion, 'total_tokens': prompt + completion}
+        return message
+
+    def _check_rate_limit(self) -> None:
+        if self.rate_limit_every and next(self._calls) % self.rate_limit_every == 0:
+            record('rate_limited', 0.0)
+            raise RateLimitError("Rate limit reached (scripted)")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._check_rate_limit()
+        started = time.perf_counter()
+        time.sleep(self.latency_ms / 1000)
+        message = self._reply(messages)
+        record('llm', time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._check_rate_limit()
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency_ms / 1000)
+        message = self._reply(messages)
+        record('llm', time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
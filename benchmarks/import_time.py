@@ -0,0 +1,94 @@
+"""
+Import-time benchmark for agent_app.
+
+Measures, in fresh interpreter processes, how long it takes to import agent_app.api
+(what every manage.py command, test run and worker boot pays) and how long
+agent_app.graph.warm_up() then takes to build the engine, SQLDatabase, chat model,
+ReAct agent and compiled graph. It also lists heavy modules (pandas, the SQL stack,
+the OpenAI client) that the import pulled in although they are only needed later.
+
+--baseline REF times the import of agent_app.api at another git revision too, checked
+out in a temporary worktree (e.g. the commit before the lazy accessors, where the
+graph was built at import time).
+
+Usage (from the project root):
+    python -m benchmarks.import_time [--repeat 5] [--baseline REF]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Optional
+
+# Runs in the child process: prints the timings as JSON
+CHILD = r"""
+import json, os, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import agent_app.api
+imported = time.perf_counter()
+heavy = [m for m in ('langchain_openai', 'langchain_community.utilities', 'sqlalchemy', 'pandas') if m in sys.modules]
+if os.environ.get('IMPORT_ONLY'):
+    print(json.dumps({'import': imported - started, 'heavy': heavy}))
+    sys.exit()
+from agent_app.graph import warm_up
+warm_up()
+warmed = time.perf_counter()
+print(json.dumps({'import': imported - started, 'warm_up': warmed - imported, 'heavy': heavy}))
+"""
+
+
+def measure(root: Optional[str] = None, import_only: bool = False) -> dict:
+    """Runs CHILD in a fresh process, importing agent_app from `root` (default: this checkout)."""
+    env = {**os.environ}
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'property_agent_project.settings')
+    # warm_up builds ChatOpenAI, which only needs a key to exist; nothing is sent
+    env.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    if root:
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    if import_only:
+        env['IMPORT_ONLY'] = '1'
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD], env=env, cwd=root, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_baseline(ref: str, repeat: int) -> float:
+    """Median import time of agent_app.api at git revision `ref`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = os.path.join(tmp, 'baseline')
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, ref], check=True, capture_output=True)
+        try:
+            return statistics.median(measure(worktree, import_only=True)['import'] for _ in range(repeat))
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="Number of fresh processes to time (default 5).")
+    parser.add_argument('--baseline', metavar='REF', help="Also time the import at this git revision.")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.repeat)]
+    imports = statistics.median(r['import'] for r in runs)
+    warm_ups = statistics.median(r['warm_up'] for r in runs)
+
+    print(f"--- agent_app import time (median of {args.repeat} fresh processes) ---")
+    print(f"import agent_app.api:               {imports * 1000:8.1f} ms")
+    print(f"warm_up() on first use / at boot:   {warm_ups * 1000:8.1f} ms")
+    if args.baseline:
+        baseline = measure_baseline(args.baseline, args.repeat)
+        print(f"import agent_app.api at {args.baseline}: {baseline * 1000:8.1f} ms ({imports - baseline:+.3f} s)")
+    if runs[0]['heavy']:
+        print(f"WARNING: modules loaded at import that should be lazy: {', '.join(runs[0]['heavy'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+Load test and latency benchmark for the chat API, with the model replaced by the local
+stand-in in benchmarks/fake_llm.py (no API key, no network, deterministic tool calls).
+
+Each simulated user runs in its own thread with its own test client: it starts a conversation
+(POST /api/conversations) and then sends --turns messages (POST /api/agents/chat). Per turn it
+records the wall time and where it went:
+
+    llm        time inside the (fake) model, incl. the configured latency
+    agent_sql  queries the agent's tools ran on the pooled SQLAlchemy engine
+    orm        Django queries, split by table group: checkpoint, transcript, catalogue, cache,
+               plus transaction statements (BEGIN/SAVEPOINT/...)
+    other      everything else (graph, serialization, tool code, waiting on locks)
+
+and prints p50/p95/p99 per metric plus requests/sec. Results are written as JSON; pass a
+previous file with --compare to print the change per metric.
+
+The model sits behind its own LLMScheduler (agent_app/llm_scheduler.py), sized by --llm-concurrency
+and --llm-tokens-per-minute; --llm-rate-limit-every N makes every Nth model call fail with a 429
+so the backoff and the 429/503 responses can be exercised. The time a turn waited in the
+scheduler's queue is reported as llm_queue, and the scheduler's counters are saved with the results.
+
+Usage (from the project root, with the catalogue loaded):
+    python -m benchmarks.load_test --users 8 --turns 4 --llm-latency-ms 300
+    python -m benchmarks.load_test --users 32 --llm-concurrency 4 --llm-rate-limit-every 10
+    python -m benchmarks.load_test --compare benchmarks/results/load_<earlier>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'property_agent_project.settings')
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')  # replaced by the scripted model before any call
+
+import django
+
+django.setup()
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from sqlalchemy import event
+
+from agent_app import graph
+from agent_app.agent_db import pool_stats
+from agent_app.cache import sql_result_cache
+from agent_app.llm_scheduler import LLMScheduler, ScheduledChatModel
+from benchmarks.fake_llm import ScriptedChatModel, record, turn_stats
+
+# Messages each simulated user sends, in order (wrapping around for more turns)
+MESSAGES = [
+    "Hi, I'm looking for a 2 bedroom apartment in Dubai under $2M",
+    "Which of those have a pool and a gym?",
+    "Which developer has the most units there, and the average price?",
+    "Show me some villas as well",
+]
+
+# Django tables by group, for the ORM split
+TABLE_GROUPS = [
+    ('checkpoint', ('agent_app_graphcheckpoint',)),
+    ('transcript', ('agent_app_message', 'agent_app_toolcall', 'agent_app_conversation', 'agent_app_lead')),
+    ('catalogue', ('agent_app_project', 'agent_app_unit', 'agent_app_datasetversion')),
+    ('cache', ('agent_app_responsecacheentry',)),
+]
+
+PERCENTILES = (50, 95, 99)
+
+_TABLE_RE = re.compile(r'"?(agent_app_\w+)"?')
+_TRANSACTION_RE = re.compile(r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+# --- 1. Per-turn instrumentation ---
+
+def _table_group(sql: str) -> str:
+    tables = _TABLE_RE.findall(sql)
+    for group, names in TABLE_GROUPS:
+        if any(table.startswith(names) for table in tables):
+            return group
+    return 'transaction' if _TRANSACTION_RE.match(sql) else 'other'
+
+
+def _orm_wrapper(execute, sql, params, many, context):
+    """Django execute wrapper: times every ORM query into the running turn's stats."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record(f'orm_{_table_group(sql)}', time.perf_counter() - started)
+
+
+def _install_orm_wrapper(sender=None, connection=None, **kwargs):
+    if _orm_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_orm_wrapper)
+
+
+def instrument() -> None:
+    """Hooks query timing into Django's connections (every thread) and the agent's SQL engine."""
+    connection_created.connect(_install_orm_wrapper)
+    for connection in connections.all():
+        _install_orm_wrapper(connection=connection)
+
+    engine = graph.get_engine()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('benchmark_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        record('agent_sql', time.perf_counter() - conn.info['benchmark_started'].pop())
+
+class MeasuredScheduler(LLMScheduler):
+    """LLMScheduler that records each call's wait for a slot as 'llm_queue' in the turn's stats."""
+
+    @contextmanager
+    def slot(self, priority, tokens, retry=False):
+        started = time.perf_counter()
+        with super().slot(priority, tokens, retry) as ticket:
+            record('llm_queue', time.perf_counter() - started)
+            yield ticket
+
+# --- 2. Simulated users ---
+
+def _post(client: Client, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    response = client.post(path, payload or {}, content_type='application/json')
+    if response.status_code >= 400:
+        raise RuntimeError(f"{path} returned {response.status_code}: {response.content[:200]!r}")
+    return response.json()
+
+
+def _measure(kind: str, call) -> Dict[str, float]:
+    """Runs one request with fresh turn stats and returns them, with total and 'other' time filled in."""
+    stats: Dict[str, float] = {}
+    token = turn_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        call()
+    except Exception as e:
+        stats['error'] = 1
+        print(f"  {kind} failed: {e}")
+    finally:
+        stats['total_ms'] = (time.perf_counter() - started) * 1000
+        turn_stats.reset(token)
+    stats['kind'] = kind
+    accounted = sum(v for k, v in stats.items() if k.endswith('_ms') and k != 'total_ms')
+    stats['other_ms'] = max(stats['total_ms'] - accounted, 0.0)
+    stats['orm_calls'] = sum(v for k, v in stats.items() if k.startswith('orm_') and k.endswith('_calls'))
+    return stats
+
+
+def simulate_user(turns: int, samples: List[Dict[str, float]], lock: threading.Lock) -> None:
+    client = Client()
+    conversation: Dict[str, Any] = {}
+
+    def start():
+        conversation.update(_post(client, '/api/conversations'))
+
+    results = [_measure('start', start)]
+    for i in range(turns if conversation else 0):
+        message = MESSAGES[i % len(MESSAGES)]
+        results.append(_measure('chat', lambda: _post(
+            client, '/api/agents/chat', {'message': message, 'conversation_id': conversation['id']}
+        )))
+    with lock:
+        samples.extend(results)
+
+# --- 3. Summary, JSON output and comparison ---
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    if len(values) == 1:
+        return {f'p{p}': round(values[0], 2) for p in PERCENTILES}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {f'p{p}': round(cuts[p - 1], 2) for p in PERCENTILES}
+
+
+def summarize(samples: List[Dict[str, float]], seconds: float) -> Dict[str, Any]:
+    """Per request kind: count, req/s, errors and p50/p95/p99 of every recorded metric."""
+    summary: Dict[str, Any] = {}
+    for kind in ('start', 'chat'):
+        rows = [s for s in samples if s['kind'] == kind]
+        metrics = sorted({k for s in rows for k in s if k.endswith(('_ms', '_calls'))})
+        summary[kind] = {
+            'requests': len(rows),
+            'errors': sum(int(s.get('error', 0)) for s in rows),
+            'requests_per_second': round(len(rows) / seconds, 2) if seconds else 0.0,
+            # Share answered without a model call (e.g. by the router in agent_app/router.py)
+            'llm_free_share': round(sum(1 for s in rows if not s.get('llm_calls')) / len(rows), 3) if rows else 0.0,
+            'metrics': {m: percentiles([float(s.get(m, 0)) for s in rows]) for m in metrics},
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    for kind, block in summary.items():
+        served = f", {block['llm_free_share']:.0%} without the LLM" if kind == 'chat' else ''
+        print(f"\n{kind}: {block['requests']} requests, {block['errors']} errors, {block['requests_per_second']} req/s{served}")
+        print(f"  {'metric':24} {'p50':>10} {'p95':>10} {'p99':>10}")
+        for metric, values in block['metrics'].items():
+            print(f"  {metric:24} " + " ".join(f"{values.get(f'p{p}', 0):>10}" for p in PERCENTILES))
+
+
+def print_comparison(summary: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    print("\nChange vs previous run (p50 / p95):")
+    for kind, block in summary.items():
+        before = previous.get(kind, {})
+        if 'requests_per_second' in before:
+            print(f"  {kind} req/s: {before['requests_per_second']} -> {block['requests_per_second']}")
+        for metric, values in block['metrics'].items():
+            old = before.get('metrics', {}).get(metric)
+            if not old:
+                continue
+            deltas = []
+            for p in ('p50', 'p95'):
+                change = (values[p] - old[p]) / old[p] * 100 if old[p] else 0.0
+                deltas.append(f"{old[p]} -> {values[p]} ({change:+.0f}%)")
+            print(f"  {kind}.{metric:22} " + "   ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of the chat API with a scripted local model.")
+    parser.add_argument('--users', type=int, default=8, help="Concurrent simulated users.")
+    parser.add_argument('--turns', type=int, default=4, help="Chat messages per user.")
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0, help="Latency of each fake model call.")
+    parser.add_argument('--llm-concurrency', type=int, default=8, help="Model calls the scheduler runs at once.")
+    parser.add_argument('--llm-tokens-per-minute', type=int, default=0, help="Scheduler token budget (0 = none).")
+    parser.add_argument('--llm-rate-limit-every', type=int, default=0, help="Fail every Nth model call with a 429 (0 = never).")
+    parser.add_argument('--output', help="JSON result file (default: benchmarks/results/load_<timestamp>.json).")
+    parser.add_argument('--compare', help="Previous JSON result to compare against.")
+    args = parser.parse_args()
+
+    scheduler = MeasuredScheduler(max_concurrency=args.llm_concurrency, tokens_per_minute=args.llm_tokens_per_minute)
+    model = ScriptedChatModel(latency_ms=args.llm_latency_ms, rate_limit_every=args.llm_rate_limit_every)
+    graph.use_model(ScheduledChatModel(chat_model=model, scheduler=scheduler))
+    graph.warm_up()
+    instrument()
+
+    print(f"Running {args.users} users x {args.turns} turns (fake LLM latency {args.llm_latency_ms:.0f} ms)...")
+    samples: List[Dict[str, float]] = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=simulate_user, args=(args.turns, samples, lock)) for _ in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    summary = summarize(samples, seconds)
+    print(f"Done in {seconds:.2f}s")
+    print_summary(summary)
+
+    result = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'users': args.users, 'turns': args.turns, 'llm_latency_ms': args.llm_latency_ms,
+            'llm_concurrency': args.llm_concurrency, 'llm_tokens_per_minute': args.llm_tokens_per_minute,
+            'llm_rate_limit_every': args.llm_rate_limit_every,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': connections['default'].vendor,
+        },
+        'seconds': round(seconds, 3),
+        'summary': summary,
+        'agent_pool': pool_stats(),
+        'sql_result_cache': sql_result_cache.stats(),
+        'llm_scheduler': scheduler.stats(),
+    }
+    output = args.output or os.path.join('benchmarks', 'results', f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, default=str)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(summary, json.load(f)['summary'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Prompt-token benchmark for the SQL tool's result formatting.
+
+Runs representative agent queries through the guard, then renders each result twice:
+as the raw Python tuple repr the tool returned before (SQLDatabase.run) and with
+agent_app/formatting.py. It reports the tool-result tokens and the prompt tokens of the
+turn (two model calls: one that decides on the tool call, one that reads its result).
+
+Usage (from the project root, with the catalogue loaded):
+    python -m benchmarks.tool_tokens
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'property_agent_project.settings')
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')  # the model is built but never called
+
+import django
+
+django.setup()
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent_app.graph import SYSTEM_PROMPT, get_db, get_tools
+from agent_app.memory import count_tokens
+from agent_app.sql_guard import guard_sql
+
+_UNITS = "FROM agent_app_unit AS u JOIN agent_app_project AS p ON p.id = u.project_id"
+
+QUERIES = [
+    ("2-bed units in Dubai, all columns",
+     f"SELECT * {_UNITS} WHERE p.city = 'Dubai' AND u.no_of_bedrooms = 2"),
+    ("Dubai under $2M with developer",
+     f"SELECT p.project_name, p.developer_name, u.price_usd {_UNITS} WHERE p.city = 'Dubai' AND u.price_usd < 2000000"),
+    ("Miami projects with descriptions",
+     "SELECT project_name, project_description FROM agent_app_project WHERE city = 'Miami'"),
+    ("cheapest 10 in Dubai",
+     f"SELECT p.project_name, u.no_of_bedrooms, u.price_usd {_UNITS} WHERE p.city = 'Dubai' ORDER BY u.price_usd LIMIT 10"),
+    ("price per city",
+     f"SELECT p.city, COUNT(*) AS units, AVG(u.price_usd) AS avg_price {_UNITS} GROUP BY p.city"),
+]
+
+
+def turn_tokens(question: str, query: str, result: str) -> int:
+    """Prompt tokens of one tool-using turn: the call that picks the tool plus the call that reads the result."""
+    first = [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=question)]
+    tool_call = AIMessage(content='', tool_calls=[
+        {'name': 'retrieve_property_info', 'args': {'query': query}, 'id': 'call_1'}
+    ])
+    second = first + [tool_call, ToolMessage(content=result, tool_call_id='call_1')]
+    return count_tokens(first) + count_tokens(second)
+
+
+def main():
+    db = get_db()
+    sql_tool = next(t for t in get_tools() if t.name == 'retrieve_property_info')
+
+    print(f"{'query':36} {'result before':>14} {'after':>8} {'turn before':>12} {'after':>8}")
+    totals = [0, 0, 0, 0]
+    for label, query in QUERIES:
+        guarded = guard_sql(query)
+        before = str(db.run_no_throw(guarded))
+        after = str(sql_tool.invoke({'query': query}))
+        row = [
+            count_tokens([ToolMessage(content=before, tool_call_id='x')]),
+            count_tokens([ToolMessage(content=after, tool_call_id='x')]),
+            turn_tokens(label, query, before),
+            turn_tokens(label, query, after),
+        ]
+        totals = [t + r for t, r in zip(totals, row)]
+        print(f"{label:36} {row[0]:>14,} {row[1]:>8,} {row[2]:>12,} {row[3]:>8,}")
+
+    print(f"{'total':36} {totals[0]:>14,} {totals[1]:>8,} {totals[2]:>12,} {totals[3]:>8,}")
+    print(f"Tool-result tokens -{1 - totals[1] / totals[0]:.0%}, prompt tokens per turn -{1 - totals[3] / totals[2]:.0%}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import os
 import pandas as pd
 # NOTE: Keep basic Python imports like os and pandas at the top.
@@ -15,11 +16,18 @@ from django.db import IntegrityError
 django.setup()
 
 # Now it is safe to import your models
-from agent_app.models import Project
-
-def setup_database():
+from agent_app.models import Project, Unit
+from agent_app.dataset import bump_generation
+from agent_app.property_index import rebuild_property_index
+from agent_app.amenity_search import rebuild_fts_index
+from agent_app.ingest import DEFAULT_CHUNK_SIZE, load_full, load_incremental
+from agent_app.aggregates import refresh_market_aggregates
+from agent_app.similarity import VECTOR_DIR, rebuild_project_vectors
+
+def setup_database(incremental=False, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Ensures migrations are applied and loads initial project data from CSV.
+    With incremental=True only the rows that changed since the last load are written.
     """
     
     # 1. Ensure Migrations are Applied
@@ -41,85 +49,36 @@ def setup_database():
         return
 
     try:
-        print(f"--- 2. Loading data from {csv_file_path} ---")
+        mode = "incremental upsert" if incremental else "full reload"
+        print(f"--- 2. Loading data from {csv_file_path} ({mode}, chunks of {chunk_size} rows) ---")
         
-        # Clear existing data before loading
-        count_before = Project.objects.count()
-        Project.objects.all().delete()
-        print(f"Cleared {count_before} existing Project records.")
-
-        # Read the CSV file using pandas
-        df = pd.read_csv(csv_file_path)
-
-        # CRITICAL FIX: Convert 'completion_date' to datetime objects, coercing invalid/empty dates to NaT
-        df['completion_date'] = pd.to_datetime(df['completion_date'], errors='coerce')
+        # Chunked read, vectorized cleanup, one transaction per chunk (see agent_app/ingest.py)
+        load = load_incremental if incremental else load_full
+        stats = load(csv_file_path, chunk_size=chunk_size)
+        print(f"Ingested {stats}.")
+        print(f"Catalogue now holds {Project.objects.count()} projects and {Unit.objects.count()} units.")
         
-        # Rename columns to match Django model fields for clarity
-        df = df.rename(columns={
-            'Project name': 'project_name',
-            'No of bedrooms': 'no_of_bedrooms',
-            'Completion status (off plan/available)': 'completion_status',
-            'bathrooms': 'bathrooms',
-            'unit type': 'unit_type',
-            'developer name': 'developer_name',
-            'Price (USD)': 'price_usd',
-            'Area (sq mtrs)': 'area_sq_mtrs',
-            'Property type (apartment/villa)': 'property_type',
-            'city': 'city',
-            'country': 'country',
-            'features': 'features',
-            'facilities': 'facilities',
-            'Project description': 'project_description'
-        })
-        
-        projects_to_create = []
+        if incremental and not stats.changed:
+            print("Catalogue unchanged; data generation not bumped.")
+            return
 
-        for index, row in df.iterrows():
-            
-            # 1. Handle Date: Convert NaT (Pandas Null) to None
-            completion_date_pd = row['completion_date']
-            final_completion_date = None
-            if pd.notna(completion_date_pd):
-                final_completion_date = completion_date_pd.date() # Convert pandas Timestamp to Python date
+        # 3. Refresh the full-text amenity index after a full reload (an incremental load
+        #    is already reflected in it: triggers keep it in sync row by row)
+        if not incremental:
+            rebuild_fts_index()
 
-            # 2. Handle Numerics: Convert NaN/None (for nullable fields) to None
-            # This is safer than using or None for pandas NaN/NaT values
-            no_of_bedrooms = row.get('no_of_bedrooms')
-            if pd.isna(no_of_bedrooms):
-                no_of_bedrooms = None
-            
-            bathrooms = row.get('bathrooms')
-            if pd.isna(bathrooms):
-                bathrooms = None
-                
-            area_sq_mtrs = row.get('area_sq_mtrs')
-            if pd.isna(area_sq_mtrs):
-                area_sq_mtrs = None
-            
-            # 3. Create Project Object
-            project = Project(
-                project_name=row['project_name'],
-                no_of_bedrooms=no_of_bedrooms, 
-                completion_status=row['completion_status'],
-                bathrooms=bathrooms,
-                unit_type=row['unit_type'],
-                developer_name=row['developer_name'],
-                price_usd=row['price_usd'],
-                area_sq_mtrs=area_sq_mtrs,
-                property_type=row['property_type'],
-                city=row['city'],
-                country=row['country'],
-                completion_date=final_completion_date, 
-                features=row['features'],
-                facilities=row['facilities'],
-                project_description=row['project_description']
-            )
-            projects_to_create.append(project)
+        # 4. Signal the reload so running processes rebuild their in-memory property index
+        generation = bump_generation()
+        index = rebuild_property_index()
+        print(f"Data generation is now {generation}; property index rebuilt ({index.size} rows in {index.build_seconds * 1000:.1f} ms).")
 
-        # Use bulk_create for performance
-        Project.objects.bulk_create(projects_to_create)
+        # 5. Rebuild the market aggregates table (price stats per city x bedrooms x type x status)
+        rows, seconds = refresh_market_aggregates(generation)
+        print(f"Market aggregates rebuilt: {rows} segments in {seconds * 1000:.1f} ms.")
 
-        print(f"Loaded {Project.objects.count()} new Project records.")
+        # 6. Rebuild the similar-projects vectors (memory-mapped by the similar_projects tool)
+        vectors = rebuild_project_vectors(generation)
+        print(f"Project vectors rebuilt: {vectors.matrix.shape[0]} x {vectors.matrix.shape[1]} in {vectors.build_seconds * 1000:.1f} ms ({VECTOR_DIR}).")
 
     except Exception as e:
         print(f"An error occurred during data loading: {e}")
@@ -132,5 +91,12 @@ if __name__ == "__main__":
     except ImportError:
         print("Error: pandas is not installed. Please run: pip install pandas")
         exit(1)
+    
+    parser = argparse.ArgumentParser(description="Load the property catalogue CSV into the database.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Upsert only changed rows instead of deleting and reloading everything.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per read chunk and write transaction (default {DEFAULT_CHUNK_SIZE}).")
+    args = parser.parse_args()
         
-    setup_database()
\ No newline at end of file
+    setup_database(incremental=args.incremental, chunk_size=args.chunk_size)
\ No newline at end of file